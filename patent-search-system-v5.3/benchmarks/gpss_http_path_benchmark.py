@@ -0,0 +1,148 @@
+# benchmarks/gpss_http_path_benchmark.py - GPSS HTTP + 解析路徑離線壓測
+#
+# 於同一事件迴圈內啟動 GPSS替身伺服器（src/external_apis/gpss_standin_server.py），
+# 以真實的 GPSSAPIService 指向替身伺服器，量測完整的「HTTP請求 → JSON解析/修復 → 專利提取」
+# 路徑的延遲分佈、吞吐量與錯誤情形。不連線tiponet、不使用回應快取。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.gpss_http_path_benchmark --requests 50 --concurrency 10
+#   python -m benchmarks.gpss_http_path_benchmark --latency lognormal:0.8,0.5 --error-rate 0.05 --streaming
+#   python -m benchmarks.gpss_http_path_benchmark --max-results 5000   # 走分段檢索
+#
+# 預設會放寬行程內的GPSS限流器，只量測HTTP與解析本身；加上 --keep-rate-limit 則保留正式設定。
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Dict, List
+
+from src.ai_services.gpss_service import GPSSAPIService
+from src.ai_services.rate_limit import CircuitBreaker, KeyedRateLimiter
+from src.external_apis.gpss_standin_server import GPSSStandinServer, StandinConfig
+
+KEYWORD_SETS = [
+    ['半導體', '封裝'], ['探針', '測試'], ['晶圓', '檢測'], ['導線架'], ['凸塊', '基板'],
+    ['散熱', '模組'], ['光罩'], ['蝕刻', '製程'], ['記憶體', '控制器'], ['感測器']
+]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_one(service: GPSSAPIService, index: int, args) -> Dict:
+    keywords = KEYWORD_SETS[index % len(KEYWORD_SETS)] + ([f"變體{index}"] if args.unique_queries else [])
+    start = time.perf_counter()
+    try:
+        if args.streaming:
+            count = 0
+            async for _ in service.search_patents_streaming(
+                'raw', args.user_code, max_results=args.max_results, use_cache=False, keywords=keywords
+            ):
+                count += 1
+        elif args.max_results > service.MAX_RESULTS_PER_REQUEST:
+            raw = await service.search_patents_sharded(
+                'raw', args.user_code, max_results=args.max_results, keywords=keywords
+            )
+            count = len(await service.parse_gpss_response_async(raw))
+        else:
+            raw = await service.search_patents_raw(
+                args.user_code, keywords=keywords, max_results=args.max_results, use_cache=False
+            )
+            count = len(await service.parse_gpss_response_async(raw))
+        return {'ok': True, 'seconds': time.perf_counter() - start, 'patents': count}
+    except Exception as e:
+        return {'ok': False, 'seconds': time.perf_counter() - start, 'error': type(e).__name__ + ': ' + str(e)[:80]}
+
+
+async def main_async(args):
+    server = GPSSStandinServer(StandinConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        api_error_rate=args.api_error_rate,
+        malformed_rate=args.malformed_rate,
+        truncate_rate=args.truncate_rate,
+        total_hits=args.total_hits,
+        seed=args.seed
+    ))
+    base_url = await server.start()
+
+    service = GPSSAPIService(base_url=base_url)
+    service.response_cache = None
+    # 每次壓測使用獨立的熔斷器，避免與其他實例互相影響
+    service.circuit_breaker = CircuitBreaker("GPSS替身")
+    if not args.keep_rate_limit:
+        service.rate_limiter = KeyedRateLimiter(
+            global_rate=1e6, global_burst=1e6, per_key_rate=1e6, per_key_burst=1e6
+        )
+    await service.initialize()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(index: int):
+        async with semaphore:
+            return await run_one(service, index, args)
+
+    wall_start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        await service.close()
+        await server.stop()
+
+    ok = [result for result in results if result['ok']]
+    failed = [result for result in results if not result['ok']]
+    latencies = [result['seconds'] * 1000 for result in ok]
+    total_patents = sum(result['patents'] for result in ok)
+
+    print(f"替身伺服器: {base_url}（延遲 {args.latency}，HTTP錯誤 {args.error_rate:.0%}，不合法跳脫 {args.malformed_rate:.0%}）")
+    print(f"請求: {len(results)}，成功: {len(ok)}，失敗: {len(failed)}，並行: {args.concurrency}，"
+          f"{'串流解析' if args.streaming else '整批解析'}，每次 {args.max_results} 筆")
+    print(f"總耗時: {wall_seconds:.2f} s，吞吐量: {len(results) / wall_seconds:.1f} req/s，{total_patents / wall_seconds:.0f} 筆/s")
+    if latencies:
+        print(
+            f"延遲(ms): p50 {_percentile(latencies, 50):.0f}  p90 {_percentile(latencies, 90):.0f}  "
+            f"p99 {_percentile(latencies, 99):.0f}  max {max(latencies):.0f}  平均 {statistics.mean(latencies):.0f}"
+        )
+    print(f"伺服器統計: {server.stats}")
+    print(f"熔斷器: {service.circuit_breaker.get_stats()['state']}，"
+          f"CPU卸載: {service.get_service_stats()['cpu_offload']['executors']}")
+
+    errors: Dict[str, int] = {}
+    for result in failed:
+        errors[result['error']] = errors.get(result['error'], 0) + 1
+    for error, count in sorted(errors.items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count:>4} × {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPSS HTTP + 解析路徑離線壓測")
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--max-results', type=int, default=1000)
+    parser.add_argument('--streaming', action='store_true', help="使用串流解析路徑")
+    parser.add_argument('--unique-queries', action='store_true', help="每個請求使用不同查詢（避免合併相同請求）")
+    parser.add_argument('--latency', default='lognormal:0.5,0.4')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.05)
+    parser.add_argument('--truncate-rate', type=float, default=0.0)
+    parser.add_argument('--total-hits', type=int, default=3000)
+    parser.add_argument('--keep-rate-limit', action='store_true', help="保留正式的GPSS限流設定")
+    parser.add_argument('--user-code', default='standin-benchmark-user')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/gpss_json_repair_benchmark.py - GPSS JSON修復效能比較
+#
+# 比較舊版11次re.sub修復與新版單次掃描修復/逐筆搶救的耗時與可回收筆數。
+# 預設使用內建的合成語料（依實際遇過的不合法跳脫樣式產生），
+# 也可用 --corpus-dir 指定實際擷取的GPSS回應檔（*.json）。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.gpss_json_repair_benchmark
+#   python -m benchmarks.gpss_json_repair_benchmark --corpus-dir captured_responses --repeat 5
+
+import argparse
+import json
+import logging
+import random
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.ai_services.json_repair import loads_repaired, salvage_gpss_items
+
+# 舊版 _fix_json_escape_issues 的修復規則
+LEGACY_FIXES = [
+    (r'\\(?!["\\/bfnrt]|u[0-9a-fA-F]{4})', r'\\\\'),
+    (r'(?<!\\)\\(?!["\\/bfnrtu])', r'\\\\'),
+    (r'\\<', r'<'),
+    (r'\\>', r'>'),
+    (r'\\=', r'='),
+    (r'\\%', r'%'),
+    (r'\\#', r'#'),
+    (r'\\&', r'&'),
+    (r'\\\+', r'+'),
+    (r'\\([\u4e00-\u9fff])', r'\1'),
+    (r'\\(\d)', r'\1'),
+]
+
+# 實際回應中出現過的不合法跳脫片段
+MALFORMED_SNIPPETS = [
+    r'溫度\<100℃', r'壓力\>5MPa', r'x\=y', r'濃度\%', r'編號\#3', r'A\&B', r'C\+\+',
+    r'\中間層', r'\1至\9', r'C:\path\dir', r'\_底線', r'\u12', r'\a\c\d'
+]
+
+BASE_TEXT = "一種半導體封裝結構，包含基板、晶片與導線架，其中該晶片透過凸塊電性連接至該基板。"
+
+
+def legacy_parse(json_text: str) -> Dict:
+    """舊版流程：json.loads → 11次re.sub → 失敗則回傳空結果"""
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
+        pass
+
+    fixed_text = json_text
+    for pattern, replacement in LEGACY_FIXES:
+        fixed_text = re.sub(pattern, replacement, fixed_text)
+    try:
+        return json.loads(fixed_text)
+    except json.JSONDecodeError:
+        return {"gpss-API": {"patent": {"patentcontent": []}}}
+
+
+def new_parse(json_text: str) -> Dict:
+    """新版流程：json.loads → 單次掃描修復 → 逐筆搶救"""
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return loads_repaired(json_text)
+    except json.JSONDecodeError:
+        return salvage_gpss_items(json_text)
+
+
+def _make_item(rng: random.Random, index: int, malformed_rate: float) -> str:
+    text = BASE_TEXT * rng.randint(3, 12)
+    if rng.random() < malformed_rate:
+        insert_at = rng.randint(0, len(text))
+        text = text[:insert_at] + rng.choice(MALFORMED_SNIPPETS) + text[insert_at:]
+    claims = ("1. " + BASE_TEXT) * rng.randint(5, 30)
+    if rng.random() < malformed_rate / 2:
+        claims += "\n2. 如請求項1所述之結構。"  # 字串內的原始換行
+    return (
+        '{"publication-reference":{"doc-number":"TW%06d"},'
+        '"patent-title":{"title":"半導體封裝結構%d"},'
+        '"abstract":{"p":"%s"},"claims":{"claim":"%s"}}'
+    ) % (index, index, text, claims)
+
+
+def build_synthetic_corpus(seed: int = 42) -> List[Tuple[str, str]]:
+    """產生合成語料：(名稱, 回應文字)"""
+    rng = random.Random(seed)
+    corpus = []
+    for count, malformed_rate, broken_item in [
+        (100, 0.05, False),
+        (500, 0.10, False),
+        (1000, 0.10, False),
+        (1000, 0.30, False),
+        (1000, 0.10, True),   # 含一筆未跳脫引號的項目，需逐筆搶救
+    ]:
+        items = [_make_item(rng, i, malformed_rate) for i in range(count)]
+        if broken_item:
+            items[count // 2] = '{"publication-reference":{"doc-number":"TW999999"},"patent-title":{"title":"具有"凹槽"的封裝"}}'
+        body = '{"gpss-API":{"patent":{"patentcontent":[' + ','.join(items) + ']}}}'
+        corpus.append((f"synthetic_{count}_{int(malformed_rate * 100)}pct{'_broken' if broken_item else ''}", body))
+    return corpus
+
+
+def load_corpus_dir(corpus_dir: Path) -> List[Tuple[str, str]]:
+    return [
+        (path.name, path.read_text(encoding='utf-8', errors='replace'))
+        for path in sorted(corpus_dir.glob('*.json'))
+    ]
+
+
+def count_items(data: Dict) -> int:
+    content = data.get('gpss-API', {}).get('patent', {}).get('patentcontent', [])
+    return len(content) if isinstance(content, list) else 1
+
+
+def time_call(func, text: str, repeat: int) -> Tuple[float, Dict]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPSS JSON修復效能比較")
+    parser.add_argument('--corpus-dir', type=Path, help="實際GPSS回應檔目錄（*.json）")
+    parser.add_argument('--repeat', type=int, default=3, help="每份語料重複次數（取最佳值）")
+    args = parser.parse_args()
+
+    # 逐筆搶救會對每個略過的項目記錄警告，測量時不輸出
+    logging.basicConfig(level=logging.ERROR)
+
+    corpus = load_corpus_dir(args.corpus_dir) if args.corpus_dir else build_synthetic_corpus()
+
+    print(f"{'語料':<32}{'大小(MB)':>10}{'舊版(ms)':>12}{'新版(ms)':>12}{'加速':>8}{'舊版筆數':>10}{'新版筆數':>10}")
+    total_legacy = total_new = 0.0
+    for name, text in corpus:
+        legacy_time, legacy_result = time_call(legacy_parse, text, args.repeat)
+        new_time, new_result = time_call(new_parse, text, args.repeat)
+        total_legacy += legacy_time
+        total_new += new_time
+        size_mb = len(text.encode('utf-8')) / 1024 / 1024
+        speedup = legacy_time / new_time if new_time else 0
+        print(
+            f"{name:<32}{size_mb:>10.2f}{legacy_time * 1000:>12.1f}{new_time * 1000:>12.1f}"
+            f"{speedup:>7.1f}x{count_items(legacy_result):>10}{count_items(new_result):>10}"
+        )
+
+    if total_new:
+        print(f"\n合計: 舊版 {total_legacy * 1000:.1f} ms，新版 {total_new * 1000:.1f} ms，加速 {total_legacy / total_new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
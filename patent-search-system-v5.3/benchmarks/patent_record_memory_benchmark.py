@@ -0,0 +1,171 @@
+# benchmarks/patent_record_memory_benchmark.py - 專利資料模型記憶體比較
+#
+# 比較舊版dict流程與PatentRecord流程，在處理中途同時保留的記憶體量：
+#   舊版：解析dict → enhanced_patent（copy）→ 中文鍵名格式化dict，三份同時存在
+#   新版：PatentRecord（就地寫入技術特徵）→ 只在輸出時轉為中文鍵名dict
+# 兩種流程的欄位值由相同的合成資料產生（每筆專利各自的字串，與實際解析結果相同），
+# 以tracemalloc量測各階段累計配置量與峰值。欄位字串在量測前已建立，各副本只共用參照，
+# 因此差異來自每筆專利的dict/清單容器本身（舊版每多一份副本就多一個約20鍵的dict）。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.patent_record_memory_benchmark
+#   python -m benchmarks.patent_record_memory_benchmark --sizes 1000 10000 50000
+
+import argparse
+import gc
+import pickle
+import random
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from src.ai_services.patent_record import COUNTRY_DISPLAY_MAPPING, PatentRecord, build_patent_link
+
+BASE_TEXT = "一種半導體封裝結構，包含基板、晶片與導線架，其中該晶片透過凸塊電性連接至該基板。"
+DATABASES = [('TWA', 'TW'), ('TWB', 'TW'), ('USA', 'US'), ('USB', 'US'), ('JPA', 'JP'), ('CNA', 'CN'), ('EPA', 'EP')]
+IPC_CODES = ['H01L 23/00', 'H01L 21/56', 'G01R 31/28', 'H05K 1/18', 'B81B 7/00']
+
+
+def _fresh(value: str) -> str:
+    """產生新的字串物件（模擬json.loads對每筆專利各自建立的字串）"""
+    return (value + ' ')[:-1]
+
+
+def make_fields(rng: random.Random, index: int) -> Dict:
+    """產生一筆專利解析後的欄位值"""
+    database, country = rng.choice(DATABASES)
+    status = rng.choice('AB')
+    return {
+        'title': f"半導體封裝結構及其製造方法{index}",
+        'applicants': f"台灣積體電路製造股份有限公司{index % 97}; 日月光半導體製造股份有限公司",
+        'inventors': f"王大明{index % 31}; 陳小華",
+        'abstract': BASE_TEXT * rng.randint(3, 8),
+        'claims': ("1. " + BASE_TEXT) * rng.randint(5, 20),
+        'publication_number': f"TW{index:07d}{status}",
+        'application_number': f"{110100000 + index}",
+        'publication_date': _fresh("20230101"),
+        'application_date': _fresh("20210615"),
+        'priority_date': _fresh("N/A"),
+        'ipc_classes': [_fresh(code) for code in rng.sample(IPC_CODES, 2)],
+        'database': _fresh(database),
+        'country': _fresh(country),
+        'patent_type': _fresh("invention"),
+        'status': _fresh(status),
+        'case_type': _fresh(status),
+        '_source_index': index
+    }
+
+
+FEATURES = {'technical_features': ['封裝基板結構', '凸塊連接'], 'technical_effects': ['提升散熱效率', '降低封裝厚度']}
+
+
+def legacy_pipeline(raw_fields: List[Dict]) -> Tuple[List, List, List]:
+    """舊版：解析dict、enhanced_patent副本、格式化dict（三份同時保留到格式化完成）"""
+    parsed = [dict(fields) for fields in raw_fields]
+
+    enhanced = []
+    for patent in parsed:
+        enhanced_patent = patent.copy()
+        enhanced_patent['technical_features'] = list(FEATURES['technical_features'])
+        enhanced_patent['technical_effects'] = list(FEATURES['technical_effects'])
+        enhanced.append(enhanced_patent)
+
+    formatted = []
+    for i, patent in enumerate(enhanced):
+        country = patent.get('country', 'TW')
+        formatted.append({
+            "序號": i + 1,
+            "專利名稱": patent.get('title', 'N/A'),
+            "申請人": patent.get('applicants', 'N/A'),
+            "國家": COUNTRY_DISPLAY_MAPPING.get(country, country),
+            "申請號": patent.get('application_number', 'N/A'),
+            "公開公告號": patent.get('publication_number', 'N/A'),
+            "摘要": patent.get('abstract', 'N/A'),
+            "專利範圍": patent.get('claims', 'N/A'),
+            "技術特徵": patent.get('technical_features', []),
+            "技術功效": patent.get('technical_effects', []),
+            "專利連結": build_patent_link(patent.get('publication_number', '')),
+            "_debug_info": {
+                "raw_applicants": patent.get('applicants'),
+                "raw_country": patent.get('country'),
+                "database": patent.get('database', 'Unknown')
+            }
+        })
+    return parsed, enhanced, formatted
+
+
+def record_pipeline(raw_fields: List[Dict]) -> Tuple[List, List]:
+    """新版：PatentRecord就地寫入技術特徵，輸出時才轉為中文鍵名dict"""
+    records = []
+    for fields in raw_fields:
+        values = dict(fields)
+        values.pop('case_type')
+        source_index = values.pop('_source_index')
+        record = PatentRecord(**values)
+        record.source_index = source_index
+        records.append(record)
+
+    for record in records:
+        record.technical_features = list(FEATURES['technical_features'])
+        record.technical_effects = list(FEATURES['technical_effects'])
+
+    formatted = [record.to_result_dict(i + 1) for i, record in enumerate(records)]
+    return records, formatted
+
+
+def measure(func: Callable, raw_fields: List[Dict]) -> Tuple[int, int, object]:
+    """回傳（保留中的配置量, 峰值, 結果）"""
+    gc.collect()
+    tracemalloc.start()
+    result = func(raw_fields)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, result
+
+
+def measure_models(raw_fields: List[Dict]) -> Tuple[int, int]:
+    """只量測模型本身（不含輸出dict）：解析後的dict列表 vs PatentRecord列表"""
+    current_dict, _, _ = measure(lambda data: [dict(fields) for fields in data], raw_fields)
+    current_record, _, _ = measure(lambda data: record_pipeline(data)[0], raw_fields)
+    return current_dict, current_record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="專利資料模型記憶體比較")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="專利筆數")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'筆數':>8}{'階段':>16}{'舊版dict(MB)':>16}{'PatentRecord(MB)':>20}{'節省':>8}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        raw_fields = [make_fields(rng, i) for i in range(size)]
+
+        legacy_current, legacy_peak, legacy_result = measure(legacy_pipeline, raw_fields)
+        del legacy_result
+        record_current, record_peak, record_result = measure(record_pipeline, raw_fields)
+        records = record_result[0]
+        del record_result
+        model_dict, model_record = measure_models(raw_fields)
+
+        rows = [
+            ('模型本身', model_dict, model_record),
+            ('流程保留', legacy_current, record_current),
+            ('流程峰值', legacy_peak, record_peak),
+        ]
+        for label, legacy_bytes, record_bytes in rows:
+            saving = (1 - record_bytes / legacy_bytes) * 100 if legacy_bytes else 0
+            print(
+                f"{size:>8}{label:>16}{legacy_bytes / 1024 / 1024:>16.2f}"
+                f"{record_bytes / 1024 / 1024:>20.2f}{saving:>7.1f}%"
+            )
+
+        # 行程池回傳時的序列化大小
+        dict_pickle = len(pickle.dumps([dict(fields) for fields in raw_fields[:1000]]))
+        record_pickle = len(pickle.dumps(records[:1000]))
+        print(f"{size:>8}{'pickle(前1000筆)':>16}{dict_pickle / 1024 / 1024:>16.2f}{record_pickle / 1024 / 1024:>20.2f}"
+              f"{(1 - record_pickle / dict_pickle) * 100:>7.1f}%")
+        print()
+
+
+if __name__ == '__main__':
+    main()
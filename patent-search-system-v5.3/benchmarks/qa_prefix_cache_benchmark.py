@@ -0,0 +1,176 @@
+# benchmarks/qa_prefix_cache_benchmark.py - 問答提示詞排列：每輪prefill延遲（舊排列 vs 固定前綴排列）
+#
+# 於同一事件迴圈內啟動開啟前綴快取模擬的 Qwen替身伺服器（src/external_apis/qwen_standin_server.py），
+# 以合成的會話專利與多輪問答，比較兩種訊息排列在模型伺服器前綴快取下的每輪prefill延遲：
+#   舊排列：本輪專利上下文放在系統訊息，之後接對話歷史與問題（上下文每輪不同，前綴每輪失效）
+#   新排列：EnhancedPatentQAService._build_qa_payload 的排列——系統提示詞+會話專利清單 → 對話歷史 → 本輪參考資料與問題
+# 每輪請求以 max_tokens=1 送出，量測的延遲即首token前的時間（固定開銷 + 未命中快取部分的prefill）。
+# 以 --context-window 縮小上下文長度可觀察對話歷史修剪時的前綴變化（新排列依 QA_HISTORY_DROP_BLOCK 區塊捨棄）。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.qa_prefix_cache_benchmark
+#   python -m benchmarks.qa_prefix_cache_benchmark --turns 40 --context-window 12000   # 觸發對話歷史修剪
+#   python -m benchmarks.qa_prefix_cache_benchmark --patents 200 --prefill-tokens-per-s 3000
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from src.ai_services.token_budget import token_budget
+from src.config import settings
+from src.external_apis.qwen_standin_server import QwenStandinConfig, QwenStandinServer
+from src.services.enhanced_patent_qa_service import ConversationManager, EnhancedPatentQAService
+
+SUBJECTS = ['半導體封裝', '探針卡', '晶圓檢測', '導線架', '凸塊基板', '散熱模組', '光罩', '蝕刻製程', '記憶體控制器', '感測器']
+SEARCH_TYPE = 'tech_description_search'
+
+
+def build_patents(count: int) -> List[Dict]:
+    patents = []
+    for index in range(count):
+        subject = SUBJECTS[index % len(SUBJECTS)]
+        patents.append({
+            '序號': index + 1,
+            '專利名稱': f"{subject}裝置及其製造方法（樣本{index}）",
+            '公開公告號': f"TW{100000 + index}B",
+            '申請人': f"範例科技股份有限公司{index % 7}",
+            '國家': 'TW',
+            '摘要': (f"本發明揭露一種{subject}結構，樣本編號{index}，包含基板、晶片與連接元件，"
+                     f"藉由改良的配置方式提升可靠度並降低製造成本。") * 4,
+            '技術特徵': [f"{subject}之基板與晶片堆疊結構設計", f"{subject}採用凸塊電性連接機制", f"{subject}之導線架佈局"],
+            '技術功效': [f"提升{subject}的散熱效率與可靠度", f"降低{subject}的封裝厚度與製造成本"],
+            '_search_type': SEARCH_TYPE
+        })
+    return patents
+
+
+def build_answer(turn: int, target: int) -> str:
+    return (f"第{target}筆專利著重於基板與晶片的堆疊結構，相較於其他專利採用凸塊連接（第{turn}輪回答），"
+            f"在散熱路徑與製造成本上有所不同。") * 6
+
+
+async def run_layout(
+    service: EnhancedPatentQAService,
+    http: aiohttp.ClientSession,
+    api_url: str,
+    patents: List[Dict],
+    args,
+    stable_prefix: bool
+) -> Dict:
+    session_id = f"bench-{'stable' if stable_prefix else 'legacy'}"
+    legacy_manager = ConversationManager(max_tokens=args.context_window)
+    legacy_manager.history_drop_block = 1  # 舊版逐輪捨棄
+    session_digest = service._build_session_digest(patents)
+
+    history = []
+    latencies, prompt_tokens, cached_tokens = [], [], []
+    for turn in range(args.turns):
+        target = turn * 7 % len(patents) + 1
+        question = f"請說明第{target}筆專利的技術特徵與功效？"
+        referenced = service._extract_patent_references(question, patents)
+        context = service._build_multi_search_context(question, patents, referenced, SEARCH_TYPE)
+        enhanced_question = service._enhance_question_with_search_info(question, [SEARCH_TYPE], SEARCH_TYPE, len(patents))
+
+        if stable_prefix:
+            payload = service._build_qa_payload(
+                enhanced_question, context, history,
+                session_digest=session_digest, session_id=session_id
+            )
+        else:
+            messages = legacy_manager.build_messages_with_history(
+                service.QA_SYSTEM_PROMPT + f"\n\n專利檢索結果：\n{context}", "", enhanced_question, history
+            )
+            payload = {"model": service.qwen_model, "messages": messages, "temperature": 0.3}
+        payload['max_tokens'] = 1
+        payload['stream'] = False
+
+        started = time.perf_counter()
+        async with http.post(f"{api_url}/v1/chat/completions", json=payload) as response:
+            data = await response.json()
+        latencies.append((time.perf_counter() - started) * 1000)
+        usage = data.get('usage', {})
+        prompt_tokens.append(usage.get('prompt_tokens', 0))
+        cached_tokens.append((usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0))
+
+        history.append({'question': question, 'answer': build_answer(turn, target)})
+
+    return {
+        'label': '新排列（固定前綴）' if stable_prefix else '舊排列（上下文在系統訊息）',
+        'latencies': latencies,
+        'prompt_tokens': prompt_tokens,
+        'cached_tokens': cached_tokens
+    }
+
+
+def print_result(result: Dict, show_turns: bool):
+    latencies = result['latencies']
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    total_prompt = sum(result['prompt_tokens'])
+    total_cached = sum(result['cached_tokens'])
+    # 第一輪兩種排列都無快取可用，另列第2輪起的平均
+    follow_up = latencies[1:] or latencies
+    print(f"\n{result['label']}")
+    print(f"  每輪prefill延遲  平均 {statistics.mean(latencies):8.1f} ms   第2輪起平均 {statistics.mean(follow_up):8.1f} ms   "
+          f"p95 {p95:8.1f} ms   最大 {ordered[-1]:8.1f} ms")
+    print(f"  輸入token        合計 {total_prompt}   命中前綴快取 {total_cached}（{total_cached / max(total_prompt, 1) * 100:.1f}%）")
+    if show_turns:
+        for turn, (latency, prompt, cached) in enumerate(zip(latencies, result['prompt_tokens'], result['cached_tokens']), 1):
+            print(f"    第{turn:>3}輪  {latency:8.1f} ms   輸入 {prompt:>6}   快取 {cached:>6}")
+
+
+async def main_async(args):
+    settings.QWEN_CONTEXT_WINDOW = args.context_window
+    server = QwenStandinServer(QwenStandinConfig(
+        request_overhead_ms=args.request_overhead_ms,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        time_scale=args.time_scale,
+        prefix_cache=True
+    ))
+    api_url = await server.start()
+
+    service = EnhancedPatentQAService()
+    service.conversation_manager = ConversationManager(max_tokens=args.context_window)
+    token_budget.context_window = args.context_window
+    patents = build_patents(args.patents)
+
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300.0)) as http:
+            results = []
+            for stable_prefix in (False, True):
+                results.append(await run_layout(service, http, api_url, patents, args, stable_prefix))
+    finally:
+        await server.stop()
+
+    print(f"會話專利 {args.patents} 筆（清單 {token_budget.count(service._build_session_digest(patents))} tokens），"
+          f"{args.turns} 輪問答，上下文長度 {args.context_window}，prefill {args.prefill_tokens_per_s:.0f} token/s")
+    for result in results:
+        print_result(result, args.show_turns)
+
+    legacy, stable = (statistics.mean(result['latencies'][1:] or result['latencies']) for result in results)
+    print(f"\n第2輪起平均prefill延遲：{legacy:.1f} ms → {stable:.1f} ms（{(1 - stable / legacy) * 100 if legacy else 0:+.1f}% 減少）")
+    print(f"服務統計: { {key: value for key, value in service.get_service_stats().items() if key != 'token_budget'} }")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="問答提示詞排列的每輪prefill延遲比較")
+    parser.add_argument('--patents', type=int, default=60, help="會話中的專利筆數")
+    parser.add_argument('--turns', type=int, default=20, help="問答輪數")
+    parser.add_argument('--context-window', type=int, default=settings.QWEN_CONTEXT_WINDOW)
+    parser.add_argument('--request-overhead-ms', type=float, default=50.0)
+    parser.add_argument('--prefill-tokens-per-s', type=float, default=6000.0)
+    parser.add_argument('--time-scale', type=float, default=1.0)
+    parser.add_argument('--show-turns', action='store_true', help="列出每輪的延遲與token數")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
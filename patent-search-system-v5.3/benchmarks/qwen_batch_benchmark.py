@@ -0,0 +1,141 @@
+# benchmarks/qwen_batch_benchmark.py - 技術特徵生成：逐筆提示詞 vs 合併提示詞 吞吐量比較
+#
+# 於同一事件迴圈內啟動 Qwen替身伺服器（src/external_apis/qwen_standin_server.py），
+# 以真實的 QwenAPIService 與 ImprovedPatentProcessingService._process_patents_with_batching
+# 分別在 QWEN_BATCH_FEATURES_ENABLED 關閉/開啟下處理同一組合成專利，
+# 比較總耗時、吞吐量、Qwen請求數、輸入token數與單筆補呼叫次數。
+# 不使用技術特徵快取，並關閉重複專利分群（合成專利內容皆不相同）。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.qwen_batch_benchmark --patents 120
+#   python -m benchmarks.qwen_batch_benchmark --patents 200 --token-budget 8000 --max-batch 10
+#   python -m benchmarks.qwen_batch_benchmark --drop-rate 0.05 --malformed-rate 0.02   # 觀察補呼叫
+#   python -m benchmarks.qwen_batch_benchmark --time-scale 0.1                         # 縮短延遲快速試跑
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from src.ai_services.patent_record import PatentRecord
+from src.ai_services.qwen_service import QwenAPIService
+from src.config import settings
+from src.external_apis.qwen_standin_server import QwenStandinConfig, QwenStandinServer
+from src.services.improved_patent_processing_service import ImprovedPatentProcessingService
+
+SUBJECTS = ['半導體封裝', '探針卡', '晶圓檢測', '導線架', '凸塊基板', '散熱模組', '光罩', '蝕刻製程', '記憶體控制器', '感測器']
+
+
+def build_patents(count: int) -> List[PatentRecord]:
+    patents = []
+    for index in range(count):
+        subject = SUBJECTS[index % len(SUBJECTS)]
+        patents.append(PatentRecord(
+            title=f"{subject}裝置及其製造方法（樣本{index}）",
+            abstract=(f"本發明揭露一種{subject}結構，樣本編號{index}，包含基板、晶片與連接元件，"
+                      f"藉由改良的配置方式提升可靠度並降低製造成本。") * 4,
+            claims=(f"1. 一種{subject}，包含：一基板；一晶片，設置於該基板上；以及複數個連接元件。"
+                    f"2. 如請求項1所述之{subject}，其中該連接元件為凸塊。") * 3,
+            publication_number=f"TW{100000 + index}B",
+            application_number=f"{110000000 + index}",
+            country='TW'
+        ))
+    return patents
+
+
+async def run_path(service: ImprovedPatentProcessingService, server: QwenStandinServer, args, batched: bool) -> Dict:
+    settings.QWEN_BATCH_FEATURES_ENABLED = batched
+    patents = build_patents(args.patents)
+    requests_before = server.stats['requests']
+    prompt_tokens_before = server.stats['prompt_tokens']
+    completion_tokens_before = server.stats['completion_tokens']
+    fallbacks_before = service.qwen_service.batch_item_fallbacks
+
+    start = time.perf_counter()
+    processed = await service._process_patents_with_batching(patents)
+    seconds = time.perf_counter() - start
+
+    return {
+        'label': '合併提示詞' if batched else '逐筆提示詞',
+        'seconds': seconds,
+        'patents': len(processed),
+        'with_features': sum(1 for patent in processed if patent.technical_features),
+        'errors': sum(1 for patent in processed if patent.processing_error),
+        'requests': server.stats['requests'] - requests_before,
+        'prompt_tokens': server.stats['prompt_tokens'] - prompt_tokens_before,
+        'completion_tokens': server.stats['completion_tokens'] - completion_tokens_before,
+        'fallbacks': service.qwen_service.batch_item_fallbacks - fallbacks_before
+    }
+
+
+async def main_async(args):
+    server = QwenStandinServer(QwenStandinConfig(
+        request_overhead_ms=args.request_overhead_ms,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        decode_tokens_per_s=args.decode_tokens_per_s,
+        max_sequence_decode_rate=args.max_sequence_decode_rate,
+        max_sequences=args.max_sequences,
+        drop_rate=args.drop_rate,
+        malformed_rate=args.malformed_rate,
+        time_scale=args.time_scale,
+        seed=args.seed
+    ))
+    api_url = await server.start()
+
+    settings.PATENT_DEDUP_ENABLED = False
+    settings.QWEN_BATCH_TOKEN_BUDGET = args.token_budget
+    settings.QWEN_BATCH_MAX_PATENTS = args.max_batch
+
+    service = ImprovedPatentProcessingService()
+    service.qwen_service = QwenAPIService(api_url)
+    await service.qwen_service.initialize()
+    # 不呼叫 service.initialize()：不連線GPSS、不啟用技術特徵快取
+
+    try:
+        results = [await run_path(service, server, args, batched) for batched in (False, True)]
+    finally:
+        await service.qwen_service.close()
+        await server.stop()
+
+    print(f"替身伺服器: {api_url}（固定開銷 {args.request_overhead_ms:.0f} ms，prefill {args.prefill_tokens_per_s:.0f} tok/s，"
+          f"decode {args.decode_tokens_per_s:.0f} tok/s，單序列上限 {args.max_sequence_decode_rate:.0f} tok/s，時間倍率 {args.time_scale}）")
+    print(f"專利: {args.patents} 筆，token預算 {args.token_budget}，每批最多 {args.max_batch} 筆，"
+          f"批次缺漏 {args.drop_rate:.0%}，格式錯誤 {args.malformed_rate:.0%}")
+    for result in results:
+        print(
+            f"{result['label']}: {result['seconds']:.2f} s，{result['patents'] / result['seconds']:.1f} 筆/s，"
+            f"Qwen請求 {result['requests']}，輸入 {result['prompt_tokens']} tok，輸出 {result['completion_tokens']} tok，"
+            f"有特徵 {result['with_features']}/{result['patents']}，錯誤 {result['errors']}，單筆補呼叫 {result['fallbacks']}"
+        )
+
+    single, batched = results
+    if batched['seconds'] > 0:
+        print(f"加速: {single['seconds'] / batched['seconds']:.2f}×，"
+              f"請求數 {single['requests']} → {batched['requests']}，"
+              f"輸入token {single['prompt_tokens']} → {batched['prompt_tokens']}")
+    print(f"伺服器統計: {server.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技術特徵生成：逐筆 vs 合併提示詞 吞吐量比較")
+    parser.add_argument('--patents', type=int, default=120)
+    parser.add_argument('--token-budget', type=int, default=settings.QWEN_BATCH_TOKEN_BUDGET)
+    parser.add_argument('--max-batch', type=int, default=settings.QWEN_BATCH_MAX_PATENTS)
+    parser.add_argument('--request-overhead-ms', type=float, default=150.0)
+    parser.add_argument('--prefill-tokens-per-s', type=float, default=6000.0)
+    parser.add_argument('--decode-tokens-per-s', type=float, default=600.0)
+    parser.add_argument('--max-sequence-decode-rate', type=float, default=35.0)
+    parser.add_argument('--max-sequences', type=int, default=32)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="批次回應省略項目的比例")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="回應JSON格式錯誤的比例")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="替身伺服器延遲倍率")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/token_budget_benchmark.py - token計算成本（分詞器 vs 粗估、快取命中 vs 未命中）
+#
+# 以合成的專利標題/摘要/權利要求、關鍵字描述與問答上下文，量測 src/ai_services/token_budget.py 在
+# 請求路徑上的成本：首次計數（需實際分詞）、重複字串計數（LRU快取）、依token截斷，
+# 以及問答 ConversationManager.build_messages_with_history 整體分配上下文與對話歷史的耗時。
+# 載入分詞器時另列出粗估與實際token數的誤差。
+#
+# 執行方式（於專案根目錄）：
+#   python -m benchmarks.token_budget_benchmark                                   # 依設定載入分詞器
+#   python -m benchmarks.token_budget_benchmark --tokenizer-path /models/qwen/tokenizer.json
+#   python -m benchmarks.token_budget_benchmark --heuristic                       # 只量測粗估
+
+import argparse
+import logging
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from src.ai_services.token_budget import estimate_tokens_heuristic, token_budget as budget
+from src.config import settings
+
+SUBJECTS = ['半導體封裝', '探針卡', '晶圓檢測', '導線架', '凸塊基板', '散熱模組', '光罩', '蝕刻製程', '記憶體控制器', '感測器']
+
+
+def build_texts(count: int) -> Dict[str, List[str]]:
+    titles, abstracts, claims, descriptions = [], [], [], []
+    for index in range(count):
+        subject = SUBJECTS[index % len(SUBJECTS)]
+        titles.append(f"{subject}裝置及其製造方法（樣本{index}）")
+        abstracts.append((f"本發明揭露一種{subject}結構，樣本編號{index}，包含基板、晶片與連接元件，"
+                          f"藉由改良的配置方式提升可靠度並降低製造成本。The {subject} structure (sample {index}) "
+                          f"includes a substrate, a die and interconnects. ") * 6)
+        claims.append((f"1. 一種{subject}，包含：一基板；一晶片，設置於該基板上；以及複數個連接元件。"
+                       f"2. 如請求項1所述之{subject}，其中該連接元件為凸塊，凸塊間距小於{40 + index % 20}微米。") * 8)
+        descriptions.append(f"我們正在開發一種用於{subject}的自動化檢測系統，需要在高溫環境下維持量測精度，"
+                            f"並整合影像辨識以判斷缺陷類型（案例{index}）。" * 4)
+    return {'title': titles, 'abstract': abstracts, 'claims': claims, 'description': descriptions}
+
+
+def time_each(func: Callable[[str], object], texts: List[str]) -> List[float]:
+    samples = []
+    for text in texts:
+        started = time.perf_counter()
+        func(text)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(label: str, samples: List[float]) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"{label:<28} 平均 {statistics.mean(samples):7.3f} ms   p95 {p95:7.3f} ms   最大 {ordered[-1]:7.3f} ms"
+
+
+def build_history(turns: int) -> List[Dict]:
+    return [
+        {
+            'question': f"第{turn}個問題：請比較第{turn % 5 + 1}筆與第{turn % 7 + 1}筆專利的技術特徵差異？",
+            'answer': (f"第{turn % 5 + 1}筆專利著重於基板與晶片的堆疊結構，而第{turn % 7 + 1}筆專利採用凸塊連接，"
+                       f"兩者在散熱路徑與製造成本上有所不同。") * 5
+        }
+        for turn in range(turns)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="token計算成本：分詞器 vs 粗估、快取命中 vs 未命中")
+    parser.add_argument('--texts', type=int, default=300, help="每種欄位的合成文字筆數")
+    parser.add_argument('--tokenizer-path', default=None)
+    parser.add_argument('--tokenizer-name', default=None)
+    parser.add_argument('--heuristic', action='store_true', help="不載入分詞器")
+    parser.add_argument('--turns', type=int, default=40, help="問答對話歷史輪數")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.tokenizer_path is not None:
+        settings.QWEN_TOKENIZER_PATH = args.tokenizer_path
+    if args.tokenizer_name is not None:
+        settings.QWEN_TOKENIZER_NAME = args.tokenizer_name
+
+    budget.cache_size = max(budget.cache_size, args.texts * 8)
+    started = time.perf_counter()
+    if not args.heuristic:
+        budget.load()
+    load_ms = (time.perf_counter() - started) * 1000
+    print(f"計算方式: {budget.backend}（{budget.tokenizer_source or '粗估'}），載入 {load_ms:.0f} ms")
+
+    texts = build_texts(args.texts)
+    for field, field_texts in texts.items():
+        cold = time_each(budget.count, field_texts)
+        warm = time_each(budget.count, field_texts)
+        avg_chars = statistics.mean(len(text) for text in field_texts)
+        avg_tokens = statistics.mean(budget.count(text) for text in field_texts)
+        print(f"[{field}] 平均 {avg_chars:.0f} 字，{avg_tokens:.0f} tokens")
+        print("  " + summarize("首次計數", cold))
+        print("  " + summarize("重複字串（快取）", warm))
+
+        if budget.backend == 'tokenizer':
+            errors = [
+                (estimate_tokens_heuristic(text) - budget.count(text)) / max(budget.count(text), 1) * 100
+                for text in field_texts
+            ]
+            print(f"  粗估誤差                     平均 {statistics.mean(errors):+.1f}%   "
+                  f"範圍 {min(errors):+.1f}% ~ {max(errors):+.1f}%")
+
+    limits = {
+        'title': settings.QWEN_FEATURE_TITLE_TOKENS,
+        'abstract': settings.QWEN_FEATURE_ABSTRACT_TOKENS,
+        'claims': settings.QWEN_FEATURE_CLAIMS_TOKENS,
+        'description': settings.QWEN_KEYWORD_DESCRIPTION_TOKENS
+    }
+    print("\n依token截斷（設定的欄位上限）")
+    for field, field_texts in texts.items():
+        doubled = [text + text for text in field_texts]  # 加倍長度，確保需要截斷
+        samples = time_each(lambda text: budget.truncate(text, limits[field]), doubled)
+        print("  " + summarize(f"{field} ≤ {limits[field]} tokens", samples))
+
+    try:
+        from src.services.enhanced_patent_qa_service import ConversationManager
+    except ImportError as e:
+        print(f"\n略過問答訊息構建量測（{e}）")
+    else:
+        manager = ConversationManager()
+        history = build_history(args.turns)
+        context = '\n'.join(f"專利 {i + 1}：{texts['title'][i]}\n- 摘要：{texts['abstract'][i]}" for i in range(min(30, args.texts)))
+        samples = []
+        for turn in range(50):
+            question = f"第{turn}輪：請說明第3筆專利的技術功效？"
+            started = time.perf_counter()
+            messages = manager.build_messages_with_history("你是一個專業的專利檢索助手。", context, question, history)
+            budget.fit_max_tokens(messages, manager.response_tokens)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"\n問答訊息構建（上下文 {budget.count(context)} tokens，歷史 {args.turns} 輪，上下文上限 {manager.max_tokens}）")
+        print("  " + summarize("build_messages + max_tokens", samples))
+
+    print(f"\n統計: {budget.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
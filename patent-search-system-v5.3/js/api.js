@@ -117,15 +117,17 @@ class APIService {
      * 生成關鍵字
      * @param {string} description - 技術描述
      * @param {string} sessionId - 會話ID
+     * @param {string} userCode - 用戶API碼（供確認期間預先檢索）
      * @returns {Promise<Object>} 關鍵字生成結果
      */
-    async generateKeywords(description, sessionId) {
+    async generateKeywords(description, sessionId, userCode) {
         try {
             const response = await this.request('/api/v1/patents/keywords/generate-for-confirmation', {
                 method: 'POST',
                 body: JSON.stringify({
                     description: description,
-                    session_id: sessionId
+                    session_id: sessionId,
+                    user_code: userCode || null
                 })
             });
             return response;
@@ -294,6 +296,76 @@ class APIService {
         }
     }
 
+    /**
+     * 發送帶記憶的串流問答請求（Server-Sent Events）
+     * @param {string} sessionId - 會話ID
+     * @param {string} question - 問題
+     * @param {Function} onToken - 每收到一段文字時呼叫 onToken(text)
+     * @returns {Promise<Object|null>} done事件的完整回答（附上start事件的context_info），串流在done之前結束時為null
+     * @throws {Error} 收到error事件時拋出 serverReported 為 true 的錯誤，其餘為連線或HTTP錯誤
+     */
+    async askWithMemoryStream(sessionId, question, onToken) {
+        const response = await fetch(`${this.baseUrl}/api/v1/patents/qa/ask-with-memory/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({
+                session_id: sessionId,
+                question: question,
+                use_memory: true
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`串流問答請求失敗: HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let result = null;
+        let contextInfo = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // 事件之間以空行分隔
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventType = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (!data) continue;
+
+                const payload = JSON.parse(data);
+                if (eventType === 'start') {
+                    contextInfo = payload.context_info || null;
+                } else if (eventType === 'delta') {
+                    if (onToken) onToken(payload.content);
+                } else if (eventType === 'done') {
+                    result = { context_info: contextInfo, ...payload };
+                } else if (eventType === 'error') {
+                    // 伺服器已處理並回報失敗，與連線中斷區分開來
+                    const error = new Error(payload.error || payload.answer || '串流問答失敗');
+                    error.serverReported = true;
+                    throw error;
+                }
+            }
+        }
+
+        return result;
+    }
+
     /**
      * 獲取記憶狀態
      * @param {string} sessionId - 會話ID
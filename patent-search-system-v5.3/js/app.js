@@ -344,7 +344,8 @@ class PatentSearchApp {
             uiManager.showLoading('loading-tech');
             uiManager.startProgressAnimation('progress-fill', 'progress-text', 10000);
 
-            const response = await searchManager.generateKeywords(description);
+            const gpssApiKey = uiManager.getInputValue('gpssApiKey');
+            const response = await searchManager.generateKeywords(description, gpssApiKey);
             
             if (response.success) {
                 this.currentSessionId = response.session_id;
@@ -208,9 +208,13 @@ class ChatManager {
         this.showTyping();
         
         try {
-            const response = await this.callQwenAPI(message, this.memoryEnabled);
-            this.hideTyping();
-            this.addChatMessage('assistant', response.answer, this.memoryEnabled, response);
+            if (this.memoryEnabled) {
+                await this.streamChatAnswer(message);
+            } else {
+                const response = await this.callQwenAPI(message, false);
+                this.hideTyping();
+                this.addChatMessage('assistant', response.answer, false, response);
+            }
             
             // 更新記憶狀態
             await this.updateMemoryStatus();
@@ -222,6 +226,71 @@ class ChatManager {
         }
     }
 
+    /**
+     * 以串流方式取得記憶問答的回答，收到文字即逐段顯示
+     * 連線或傳輸失敗時移除未完成的回答，改用一般記憶問答；伺服器回報的錯誤直接拋出
+     * @param {string} userMessage - 用戶消息
+     */
+    async streamChatAnswer(userMessage) {
+        if (!this.currentSessionId) {
+            throw new Error('會話ID未設置');
+        }
+
+        let streamingDiv = null;
+        let streamedText = '';
+
+        try {
+            const result = await apiService.askWithMemoryStream(this.currentSessionId, userMessage, (text) => {
+                if (!streamingDiv) {
+                    this.hideTyping();
+                    streamingDiv = this.createStreamingMessage();
+                }
+                streamedText += text;
+                if (streamingDiv) {
+                    streamingDiv.querySelector('.message-content').textContent = streamedText;
+                    this.elements.chatMessages.scrollTop = this.elements.chatMessages.scrollHeight;
+                }
+            });
+
+            if (!result) {
+                throw new Error('串流在完成前中斷');
+            }
+
+            // 以完整回答（含來源說明與執行資訊）取代串流中的訊息
+            if (streamingDiv) streamingDiv.remove();
+            this.hideTyping();
+            this.addChatMessage('assistant', result.answer, true, result);
+        } catch (error) {
+            if (streamingDiv) streamingDiv.remove();
+            if (error.serverReported) {
+                // 問題已在伺服器端處理過，重送只會重複同樣的失敗
+                throw error;
+            }
+
+            console.warn('串流問答失敗，改用一般問答:', error);
+            this.showTyping();
+
+            const response = await this.callQwenAPI(userMessage, true);
+            this.hideTyping();
+            this.addChatMessage('assistant', response.answer, true, response);
+        }
+    }
+
+    /**
+     * 建立串流中的助理訊息（不寫入聊天歷史）
+     * @returns {HTMLElement|null} 訊息元素
+     */
+    createStreamingMessage() {
+        if (!this.elements.chatMessages) return null;
+
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'chat-message assistant memory-enabled';
+        messageDiv.innerHTML = '<div class="message-content"></div>';
+
+        this.elements.chatMessages.appendChild(messageDiv);
+        return messageDiv;
+    }
+
     /**
      * 調用QWEN API
      * @param {string} userMessage - 用戶消息
@@ -25,9 +25,10 @@ class SearchManager {
     /**
      * 生成關鍵字
      * @param {string} description - 技術描述
+     * @param {string} gpssApiKey - GPSS API密鑰
      * @returns {Promise<Object>} 生成結果
      */
-    async generateKeywords(description) {
+    async generateKeywords(description, gpssApiKey) {
         if (!description || description.length < 50) {
             throw new Error('技術描述太短，請提供更詳細的描述（至少50個字）');
         }
@@ -37,7 +38,7 @@ class SearchManager {
         }
 
         try {
-            const response = await apiService.generateKeywords(description, this.currentSessionId);
+            const response = await apiService.generateKeywords(description, this.currentSessionId, gpssApiKey);
             
             if (response.success) {
                 this.currentSessionId = response.session_id;
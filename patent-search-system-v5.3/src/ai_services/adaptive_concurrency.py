@@ -0,0 +1,216 @@
+# src/ai_services/adaptive_concurrency.py - Qwen呼叫的自適應並行控制（AIMD）
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LimiterTicket:
+    """單次呼叫佔用的並行名額，呼叫完成後回報結果"""
+
+    __slots__ = ('limiter', 'generation', 'saturated', 'started_at', 'reported')
+
+    def __init__(self, limiter: "AdaptiveConcurrencyLimiter", generation: int, saturated: bool):
+        self.limiter = limiter
+        self.generation = generation
+        self.saturated = saturated
+        self.started_at = time.monotonic()
+        self.reported = False
+
+    def succeeded(self, work_units: Optional[int] = None):
+        """
+        回報成功；work_units為輸出token數（有提供時以每token延遲判斷延遲突增，
+        避免長回應被誤判為過載）
+        """
+        if not self.reported:
+            self.reported = True
+            self.limiter._on_success(self, time.monotonic() - self.started_at, work_units)
+
+    def overloaded(self, reason: str):
+        """回報過載（429、5xx、逾時、連線錯誤）"""
+        if not self.reported:
+            self.reported = True
+            self.limiter._on_overload(self, reason)
+
+    def ignored(self):
+        """結果與伺服器負載無關（例如4xx請求錯誤），不調整上限"""
+        self.reported = True
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    加性增、乘性減（AIMD）的並行上限
+    - 名額用滿時每完成一個健康的呼叫，上限增加 1/上限（約每一輪往返 +1）
+    - 收到429、5xx、逾時，或延遲超過基準的 latency_spike_ratio 倍時，上限乘上 decrease_factor
+    - 在上次調降之前開始的呼叫回報的過載訊號不再重複調降（同一波壅塞只調降一次）
+    延遲基準為健康呼叫延遲的長期指數移動平均；有輸出token數時以每token延遲計算。
+    adaptive=False 時上限固定為 initial_limit（等同信號量）。
+    """
+
+    BASELINE_ALPHA = 0.05   # 延遲基準的平滑係數（慢）
+    RECENT_ALPHA = 0.2      # 近期延遲的平滑係數（快，用於回報）
+    WARMUP_SAMPLES = 10     # 基準建立前不以延遲判斷過載
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        decrease_factor: Optional[float] = None,
+        latency_spike_ratio: Optional[float] = None,
+        adaptive: Optional[bool] = None
+    ):
+        self.name = name
+        self.min_limit = min_limit or settings.QWEN_CONCURRENCY_MIN
+        self.max_limit = max(self.min_limit, max_limit or settings.QWEN_CONCURRENCY_MAX)
+        self.decrease_factor = decrease_factor or settings.QWEN_CONCURRENCY_DECREASE_FACTOR
+        self.latency_spike_ratio = latency_spike_ratio or settings.QWEN_LATENCY_SPIKE_RATIO
+        self.adaptive = settings.QWEN_ADAPTIVE_CONCURRENCY if adaptive is None else adaptive
+        initial = initial_limit or settings.QWEN_CONCURRENCY_INITIAL
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._generation = 0
+
+        self.baseline_latency: Optional[float] = None  # 秒（或秒/token）
+        self.recent_latency_ms: Optional[float] = None
+        self.latency_samples = 0
+
+        self.total_acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.successes = 0
+        self.increases = 0
+        self.decreases = 0
+        self.overload_signals: Dict[str, int] = {}
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        取得一個並行名額；區塊內以 ticket.succeeded() / overloaded() / ignored() 回報結果，
+        未回報就因例外離開時視為與負載無關
+        """
+        ticket = await self._acquire()
+        try:
+            yield ticket
+        finally:
+            if not ticket.reported:
+                ticket.ignored()
+            self._release()
+
+    async def _acquire(self) -> LimiterTicket:
+        started = time.monotonic()
+        saturated = self.in_flight + 1 >= self.limit or bool(self._waiters)
+
+        if self.in_flight >= self.limit or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已分配名額但呼叫端被取消，交給下一位
+                    self.in_flight -= 1
+                    self._wake_waiters()
+                else:
+                    self._waiters.remove(future)
+                raise
+            saturated = True
+        else:
+            self.in_flight += 1
+
+        waited = time.monotonic() - started
+        self.total_acquired += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return LimiterTicket(self, self._generation, saturated)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """依先到先服務分配空出的名額（名額於喚醒時即計入，避免被插隊）"""
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def _on_success(self, ticket: LimiterTicket, latency: float, work_units: Optional[int]):
+        self.successes += 1
+        latency_ms = latency * 1000
+        self.recent_latency_ms = latency_ms if self.recent_latency_ms is None else (
+            self.recent_latency_ms + self.RECENT_ALPHA * (latency_ms - self.recent_latency_ms)
+        )
+
+        sample = latency / work_units if work_units else latency
+        baseline = self.baseline_latency
+        self.latency_samples += 1
+        if baseline is None:
+            self.baseline_latency = sample
+        else:
+            self.baseline_latency = baseline + self.BASELINE_ALPHA * (sample - baseline)
+
+        if (
+            baseline is not None
+            and self.latency_samples > self.WARMUP_SAMPLES
+            and sample > baseline * self.latency_spike_ratio
+        ):
+            self._on_overload(ticket, 'latency')
+            return
+
+        if self.adaptive and ticket.saturated and self._limit < self.max_limit:
+            before = self.limit
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            if self.limit > before:
+                self.increases += 1
+                self._wake_waiters()
+
+    def _on_overload(self, ticket: LimiterTicket, reason: str):
+        self.overload_signals[reason] = self.overload_signals.get(reason, 0) + 1
+        if not self.adaptive or ticket.generation < self._generation:
+            return
+
+        before = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self._generation += 1
+        self.decreases += 1
+        logger.warning(f"🚦 {self.name} 並行上限調降 {before} → {self.limit}（原因: {reason}）")
+
+    def get_stats(self) -> Dict:
+        return {
+            'adaptive': self.adaptive,
+            'current_limit': self.limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'in_flight': self.in_flight,
+            'waiting': len(self._waiters),
+            'observed_latency_ms': round(self.recent_latency_ms, 1) if self.recent_latency_ms is not None else None,
+            'baseline_latency': round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+            'latency_spike_ratio': self.latency_spike_ratio,
+            'successes': self.successes,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'overload_signals': dict(self.overload_signals),
+            'total_acquired': self.total_acquired,
+            'avg_wait_ms': round(self.total_wait_seconds / self.total_acquired * 1000, 1) if self.total_acquired else 0.0,
+            'max_wait_ms': round(self.max_wait_seconds * 1000, 1)
+        }
+
+
+# 單例實例：同一worker內所有Qwen呼叫（技術特徵、關鍵字、問答）共用一個並行上限
+qwen_concurrency_limiter = AdaptiveConcurrencyLimiter("Qwen")
@@ -0,0 +1,224 @@
+# src/ai_services/api_key_cache.py - GPSS API密鑰驗證結果快取
+
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.config import settings
+from src.database import DatabaseManager
+from src.ai_services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class KeyVerificationUnavailable(Exception):
+    """GPSS暫時無法驗證密鑰（熔斷、限流、連線錯誤等），密鑰本身不一定無效"""
+
+    def __init__(self, message: str, status: str = 'error'):
+        super().__init__(message)
+        self.status = status
+
+
+class VerificationBackend:
+    """驗證結果的共用儲存後端（跨worker）；自訂後端實作以下三個方法即可"""
+
+    name = "base"
+
+    async def get(self, key_hash: str) -> Optional[Tuple[bool, datetime]]:
+        """回傳 (是否有效, 過期時間UTC)，不存在或已過期時回傳None"""
+        raise NotImplementedError
+
+    async def set(self, key_hash: str, is_valid: bool, status: str, ttl_seconds: int):
+        raise NotImplementedError
+
+    async def delete(self, key_hash: str):
+        raise NotImplementedError
+
+
+class DatabaseVerificationBackend(VerificationBackend):
+    """以資料庫 api_key_verifications 表共用驗證結果"""
+
+    name = "database"
+
+    async def get(self, key_hash: str) -> Optional[Tuple[bool, datetime]]:
+        return await DatabaseManager.get_api_key_verification(key_hash)
+
+    async def set(self, key_hash: str, is_valid: bool, status: str, ttl_seconds: int):
+        await DatabaseManager.save_api_key_verification(key_hash, is_valid, status, ttl_seconds)
+
+    async def delete(self, key_hash: str):
+        await DatabaseManager.delete_api_key_verification(key_hash)
+
+
+class VerifiedKeyCache:
+    """
+    GPSS API密鑰驗證快取
+    - 第一層：行程內LRU
+    - 第二層：共用後端（預設為資料庫），多個worker共用同一份驗證結果
+    只保存 HMAC-SHA256(SECRET_KEY, userCode)，不保存原始密鑰。
+    驗證成功快取 API_KEY_CACHE_TTL_SECONDS；GPSS明確拒絕的密鑰快取 API_KEY_NEGATIVE_TTL_SECONDS，
+    連線錯誤、熔斷等暫時性失敗不快取，並拋出KeyVerificationUnavailable（而非回傳無效）。
+    相同密鑰同時首次驗證時只發送一次測試請求。
+    """
+
+    # test_api_connection 回傳這些狀態時視為密鑰確定無效
+    NEGATIVE_STATUSES = {'rejected', 'unauthorized'}
+
+    def __init__(
+        self,
+        backend: Optional[VerificationBackend] = None,
+        ttl_seconds: Optional[int] = None,
+        negative_ttl_seconds: Optional[int] = None,
+        max_memory_entries: Optional[int] = None,
+        secret: Optional[str] = None
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds or settings.API_KEY_CACHE_TTL_SECONDS
+        self.negative_ttl_seconds = negative_ttl_seconds or settings.API_KEY_NEGATIVE_TTL_SECONDS
+        self.max_memory_entries = max_memory_entries or settings.API_KEY_CACHE_MEMORY_SIZE
+        self._secret = (secret or settings.SECRET_KEY).encode('utf-8')
+        self._memory: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+        self.single_flight = SingleFlight("API密鑰驗證")
+
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.negative_hits = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.backend_errors = 0
+
+    def hash_key(self, user_code: str) -> str:
+        return hmac.new(self._secret, user_code.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    async def verify(self, user_code: str, probe: Callable[[], Awaitable[Dict]]) -> bool:
+        """
+        回傳密鑰是否有效；快取未命中時呼叫probe（test_api_connection）
+        probe回傳 {'success': bool, 'status': str, 'message': str}
+        無法判定（暫時性失敗）時拋出KeyVerificationUnavailable
+        """
+        key_hash = self.hash_key(user_code)
+
+        cached = await self._lookup(key_hash)
+        if cached is not None:
+            if not cached:
+                self.negative_hits += 1
+            return cached
+
+        return await self.single_flight.do(key_hash, lambda: self._probe(key_hash, probe))
+
+    async def invalidate(self, user_code: str):
+        """移除密鑰的驗證結果（例如GPSS回報密鑰失效時）"""
+        key_hash = self.hash_key(user_code)
+        self._memory.pop(key_hash, None)
+        if self.backend is not None:
+            try:
+                await self.backend.delete(key_hash)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"刪除API密鑰驗證快取失敗: {e}")
+
+    async def _lookup(self, key_hash: str) -> Optional[bool]:
+        now = time.time()
+
+        entry = self._memory.get(key_hash)
+        if entry is not None:
+            expires_at, is_valid = entry
+            if expires_at > now:
+                self._memory.move_to_end(key_hash)
+                self.memory_hits += 1
+                return is_valid
+            del self._memory[key_hash]
+
+        if self.backend is not None:
+            try:
+                cached = await self.backend.get(key_hash)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"讀取API密鑰驗證快取失敗: {e}")
+                cached = None
+
+            if cached is not None:
+                is_valid, expires_at = cached
+                remaining = (expires_at - datetime.utcnow()).total_seconds()
+                self._put_memory(key_hash, is_valid, now + remaining)
+                self.backend_hits += 1
+                return is_valid
+
+        return None
+
+    async def _probe(self, key_hash: str, probe: Callable[[], Awaitable[Dict]]) -> bool:
+        # 等待期間其他worker可能已完成驗證
+        cached = await self._lookup(key_hash)
+        if cached is not None:
+            return cached
+
+        self.probes += 1
+        result = await probe()
+        status = result.get('status', 'unknown')
+
+        if result.get('success', False):
+            await self._store(key_hash, True, status, self.ttl_seconds)
+            logger.info(f"🔑 API密鑰驗證成功，快取 {self.ttl_seconds} 秒: {key_hash[:8]}")
+            return True
+
+        self.probe_failures += 1
+        if status in self.NEGATIVE_STATUSES:
+            await self._store(key_hash, False, status, self.negative_ttl_seconds)
+            logger.warning(f"🔑 API密鑰無效，{self.negative_ttl_seconds} 秒內不再重試: {result.get('message', status)}")
+            return False
+
+        message = result.get('message') or status
+        logger.warning(f"API密鑰驗證失敗（暫時性，不快取）: {message}")
+        raise KeyVerificationUnavailable(message, status)
+
+    async def _store(self, key_hash: str, is_valid: bool, status: str, ttl_seconds: int):
+        self._put_memory(key_hash, is_valid, time.time() + ttl_seconds)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key_hash, is_valid, status, ttl_seconds)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"寫入API密鑰驗證快取失敗: {e}")
+
+    def _put_memory(self, key_hash: str, is_valid: bool, expires_at: float):
+        self._memory[key_hash] = (expires_at, is_valid)
+        self._memory.move_to_end(key_hash)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def valid_count(self) -> int:
+        """本行程記憶體中未過期的有效密鑰數量"""
+        now = time.time()
+        return sum(1 for expires_at, is_valid in self._memory.values() if is_valid and expires_at > now)
+
+    def get_stats(self) -> Dict:
+        return {
+            'backend': self.backend.name if self.backend is not None else 'memory',
+            'memory_entries': len(self._memory),
+            'memory_valid_keys': self.valid_count(),
+            'ttl_seconds': self.ttl_seconds,
+            'negative_ttl_seconds': self.negative_ttl_seconds,
+            'memory_hits': self.memory_hits,
+            'backend_hits': self.backend_hits,
+            'negative_hits': self.negative_hits,
+            'probes': self.probes,
+            'probe_failures': self.probe_failures,
+            'backend_errors': self.backend_errors,
+            'single_flight': self.single_flight.get_stats()
+        }
+
+
+def _create_backend() -> Optional[VerificationBackend]:
+    if settings.API_KEY_CACHE_BACKEND == 'memory':
+        return None
+    if settings.API_KEY_CACHE_BACKEND != 'database':
+        logger.warning(f"未知的API_KEY_CACHE_BACKEND: {settings.API_KEY_CACHE_BACKEND}，改用database")
+    return DatabaseVerificationBackend()
+
+
+# 全域實例
+verified_key_cache = VerifiedKeyCache(backend=_create_backend())
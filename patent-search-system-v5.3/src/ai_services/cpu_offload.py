@@ -0,0 +1,146 @@
+# src/ai_services/cpu_offload.py - CPU密集工作卸載執行器
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CPUOffloadExecutor:
+    """
+    將CPU密集工作（JSON解析/修復、回應解析）移出事件迴圈
+    - 大於門檻的工作送往行程池（避開GIL，不阻塞同worker的其他請求）
+    - 小工作送往執行緒池（避免行程間序列化成本）
+    行程池採延遲建立，送往行程池的函式與參數必須可被pickle
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        process_threshold: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        thread_workers: Optional[int] = None
+    ):
+        self.enabled = settings.CPU_OFFLOAD_ENABLED if enabled is None else enabled
+        self.process_threshold = (
+            settings.CPU_OFFLOAD_PROCESS_THRESHOLD_BYTES if process_threshold is None else process_threshold
+        )
+        self.process_workers = settings.CPU_OFFLOAD_PROCESS_WORKERS if process_workers is None else process_workers
+        self.thread_workers = thread_workers or settings.CPU_OFFLOAD_THREAD_WORKERS
+
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+        self._stats = {
+            name: {'jobs': 0, 'failures': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            for name in ('inline', 'thread', 'process')
+        }
+        self.process_pool_restarts = 0
+
+    async def run(self, func: Callable, *args, size: int = 0, prefer_process: Optional[bool] = None) -> Any:
+        """
+        依工作大小選擇執行器執行func(*args)
+        size: 工作大小（位元組），prefer_process 指定時以其為準
+        """
+        if not self.enabled:
+            return self._run_inline(func, *args)
+
+        use_process = size >= self.process_threshold if prefer_process is None else prefer_process
+        if self.process_workers > 0 and use_process:
+            try:
+                return await self._run_in_executor('process', self._get_process_pool(), func, *args)
+            except BrokenProcessPool as e:
+                # 行程池損壞（如子行程被終止）時重建，本次改用執行緒
+                logger.warning(f"CPU卸載行程池損壞，改用執行緒並重建: {e}")
+                self._reset_process_pool()
+
+        return await self._run_in_executor('thread', self._get_thread_pool(), func, *args)
+
+    async def _run_in_executor(self, name: str, executor, func: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except Exception:
+            self._stats[name]['failures'] += 1
+            raise
+        finally:
+            self._record(name, time.perf_counter() - start_time)
+
+    def _run_inline(self, func: Callable, *args) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            self._stats['inline']['failures'] += 1
+            raise
+        finally:
+            self._record('inline', time.perf_counter() - start_time)
+
+    def _record(self, name: str, elapsed: float):
+        stats = self._stats[name]
+        stats['jobs'] += 1
+        stats['total_seconds'] += elapsed
+        stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.thread_workers,
+                thread_name_prefix="cpu-offload"
+            )
+        return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            logger.info(f"🧮 CPU卸載行程池已建立: {self.process_workers} 個行程")
+        return self._process_pool
+
+    def _reset_process_pool(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+            self.process_pool_restarts += 1
+
+    def shutdown(self):
+        """關閉執行緒池與行程池"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    def get_stats(self) -> Dict:
+        """各執行器的工作數與耗時統計"""
+        executors = {}
+        for name, stats in self._stats.items():
+            avg_ms = (stats['total_seconds'] / stats['jobs'] * 1000) if stats['jobs'] else 0
+            executors[name] = {
+                'jobs': stats['jobs'],
+                'failures': stats['failures'],
+                'total_seconds': round(stats['total_seconds'], 3),
+                'avg_ms': round(avg_ms, 2),
+                'max_ms': round(stats['max_seconds'] * 1000, 2)
+            }
+
+        return {
+            'enabled': self.enabled,
+            'process_threshold_bytes': self.process_threshold,
+            'process_workers': self.process_workers,
+            'thread_workers': self.thread_workers,
+            'process_pool_active': self._process_pool is not None,
+            'process_pool_restarts': self.process_pool_restarts,
+            'executors': executors
+        }
+
+
+# 全域執行器實例
+cpu_offload_executor = CPUOffloadExecutor()
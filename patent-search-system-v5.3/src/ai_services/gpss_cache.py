@@ -0,0 +1,158 @@
+# src/ai_services/gpss_cache.py - GPSS API回應快取
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from src.config import settings
+from src.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class GPSSResponseCache:
+    """
+    GPSS API回應快取
+    - 第一層：行程內LRU（記憶體）
+    - 第二層：資料庫（gpss_response_cache表），跨重啟/跨worker共用
+    快取鍵為正規化後的查詢參數（移除userCode、日期視窗以日為單位）
+    """
+
+    # 不參與快取鍵的參數
+    EXCLUDED_PARAMS = {'userCode'}
+
+    # 日期視窗參數，統一正規化為 YYYYMMDD:YYYYMMDD
+    DATE_PARAMS = {'ID', 'AD', 'DR', 'PD'}
+
+    def __init__(
+        self,
+        max_memory_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        persistent: bool = True
+    ):
+        self.max_memory_entries = max_memory_entries or settings.GPSS_CACHE_MEMORY_SIZE
+        self.ttl_seconds = ttl_seconds or settings.GPSS_CACHE_TTL_SECONDS
+        self.persistent = persistent
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bypassed = 0
+        self.persistent_errors = 0
+
+    @classmethod
+    def build_cache_key(cls, params: Dict[str, str], namespace: str = '') -> str:
+        """由查詢參數產生正規化快取鍵（namespace區分不同的API端點）"""
+        canonical = {}
+        for key, value in params.items():
+            if key in cls.EXCLUDED_PARAMS or value is None or value == '':
+                continue
+            value = str(value).strip()
+            if key.lstrip('+') in cls.DATE_PARAMS:
+                value = cls._snap_date_window(value)
+            canonical[key] = value
+
+        if namespace:
+            canonical['@namespace'] = namespace
+
+        payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _snap_date_window(value: str) -> str:
+        """日期視窗只保留到日（移除分隔符號與時間部分）"""
+        parts = value.split(':', 1)
+        snapped = [part.replace('-', '').replace('/', '').strip()[:8] for part in parts]
+        return ':'.join(snapped)
+
+    async def get(self, cache_key: str) -> Optional[Dict]:
+        """讀取快取，依序查詢記憶體與資料庫"""
+        now = time.time()
+
+        entry = self._memory.get(cache_key)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > now:
+                self._memory.move_to_end(cache_key)
+                self.memory_hits += 1
+                logger.info(f"⚡ GPSS快取命中(記憶體): {cache_key[:12]}")
+                return data
+            del self._memory[cache_key]
+
+        if self.persistent:
+            try:
+                cached = await DatabaseManager.get_gpss_response_cache(cache_key)
+            except Exception as e:
+                self.persistent_errors += 1
+                logger.warning(f"讀取GPSS持久快取失敗: {e}")
+                cached = None
+
+            if cached is not None:
+                data, expires_at = cached
+                remaining = (expires_at - datetime.utcnow()).total_seconds() if expires_at else self.ttl_seconds
+                self._put_memory(cache_key, data, now + remaining)
+                self.persistent_hits += 1
+                logger.info(f"💾 GPSS快取命中(資料庫): {cache_key[:12]}")
+                return data
+
+        self.misses += 1
+        return None
+
+    async def set(self, cache_key: str, data: Dict, params: Optional[Dict[str, str]] = None):
+        """寫入快取（記憶體與資料庫）"""
+        expires_at = time.time() + self.ttl_seconds
+        self._put_memory(cache_key, data, expires_at)
+        self.stores += 1
+
+        if self.persistent:
+            try:
+                safe_params = {k: v for k, v in (params or {}).items() if k not in self.EXCLUDED_PARAMS}
+                await DatabaseManager.save_gpss_response_cache(
+                    cache_key=cache_key,
+                    query_params=safe_params,
+                    response=data,
+                    ttl_seconds=self.ttl_seconds
+                )
+            except Exception as e:
+                self.persistent_errors += 1
+                logger.warning(f"寫入GPSS持久快取失敗: {e}")
+
+    def record_bypass(self):
+        """記錄略過快取的請求"""
+        self.bypassed += 1
+
+    def clear_memory(self):
+        """清空記憶體快取"""
+        self._memory.clear()
+
+    def _put_memory(self, cache_key: str, data: Dict, expires_at: float):
+        self._memory[cache_key] = (expires_at, data)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """快取統計資訊"""
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        hit_rate = (hits / lookups * 100) if lookups > 0 else 0
+
+        return {
+            'memory_entries': len(self._memory),
+            'max_memory_entries': self.max_memory_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'persistent': self.persistent,
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': f"{hit_rate:.1f}%",
+            'stores': self.stores,
+            'bypassed': self.bypassed,
+            'persistent_errors': self.persistent_errors
+        }
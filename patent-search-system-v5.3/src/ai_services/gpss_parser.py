@@ -0,0 +1,375 @@
+# src/ai_services/gpss_parser.py - GPSS回應解析（無狀態，供服務與行程池共用）
+#
+# 只依賴專利資料模型與JSON修復，行程池工作者解析時不需載入GPSSAPIService
+# 及其快取、限流、資料庫等相依模組。
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+from src.ai_services.json_repair import repair_json_escapes, salvage_gpss_items
+from src.ai_services.patent_record import PatentRecord
+
+logger = logging.getLogger(__name__)
+
+
+def parse_gpss_response(raw_response: Dict) -> List[PatentRecord]:
+    """
+    解析GPSS API原始回應，提取專利資料 - 修復版本
+    """
+    try:
+        patents = []
+
+        # 驗證回應結構
+        if 'gpss-API' not in raw_response:
+            logger.error("GPSS回應缺少'gpss-API'字段")
+            return []
+
+        gpss_data = raw_response['gpss-API']
+
+        # 檢查是否有錯誤
+        if 'error' in gpss_data:
+            error_msg = gpss_data['error']
+            logger.error(f"GPSS API返回錯誤: {error_msg}")
+            raise Exception(f"GPSS API錯誤: {error_msg}")
+
+        # 獲取專利數據
+        patent_info = gpss_data.get('patent', {})
+        if not patent_info:
+            logger.warning("GPSS回應中沒有專利數據")
+            return []
+
+        patent_content = patent_info.get('patentcontent', [])
+        if not patent_content:
+            logger.warning("GPSS回應中沒有專利內容")
+            return []
+
+        logger.info(f"📋 開始解析 {len(patent_content)} 筆GPSS專利數據")
+
+        # 解析每筆專利
+        for i, patent_item in enumerate(patent_content):
+            try:
+                patent = extract_patent_details(patent_item)
+                if patent:
+                    patent.source_index = i
+                    patents.append(patent)
+
+            except Exception as e:
+                logger.warning(f"解析第{i+1}筆專利失敗: {e}")
+                continue
+
+        logger.info(f"✅ 成功解析 {len(patents)} 筆專利數據")
+        return patents
+
+    except Exception as e:
+        logger.error(f"❌ 解析GPSS回應失敗: {e}")
+        return []
+
+
+def extract_patent_details(patent_item: Dict) -> Optional[PatentRecord]:
+    """從單個專利項目中提取詳細信息 - 改進版本"""
+    try:
+        # 🆕 更好的標題提取
+        title_data = patent_item.get('patent-title', {})
+        if isinstance(title_data, dict):
+            # 優先選擇中文標題，如果沒有則選英文
+            title = (
+                title_data.get('title') or 
+                title_data.get('chinese-title') or
+                title_data.get('english-title') or 
+                'N/A'
+            )
+        else:
+            title = str(title_data) if title_data else 'N/A'
+
+        # 驗證必要字段
+        if not title or title == 'N/A':
+            logger.warning("專利缺少標題，跳過")
+            return None
+
+        # 🆕 改進申請人提取邏輯
+        applicants = []
+        parties_data = patent_item.get('parties', {})
+
+        if parties_data:
+            # 嘗試多種可能的結構
+            applicants_section = parties_data.get('applicants', {})
+
+            if applicants_section:
+                applicant_list = applicants_section.get('applicant', [])
+
+                # 處理單個申請人的情況
+                if isinstance(applicant_list, dict):
+                    applicant_list = [applicant_list]
+
+                # 處理申請人列表
+                if isinstance(applicant_list, list):
+                    for applicant in applicant_list:
+                        if isinstance(applicant, dict):
+                            # 優先使用中文名稱，如果沒有則使用英文名稱
+                            name = (
+                                applicant.get('name') or 
+                                applicant.get('chinese-name') or
+                                applicant.get('english-name') or
+                                applicant.get('party-name')
+                            )
+                            if name and name.strip():
+                                applicants.append(name.strip())
+                        elif isinstance(applicant, str) and applicant.strip():
+                            applicants.append(applicant.strip())
+
+        # 如果申請人為空，嘗試其他可能的字段
+        if not applicants:
+            # 嘗試從根級別的申請人字段獲取
+            root_applicants = patent_item.get('applicants', [])
+            if root_applicants:
+                if isinstance(root_applicants, list):
+                    applicants = [str(a) for a in root_applicants if a]
+                else:
+                    applicants = [str(root_applicants)]
+
+        # 🆕 改進發明人提取
+        inventors = []
+        if parties_data:
+            inventors_section = parties_data.get('inventors', {})
+            if inventors_section:
+                inventor_list = inventors_section.get('inventor', [])
+
+                if isinstance(inventor_list, dict):
+                    inventor_list = [inventor_list]
+
+                if isinstance(inventor_list, list):
+                    for inventor in inventor_list:
+                        if isinstance(inventor, dict):
+                            name = (
+                                inventor.get('name') or 
+                                inventor.get('chinese-name') or
+                                inventor.get('english-name')
+                            )
+                            if name and name.strip():
+                                inventors.append(name.strip())
+                        elif isinstance(inventor, str) and inventor.strip():
+                            inventors.append(inventor.strip())
+
+        # 🆕 改進國家信息提取
+        database = patent_item.get('@database', 'Unknown')
+
+        return PatentRecord(
+            title=title,
+            applicants='; '.join(applicants) if applicants else 'N/A',
+            inventors='; '.join(inventors) if inventors else 'N/A',
+            abstract=_extract_abstract(patent_item),
+            claims=_extract_claims(patent_item),
+            **_extract_patent_numbers(patent_item),
+            **_extract_dates(patent_item),
+            ipc_classes=_extract_classifications(patent_item),
+            database=database,
+            country=_determine_country(database, patent_item),
+            patent_type=patent_item.get('@type', 'Unknown'),
+            # 案件類型（AG欄位）即@status：A=公開案, B=公告案
+            status=patent_item.get('@status', 'Unknown')
+        )
+
+    except Exception as e:
+        logger.error(f"提取專利詳細信息失敗: {e}")
+        return None
+
+
+def _determine_country(database: str, patent_item: Dict) -> str:
+    """根據資料庫和其他信息確定國家代碼 - 改進版本"""
+    if not database:
+        return 'TW'
+
+    database_upper = database.upper()
+
+    # 🆕 更精確的國家判斷邏輯
+    if 'TW' in database_upper or '本國' in database or '中華民國' in database:
+        return 'TW'
+    elif 'US' in database_upper or '美國' in database:
+        return 'US'
+    elif 'JP' in database_upper or '日本' in database:
+        return 'JP'
+    elif 'EP' in database_upper or '歐洲' in database:
+        return 'EP'
+    elif 'KP' in database_upper or 'KR' in database_upper or '韓國' in database:
+        return 'KR'
+    elif 'CN' in database_upper or '中國' in database:
+        return 'CN'
+    elif 'WO' in database_upper or 'PCT' in database_upper:
+        return 'WO'
+    elif 'SEA' in database_upper or '東南亞' in database:
+        return 'SEA'
+    elif 'OT' in database_upper or '其他' in database:
+        return 'OTHER'
+    else:
+        # 🆕 嘗試從申請人國家信息獲取
+        try:
+            parties = patent_item.get('parties', {})
+            if parties:
+                applicants = parties.get('applicants', {})
+                if applicants:
+                    applicant_list = applicants.get('applicant', [])
+                    if isinstance(applicant_list, list) and applicant_list:
+                        first_applicant = applicant_list[0]
+                        if isinstance(first_applicant, dict):
+                            country_code = first_applicant.get('country-code')
+                            if country_code:
+                                return country_code.upper()
+        except Exception:
+            pass
+
+        return 'TW'  # 預設返回TW
+
+
+def _extract_abstract(patent_item: Dict) -> str:
+    """提取摘要"""
+    try:
+        abstract_data = patent_item.get('abstract', {})
+
+        if isinstance(abstract_data, dict):
+            paragraphs = abstract_data.get('p', [])
+            if isinstance(paragraphs, list):
+                return ' '.join(str(p) for p in paragraphs if p).strip()
+            elif isinstance(paragraphs, str):
+                return paragraphs.strip()
+
+            return str(abstract_data.get('content', '')).strip()
+
+        elif isinstance(abstract_data, str):
+            return abstract_data.strip()
+
+        return ''
+
+    except Exception as e:
+        logger.debug(f"提取摘要失敗: {e}")
+        return ''
+
+
+def _extract_claims(patent_item: Dict) -> str:
+    """提取權利要求"""
+    try:
+        claims_data = patent_item.get('claims', {})
+
+        if isinstance(claims_data, dict):
+            claim_list = claims_data.get('claim', [])
+            if not isinstance(claim_list, list):
+                claim_list = [claim_list]
+
+            claims_text = []
+            for i, claim in enumerate(claim_list[:3]):
+                if isinstance(claim, dict):
+                    claim_text = claim.get('claim-text', '')
+                    if claim_text:
+                        claims_text.append(f"{i+1}. {claim_text}")
+                elif isinstance(claim, str):
+                    claims_text.append(f"{i+1}. {claim}")
+
+            return ' '.join(claims_text)
+
+        return str(claims_data) if claims_data else ''
+
+    except Exception as e:
+        logger.debug(f"提取權利要求失敗: {e}")
+        return ''
+
+
+def _extract_patent_numbers(patent_item: Dict) -> Dict[str, str]:
+    """提取專利號碼相關信息"""
+    try:
+        result = {}
+
+        pub_ref = patent_item.get('publication-reference', {})
+        result['publication_number'] = pub_ref.get('doc-number', 'N/A')
+
+        app_ref = patent_item.get('application-reference', {})  
+        result['application_number'] = app_ref.get('doc-number', 'N/A')
+
+        return result
+
+    except Exception as e:
+        logger.debug(f"提取專利號碼失敗: {e}")
+        return {'publication_number': 'N/A', 'application_number': 'N/A'}
+
+
+def _extract_dates(patent_item: Dict) -> Dict[str, str]:
+    """提取日期信息"""
+    try:
+        result = {}
+
+        pub_ref = patent_item.get('publication-reference', {})
+        result['publication_date'] = pub_ref.get('date', 'N/A')
+
+        app_ref = patent_item.get('application-reference', {})
+        result['application_date'] = app_ref.get('date', 'N/A')
+
+        priority_data = patent_item.get('priority-claims', {})
+        if priority_data:
+            result['priority_date'] = priority_data.get('date', 'N/A')
+        else:
+            result['priority_date'] = 'N/A'
+
+        return result
+
+    except Exception as e:
+        logger.debug(f"提取日期信息失敗: {e}")
+        return {
+            'publication_date': 'N/A',
+            'application_date': 'N/A', 
+            'priority_date': 'N/A'
+        }
+
+
+def _extract_classifications(patent_item: Dict) -> List[str]:
+    """提取IPC分類信息"""
+    try:
+        classifications = []
+
+        ipc_data = patent_item.get('classifications-ipc', {})
+        if isinstance(ipc_data, dict):
+            ipc_list = ipc_data.get('ipc', [])
+            if not isinstance(ipc_list, list):
+                ipc_list = [ipc_list]
+
+            for ipc in ipc_list:
+                if isinstance(ipc, dict):
+                    key_value = ipc.get('keyValue') or ipc.get('classification-symbol')
+                    if key_value and key_value.strip():
+                        classifications.append(key_value.strip())
+                elif isinstance(ipc, str) and ipc.strip():
+                    classifications.append(ipc.strip())
+
+        return classifications
+
+    except Exception as e:
+        logger.debug(f"提取分類信息失敗: {e}")
+        return []
+
+
+def safe_json_parse(json_text: str) -> Dict:
+    """安全的JSON解析，處理轉義字符問題"""
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSON直接解析失敗，嘗試修復: {e}")
+
+        try:
+            fixed_text = repair_json_escapes(json_text)
+            return json.loads(fixed_text, strict=False)
+        except json.JSONDecodeError as e2:
+            logger.error(f"JSON修復解析也失敗: {e2}")
+
+            try:
+                return _fallback_json_parse(json_text)
+            except Exception as e3:
+                logger.error(f"分段解析也失敗: {e3}")
+                raise Exception(f"JSON解析完全失敗: 原始錯誤={e}, 修復錯誤={e2}, 分段錯誤={e3}")
+
+
+def _fallback_json_parse(json_text: str) -> Dict:
+    """逐筆搶救的後備方案：保留所有可解析的專利項目"""
+    logger.info("嘗試逐筆搶救解析JSON...")
+
+    if '"gpss-API"' not in json_text:
+        raise Exception("找不到gpss-API字段")
+
+    return salvage_gpss_items(json_text)
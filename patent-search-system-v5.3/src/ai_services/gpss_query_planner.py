@@ -0,0 +1,164 @@
+# src/ai_services/gpss_query_planner.py - 過長布林查詢的拆分規劃
+
+import logging
+from typing import Callable, Dict, List, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 查詢群組：AND連接的各個OR群組，每個群組為詞彙列表
+QueryGroups = List[List[str]]
+
+
+class GPSSQueryPlanner:
+    """
+    將過長的 (a or b or ...) and (c or d or ...) 查詢改寫為多個較短的子查詢
+
+    依分配律拆分OR群組：(A1 ∪ A2) ∧ B = (A1 ∧ B) ∨ (A2 ∧ B)，
+    每次將最大的群組對半切分，直到每個子查詢的URL長度都在預算內。
+    子查詢結果的聯集（去重後）與原查詢相同。
+    只處理「AND連接的OR群組」形式（_build_gpss_and_or_query 的輸出格式），
+    其他形式的查詢不拆分。
+    """
+
+    def __init__(self, max_url_length: Optional[int] = None, max_subqueries: Optional[int] = None):
+        self.max_url_length = max_url_length or settings.GPSS_MAX_URL_LENGTH
+        self.max_subqueries = max_subqueries or settings.GPSS_QUERY_MAX_SUBQUERIES
+
+        self.queries_planned = 0
+        self.queries_split = 0
+        self.subqueries_generated = 0
+        self.over_budget_subqueries = 0
+        self.unsupported_queries = 0
+
+    @staticmethod
+    def tokenize(query: str) -> Optional[List[str]]:
+        """切分為 '(' ')' 'and' 'or' 與詞彙（引號詞彙原樣保留）；引號未閉合時回傳None"""
+        tokens = []
+        position = 0
+        length = len(query)
+
+        while position < length:
+            char = query[position]
+            if char.isspace():
+                position += 1
+            elif char in '()':
+                tokens.append(char)
+                position += 1
+            elif char == '"':
+                end = position + 1
+                while end < length and query[end] != '"':
+                    end += 2 if query[end] == '\\' else 1
+                if end >= length:
+                    return None
+                tokens.append(query[position:end + 1])
+                position = end + 1
+            else:
+                end = position
+                while end < length and not query[end].isspace() and query[end] not in '()"':
+                    end += 1
+                word = query[position:end]
+                tokens.append(word.lower() if word.lower() in ('and', 'or') else word)
+                position = end
+
+        return tokens
+
+    @classmethod
+    def parse(cls, query: str) -> Optional[QueryGroups]:
+        """解析為AND連接的OR群組；不是此形式時回傳None"""
+        tokens = cls.tokenize(query or '')
+        if not tokens:
+            return None
+
+        groups: QueryGroups = []
+        index = 0
+        while True:
+            if index >= len(tokens):
+                return None
+
+            if tokens[index] == '(':
+                group = []
+                index += 1
+                while True:
+                    if index >= len(tokens) or tokens[index] in ('(', ')', 'and', 'or'):
+                        return None
+                    group.append(tokens[index])
+                    index += 1
+                    if index < len(tokens) and tokens[index] == 'or':
+                        index += 1
+                        continue
+                    if index < len(tokens) and tokens[index] == ')':
+                        index += 1
+                        break
+                    return None
+            elif tokens[index] in (')', 'and', 'or'):
+                return None
+            else:
+                group = [tokens[index]]
+                index += 1
+
+            groups.append(group)
+            if index == len(tokens):
+                return groups
+            if tokens[index] != 'and':
+                return None
+            index += 1
+
+    @staticmethod
+    def render(groups: QueryGroups) -> str:
+        """以 _build_gpss_and_or_query 相同的格式輸出"""
+        return " and ".join(f"({' or '.join(group)})" for group in groups)
+
+    def plan(self, query: str, measure: Callable[[str], int]) -> List[str]:
+        """
+        回傳子查詢列表（不需拆分時只有原查詢）
+        measure: 計算查詢對應的完整URL長度
+        """
+        self.queries_planned += 1
+        if measure(query) <= self.max_url_length:
+            return [query]
+
+        groups = self.parse(query)
+        if groups is None:
+            self.unsupported_queries += 1
+            logger.warning(f"⚠️ 查詢不是AND/OR群組形式，無法拆分（URL長度 {measure(query)}）")
+            return [query]
+
+        pending = [groups]
+        planned: List[QueryGroups] = []
+        while pending:
+            candidate = pending.pop(0)
+            splittable = [i for i, group in enumerate(candidate) if len(group) > 1]
+            within_budget = measure(self.render(candidate)) <= self.max_url_length
+            at_limit = len(planned) + len(pending) + 2 > self.max_subqueries
+
+            if within_budget or not splittable or at_limit:
+                if not within_budget:
+                    self.over_budget_subqueries += 1
+                planned.append(candidate)
+                continue
+
+            # 對最大的OR群組對半切分
+            target = max(splittable, key=lambda i: len(candidate[i]))
+            group = candidate[target]
+            middle = (len(group) + 1) // 2
+            for half in (group[:middle], group[middle:]):
+                pending.append(candidate[:target] + [half] + candidate[target + 1:])
+
+        sub_queries = [self.render(candidate) for candidate in planned]
+        if len(sub_queries) > 1:
+            self.queries_split += 1
+            self.subqueries_generated += len(sub_queries)
+        return sub_queries
+
+    def get_stats(self) -> Dict:
+        return {
+            'max_url_length': self.max_url_length,
+            'max_subqueries': self.max_subqueries,
+            'queries_planned': self.queries_planned,
+            'queries_split': self.queries_split,
+            'subqueries_generated': self.subqueries_generated,
+            'over_budget_subqueries': self.over_budget_subqueries,
+            'unsupported_queries': self.unsupported_queries
+        }
@@ -0,0 +1,213 @@
+# src/ai_services/gpss_stream_parser.py - GPSS回應增量解析器
+
+import codecs
+import json
+import logging
+import re
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 字串外只需關注結構字元；字串內只需關注引號與反斜線
+_STRUCTURAL_RE = re.compile(r'[{}\[\]",:]')
+_STRING_RE = re.compile(r'["\\]')
+
+
+class GPSSStreamParser:
+    """
+    GPSS JSON回應的增量解析器
+
+    以分段方式餵入位元組（feed），每當 patentcontent 陣列中的一個項目完整到達，
+    即解析並回傳該項目，不需等待整個回應下載完畢，也不會同時保留完整原始文字。
+    陣列以外的部分（外層結構、錯誤訊息等）保留為「外殼」，於 close() 時解析，
+    其中的 patentcontent 會是空陣列。
+    """
+
+    def __init__(
+        self,
+        item_parser: Optional[Callable[[str], Dict]] = None,
+        envelope_parser: Optional[Callable[[str], Dict]] = None,
+        array_key: str = 'patentcontent'
+    ):
+        self.item_parser = item_parser or json.loads
+        self.envelope_parser = envelope_parser or json.loads
+        self.array_key = array_key
+
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buf = ''
+        self._pos = 0
+
+        self._depth = 0
+        self._in_string = False
+        self._string_start = -1
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+
+        # envelope: 陣列外；array: patentcontent陣列內、項目之間；item: 擷取單一項目中
+        self._mode = 'envelope'
+        self._array_depth = 0
+        self._single_item = False
+        self._item_start = -1
+        self._item_depth = 0
+
+        self._envelope_parts: List[str] = []
+        self._copy_from = 0
+
+        self.items_parsed = 0
+        self.items_failed = 0
+        self.bytes_received = 0
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """餵入一段位元組，回傳此段中完整到達的專利項目"""
+        self.bytes_received += len(chunk)
+        self._buf += self._decoder.decode(chunk)
+        return self._scan()
+
+    def feed_text(self, text: str) -> List[Dict]:
+        """餵入已解碼的文字（整段回應已在記憶體中時使用）"""
+        self._buf += text
+        return self._scan()
+
+    def close(self) -> Dict:
+        """結束解析並回傳外殼（patentcontent為空陣列）"""
+        self._buf += self._decoder.decode(b'', final=True)
+        self._scan()
+
+        if self._mode == 'envelope':
+            self._envelope_parts.append(self._buf[self._copy_from:])
+        if self._mode != 'envelope' or self._depth != 0:
+            raise ValueError(f"GPSS回應不完整（層級 {self._depth}，狀態 {self._mode}）")
+
+        envelope_text = ''.join(self._envelope_parts)
+        self._buf = ''
+        return self.envelope_parser(envelope_text) if envelope_text.strip() else {}
+
+    def _scan(self) -> List[Dict]:
+        items = []
+        buf = self._buf
+        pos = self._pos
+        length = len(buf)
+
+        while pos < length:
+            if self._in_string:
+                match = _STRING_RE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                if match.group() == '\\':
+                    # 跳脫字元需要下一個字元才能判斷，等待更多資料
+                    if match.end() >= length:
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                if self._mode == 'envelope':
+                    self._last_string = buf[self._string_start + 1:pos - 1]
+                continue
+
+            match = _STRUCTURAL_RE.search(buf, pos)
+            if match is None:
+                pos = length
+                break
+
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                continue
+
+            if char == ':':
+                if self._mode == 'envelope':
+                    self._pending_key = self._last_string
+                continue
+
+            if char == ',':
+                self._pending_key = None
+                continue
+
+            if char in '{[':
+                starting_array = (
+                    self._mode == 'envelope'
+                    and self._pending_key == self.array_key
+                )
+                self._pending_key = None
+                self._depth += 1
+
+                if starting_array and char == '[':
+                    # 進入patentcontent陣列，外殼保留到 '['
+                    self._envelope_parts.append(buf[self._copy_from:pos])
+                    self._mode = 'array'
+                    self._array_depth = self._depth
+                    self._single_item = False
+                elif starting_array:
+                    # patentcontent為單一物件（僅一筆結果）
+                    self._envelope_parts.append(buf[self._copy_from:index] + '[')
+                    self._mode = 'item'
+                    self._single_item = True
+                    self._item_start = index
+                    self._item_depth = self._depth
+                elif self._mode == 'array' and self._depth == self._array_depth + 1:
+                    self._mode = 'item'
+                    self._item_start = index
+                    self._item_depth = self._depth
+                continue
+
+            # '}' 或 ']'
+            if self._mode == 'item' and self._depth == self._item_depth:
+                self._parse_item(buf[self._item_start:pos], items)
+                if self._single_item:
+                    self._mode = 'envelope'
+                    self._envelope_parts.append(']')
+                    self._copy_from = pos
+                else:
+                    self._mode = 'array'
+            elif self._mode == 'array' and self._depth == self._array_depth:
+                # 陣列結束，外殼從 ']' 繼續
+                self._mode = 'envelope'
+                self._copy_from = index
+            self._depth -= 1
+            self._pending_key = None
+
+        self._pos = pos
+        self._compact()
+        return items
+
+    def _parse_item(self, item_text: str, items: List[Dict]):
+        try:
+            item = self.item_parser(item_text)
+        except Exception as e:
+            self.items_failed += 1
+            logger.warning(f"專利項目解析失敗，已略過: {e}")
+            return
+        if isinstance(item, dict):
+            self.items_parsed += 1
+            items.append(item)
+
+    def _compact(self):
+        """丟棄已處理的文字，只保留尚未完成的部分"""
+        if self._mode == 'item':
+            keep_from = self._item_start
+        elif self._in_string and self._mode == 'envelope':
+            keep_from = self._string_start
+        else:
+            keep_from = self._pos
+
+        if self._mode == 'envelope' and self._copy_from < keep_from:
+            self._envelope_parts.append(self._buf[self._copy_from:keep_from])
+            self._copy_from = keep_from
+
+        if keep_from <= 0:
+            return
+
+        self._buf = self._buf[keep_from:]
+        self._pos -= keep_from
+        if self._item_start >= 0:
+            self._item_start -= keep_from
+        if self._string_start >= 0:
+            self._string_start -= keep_from
+        self._copy_from = max(0, self._copy_from - keep_from)
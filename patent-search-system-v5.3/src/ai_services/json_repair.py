@@ -0,0 +1,84 @@
+# src/ai_services/json_repair.py - GPSS回應JSON修復
+
+import json
+import logging
+import re
+from typing import Dict, List
+
+from src.ai_services.gpss_stream_parser import GPSSStreamParser
+
+logger = logging.getLogger(__name__)
+
+# 反斜線跳脫：合法跳脫 / 不合法跳脫 / 結尾孤立反斜線
+# 以交替順序保證成對消耗：\\< 會先匹配合法的 \\，不會誤判為 \<
+_ESCAPE_RE = re.compile(r'\\(?:(u[0-9a-fA-F]{4}|["\\/bfnrt])|(.)|$)', re.DOTALL)
+
+# GPSS常見的多餘跳脫：移除反斜線即可還原原字元
+_DROP_BACKSLASH_CHARS = frozenset('<>=%#&+')
+
+
+def _repair_escape(match: re.Match) -> str:
+    valid, invalid = match.group(1), match.group(2)
+    if valid is not None:
+        return match.group(0)
+    if invalid is None:
+        # 結尾的孤立反斜線
+        return '\\\\'
+    if invalid in _DROP_BACKSLASH_CHARS or invalid.isdigit() or '\u4e00' <= invalid <= '\u9fff':
+        return invalid
+    return '\\\\' + invalid
+
+
+def repair_json_escapes(json_text: str) -> str:
+    """
+    單次掃描修復不合法的反斜線跳脫（取代舊版11次re.sub）
+    - 合法跳脫（\\n、\\"、\\uXXXX…）保留
+    - GPSS常見的 \\< \\> \\= \\% \\# \\& \\+、\\中文、\\數字：移除反斜線
+    - 其他不合法跳脫：反斜線改為 \\\\
+    字串內的原始控制字元不在此處理，由 loads_repaired 以 strict=False 解析
+    """
+    if '\\' not in json_text:
+        return json_text
+    return _ESCAPE_RE.sub(_repair_escape, json_text)
+
+
+def loads_repaired(json_text: str):
+    """修復跳脫後解析（允許字串內的原始控制字元）"""
+    return json.loads(repair_json_escapes(json_text), strict=False)
+
+
+def parse_with_repair(json_text: str):
+    """先直接解析，失敗時修復跳脫後再解析"""
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
+        return loads_repaired(json_text)
+
+
+def salvage_gpss_items(json_text: str) -> Dict:
+    """
+    逐筆搶救：整體仍無法解析時，個別解析每個patentcontent項目，
+    保留所有可解析的項目（回應被截斷時也保留已完整的部分）
+    """
+    parser = GPSSStreamParser(item_parser=parse_with_repair, envelope_parser=parse_with_repair)
+    items: List[Dict] = parser.feed_text(json_text)
+
+    try:
+        envelope = parser.close()
+    except Exception as e:
+        logger.warning(f"回應外層結構無法解析，僅保留專利項目: {e}")
+        envelope = {}
+
+    if not isinstance(envelope, dict) or 'gpss-API' not in envelope:
+        envelope = {'gpss-API': {'patent': {}}}
+
+    gpss_data = envelope['gpss-API']
+    if 'error' not in gpss_data:
+        patent_info = gpss_data.get('patent')
+        if not isinstance(patent_info, dict):
+            patent_info = {}
+            gpss_data['patent'] = patent_info
+        patent_info['patentcontent'] = items
+
+    logger.info(f"🩹 逐筆搶救完成: 保留 {parser.items_parsed} 筆，略過 {parser.items_failed} 筆")
+    return envelope
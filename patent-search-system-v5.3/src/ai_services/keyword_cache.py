@@ -0,0 +1,323 @@
+# src/ai_services/keyword_cache.py - Qwen關鍵字/同義詞生成快取（含近似描述比對）
+
+import copy
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from src.config import settings
+from src.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class _KeywordEntry:
+    __slots__ = ('kind', 'normalized', 'shingles', 'signature', 'result', 'expires_at')
+
+    def __init__(self, kind: str, normalized: str, shingles: FrozenSet[int],
+                 signature: Tuple[int, ...], result: Dict, expires_at: float):
+        self.kind = kind
+        self.normalized = normalized
+        self.shingles = shingles
+        self.signature = signature
+        self.result = result
+        self.expires_at = expires_at
+
+
+class KeywordGenerationCache:
+    """
+    關鍵字/同義詞生成的讀穿式快取
+    - 完全比對：正規化描述（NFKC、小寫、合併空白）+ 生成類型 + 提示詞版本 + 模型名稱的SHA256，
+      先查行程內LRU，再查資料庫（keyword_cache表，跨worker共用）
+    - 近似比對：去除空白與標點後的字元2-gram做MinHash簽章，以LSH分段找出候選，
+      再以實際Jaccard相似度確認達到 similarity_threshold 才命中（只比對記憶體內的項目）
+    只快取Qwen實際生成的結果，不快取fallback。
+    """
+
+    SHINGLE_SIZE = 2
+
+    def __init__(
+        self,
+        model_name: str,
+        prompt_version: str,
+        max_memory_entries: Optional[int] = None,
+        ttl_days: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+        num_permutations: Optional[int] = None,
+        lsh_bands: Optional[int] = None,
+        near_duplicate: Optional[bool] = None,
+        persistent: bool = True
+    ):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.max_memory_entries = max_memory_entries or settings.KEYWORD_CACHE_MEMORY_SIZE
+        self.ttl_days = ttl_days or settings.KEYWORD_CACHE_TTL_DAYS
+        self.similarity_threshold = similarity_threshold or settings.KEYWORD_CACHE_SIMILARITY_THRESHOLD
+        self.near_duplicate = settings.KEYWORD_CACHE_NEAR_DUPLICATE if near_duplicate is None else near_duplicate
+        self.persistent = persistent
+
+        num_permutations = num_permutations or settings.KEYWORD_CACHE_MINHASH_PERMUTATIONS
+        bands = lsh_bands or settings.KEYWORD_CACHE_LSH_BANDS
+        if bands <= 0 or num_permutations % bands != 0:
+            raise Exception(f"MinHash排列數 {num_permutations} 必須能被LSH分段數 {bands} 整除")
+        self.num_permutations = num_permutations
+        self.lsh_bands = bands
+        self.rows_per_band = num_permutations // bands
+
+        # 固定種子：同一設定下簽章可重現
+        rng = random.Random(20240601)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_permutations)
+        ]
+
+        self._memory: "OrderedDict[str, _KeywordEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.near_candidates_checked = 0
+        self.near_similarity_total = 0.0
+        self.total_lookup_seconds = 0.0
+        self.lookups = 0
+
+    # ------------------------------------------------------------------
+    # 正規化與簽章
+    # ------------------------------------------------------------------
+    @staticmethod
+    def normalize(description: str) -> str:
+        text = unicodedata.normalize('NFKC', description or '').lower()
+        return _WHITESPACE.sub(' ', text).strip()
+
+    def _shingles(self, normalized: str) -> FrozenSet[int]:
+        """去除空白與標點後的字元n-gram（中文無分詞，字元n-gram即可反映用字差異）"""
+        compact = ''.join(ch for ch in normalized if ch.isalnum())
+        size = self.SHINGLE_SIZE
+        if len(compact) <= size:
+            grams = {compact} if compact else set()
+        else:
+            grams = {compact[i:i + size] for i in range(len(compact) - size + 1)}
+        return frozenset(zlib.crc32(gram.encode('utf-8')) for gram in grams)
+
+    def _signature(self, shingles: FrozenSet[int]) -> Tuple[int, ...]:
+        if not shingles:
+            return ()
+        values = list(shingles)
+        return tuple(
+            min([(a * value + b) % _MERSENNE_PRIME for value in values])
+            for a, b in self._permutations
+        )
+
+    def _band_keys(self, kind: str, signature: Tuple[int, ...]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+        rows = self.rows_per_band
+        return [
+            (kind, band, signature[band * rows:(band + 1) * rows])
+            for band in range(self.lsh_bands)
+        ]
+
+    @staticmethod
+    def _jaccard(left: FrozenSet[int], right: FrozenSet[int]) -> float:
+        if not left or not right:
+            return 0.0
+        return len(left & right) / len(left | right)
+
+    def build_key(self, kind: str, normalized: str) -> str:
+        payload = json.dumps([kind, normalized, self.prompt_version, self.model_name], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    # ------------------------------------------------------------------
+    # 啟動
+    # ------------------------------------------------------------------
+    async def warm(self):
+        """刪除舊版資料，並以資料庫內最近的快取重建記憶體LRU與近似比對索引"""
+        if not self.persistent:
+            return
+        removed = await DatabaseManager.purge_stale_keyword_cache(self.prompt_version, self.model_name)
+        if removed:
+            logger.info(f"🧹 已刪除 {removed} 筆舊版關鍵字快取（目前版本 {self.prompt_version}）")
+
+        entries = await DatabaseManager.get_recent_keyword_cache(
+            self.prompt_version, self.model_name, self.max_memory_entries
+        )
+        now = time.time()
+        # 由舊到新放入，最新的留在LRU尾端
+        for cache_key, kind, normalized, result, expires_at in reversed(entries):
+            remaining = (expires_at - datetime.utcnow()).total_seconds()
+            self._put_memory(cache_key, kind, normalized, result, now + remaining)
+        if entries:
+            logger.info(f"🔑 已載入 {len(entries)} 筆關鍵字快取至近似比對索引")
+
+    # ------------------------------------------------------------------
+    # 讀寫
+    # ------------------------------------------------------------------
+    async def get(self, kind: str, description: str) -> Optional[Dict]:
+        """
+        依序嘗試：記憶體完全比對 → 資料庫完全比對 → 近似描述比對
+        命中時回傳結果副本（source 為 qwen_cache，cache_match 為 exact / near）
+        """
+        started = time.perf_counter()
+        try:
+            normalized = self.normalize(description)
+            if not normalized:
+                return None
+            cache_key = self.build_key(kind, normalized)
+            now = time.time()
+
+            entry = self._memory.get(cache_key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._memory.move_to_end(cache_key)
+                    self.memory_hits += 1
+                    return self._to_result(entry.result, 'exact', 1.0)
+                self._evict(cache_key)
+
+            if self.persistent:
+                cached = await DatabaseManager.get_keyword_cache(cache_key)
+                if cached is not None:
+                    _, stored_normalized, result, expires_at = cached
+                    remaining = (expires_at - datetime.utcnow()).total_seconds()
+                    self._put_memory(cache_key, kind, stored_normalized, result, now + remaining)
+                    self.persistent_hits += 1
+                    return self._to_result(result, 'exact', 1.0)
+
+            if self.near_duplicate:
+                match = self._find_near_duplicate(kind, normalized, now)
+                if match is not None:
+                    matched_key, similarity = match
+                    self._memory.move_to_end(matched_key)
+                    self.near_hits += 1
+                    self.near_similarity_total += similarity
+                    logger.info(f"🔑 關鍵字快取近似命中（相似度 {similarity:.3f}）")
+                    return self._to_result(self._memory[matched_key].result, 'near', similarity)
+
+            self.misses += 1
+            return None
+        finally:
+            self.lookups += 1
+            self.total_lookup_seconds += time.perf_counter() - started
+
+    def _find_near_duplicate(self, kind: str, normalized: str, now: float) -> Optional[Tuple[str, float]]:
+        shingles = self._shingles(normalized)
+        signature = self._signature(shingles)
+        if not signature:
+            return None
+
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(kind, signature):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best_key, best_similarity = None, 0.0
+        for candidate_key in candidates:
+            entry = self._memory.get(candidate_key)
+            if entry is None or entry.expires_at <= now:
+                continue
+            self.near_candidates_checked += 1
+            similarity = self._jaccard(shingles, entry.shingles)
+            if similarity > best_similarity:
+                best_key, best_similarity = candidate_key, similarity
+
+        if best_key is None or best_similarity < self.similarity_threshold:
+            return None
+        return best_key, best_similarity
+
+    async def set(self, kind: str, description: str, result: Dict):
+        """寫入Qwen生成的結果（fallback結果不寫入）"""
+        if result.get('source') != 'qwen_api':
+            return
+        normalized = self.normalize(description)
+        if not normalized:
+            return
+
+        stored = {key: value for key, value in result.items() if key != 'source'}
+        cache_key = self.build_key(kind, normalized)
+        self._put_memory(cache_key, kind, normalized, stored, time.time() + self.ttl_days * 86400)
+        self.stores += 1
+
+        if self.persistent:
+            await DatabaseManager.save_keyword_cache(
+                cache_key=cache_key,
+                kind=kind,
+                prompt_version=self.prompt_version,
+                model_name=self.model_name,
+                normalized_description=normalized,
+                result=stored,
+                ttl_days=self.ttl_days
+            )
+
+    @staticmethod
+    def _to_result(stored: Dict, match: str, similarity: float) -> Dict:
+        result = copy.deepcopy(stored)
+        result['source'] = 'qwen_cache'
+        result['cache_match'] = match
+        result['cache_similarity'] = round(similarity, 3)
+        return result
+
+    # ------------------------------------------------------------------
+    # 記憶體LRU與LSH索引
+    # ------------------------------------------------------------------
+    def _put_memory(self, cache_key: str, kind: str, normalized: str, result: Dict, expires_at: float):
+        if cache_key in self._memory:
+            self._evict(cache_key)
+
+        shingles = self._shingles(normalized) if self.near_duplicate else frozenset()
+        signature = self._signature(shingles) if self.near_duplicate else ()
+        self._memory[cache_key] = _KeywordEntry(kind, normalized, shingles, signature, result, expires_at)
+        if signature:
+            for band_key in self._band_keys(kind, signature):
+                self._buckets.setdefault(band_key, set()).add(cache_key)
+
+        while len(self._memory) > self.max_memory_entries:
+            self._evict(next(iter(self._memory)))
+
+    def _evict(self, cache_key: str):
+        entry = self._memory.pop(cache_key, None)
+        if entry is None or not entry.signature:
+            return
+        for band_key in self._band_keys(entry.kind, entry.signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(cache_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def get_stats(self) -> Dict:
+        hits = self.memory_hits + self.persistent_hits + self.near_hits
+        lookups = hits + self.misses
+        hit_rate = (hits / lookups * 100) if lookups > 0 else 0
+
+        return {
+            'model_name': self.model_name,
+            'prompt_version': self.prompt_version,
+            'memory_entries': len(self._memory),
+            'max_memory_entries': self.max_memory_entries,
+            'ttl_days': self.ttl_days,
+            'persistent': self.persistent,
+            'near_duplicate': self.near_duplicate,
+            'similarity_threshold': self.similarity_threshold,
+            'minhash_permutations': self.num_permutations,
+            'lsh_bands': self.lsh_bands,
+            'lsh_buckets': len(self._buckets),
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': f"{hit_rate:.1f}%",
+            'avg_near_similarity': round(self.near_similarity_total / self.near_hits, 3) if self.near_hits else None,
+            'near_candidates_checked': self.near_candidates_checked,
+            'avg_lookup_ms': round(self.total_lookup_seconds / self.lookups * 1000, 2) if self.lookups else 0.0,
+            'stores': self.stores
+        }
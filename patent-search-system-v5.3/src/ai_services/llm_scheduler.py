@@ -0,0 +1,241 @@
+# src/ai_services/llm_scheduler.py - 所有LLM請求共用的優先權排程
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Tuple
+
+from src.config import settings
+from src.ai_services.adaptive_concurrency import AdaptiveConcurrencyLimiter, qwen_concurrency_limiter
+
+logger = logging.getLogger(__name__)
+
+# 優先權類別（由高到低）
+PRIORITY_INTERACTIVE = 'interactive'  # 關鍵字生成、問答：使用者正在等待單一回應
+PRIORITY_STANDARD = 'standard'        # 一般檢索結果的技術特徵生成
+PRIORITY_BULK = 'bulk'                # Excel批量分析、大量專利的技術特徵生成
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BULK)
+
+# 目前請求的（優先權, 會話鍵），asyncio.gather建立的子工作會繼承
+_request_context: ContextVar[Tuple[str, Optional[str]]] = ContextVar(
+    'llm_request_context', default=(PRIORITY_STANDARD, None)
+)
+
+
+@contextmanager
+def llm_request_context(priority: Optional[str] = None, session_key: Optional[str] = None):
+    """
+    設定區塊內LLM呼叫的優先權與公平排隊用的會話鍵（未指定的欄位沿用外層設定）
+    會話鍵可為會話ID或使用者驗證碼，排程器只保存其雜湊值
+    """
+    current_priority, current_session = _request_context.get()
+    token = _request_context.set((priority or current_priority, session_key or current_session))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def current_llm_request() -> Tuple[str, Optional[str]]:
+    return _request_context.get()
+
+
+class _QueuedRequest:
+    __slots__ = ('future', 'enqueued_at')
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class _ClassStats:
+    """單一優先權類別的排隊統計"""
+
+    RECENT_WINDOW = 500
+
+    def __init__(self):
+        self.dispatched = 0
+        self.aged_dispatches = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=self.RECENT_WINDOW)
+
+    def record(self, waited: float, aged: bool):
+        self.dispatched += 1
+        self.aged_dispatches += int(aged)
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.recent_waits.append(waited)
+
+    def snapshot(self, queued: int, sessions: int) -> Dict:
+        recent = sorted(self.recent_waits)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            'queued': queued,
+            'queued_sessions': sessions,
+            'dispatched': self.dispatched,
+            'aged_dispatches': self.aged_dispatches,
+            'cancelled': self.cancelled,
+            'avg_wait_ms': round(self.total_wait / self.dispatched * 1000, 1) if self.dispatched else 0.0,
+            'p95_wait_ms': round(p95 * 1000, 1),
+            'max_wait_ms': round(self.max_wait * 1000, 1)
+        }
+
+
+class LLMScheduler:
+    """
+    LLM請求排程器：決定下一個取得Qwen並行名額的請求
+    - 並行名額數由自適應並行上限（AIMD）決定，排程器只決定順序
+    - 依優先權類別嚴格排序：interactive > standard > bulk
+    - 同一類別內依會話輪流（每個會話一個佇列，round-robin），避免單一批量工作佔滿
+    - 防飢餓：較低類別的請求排隊超過 starvation_seconds 時提前放行（取等待最久者），
+      但較高類別仍有排隊時，每 AGED_SHARE 次放行最多一次給提前放行的請求，
+      避免大量同時排入的批量工作逾時後反過來佔滿所有名額
+    """
+
+    AGED_SHARE = 2
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter, starvation_seconds: Optional[float] = None):
+        self.limiter = limiter
+        self.starvation_seconds = starvation_seconds or settings.LLM_SCHEDULER_STARVATION_SECONDS
+        self.running = 0
+        self._since_aged = 0
+        self._queues: Dict[str, "OrderedDict[str, Deque[_QueuedRequest]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_CLASSES
+        }
+        self._stats: Dict[str, _ClassStats] = {priority: _ClassStats() for priority in PRIORITY_CLASSES}
+
+    @staticmethod
+    def _hash_session(session_key: Optional[str]) -> str:
+        if not session_key:
+            return '-'
+        return hashlib.sha256(session_key.encode('utf-8')).hexdigest()[:16]
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, session_key: Optional[str] = None):
+        """
+        排隊取得一個LLM呼叫名額，回傳自適應並行上限的ticket（用於回報結果）
+        未指定時使用 llm_request_context 設定的優先權與會話鍵
+        """
+        context_priority, context_session = current_llm_request()
+        priority = priority or context_priority
+        if priority not in self._queues:
+            priority = PRIORITY_STANDARD
+
+        await self._admit(priority, self._hash_session(session_key or context_session))
+        try:
+            async with self.limiter.slot() as ticket:
+                yield ticket
+        finally:
+            self.running -= 1
+            self._dispatch()
+
+    async def _admit(self, priority: str, session_hash: str):
+        if self.running < self.limiter.limit and not self._has_waiting():
+            self.running += 1
+            self._stats[priority].record(0.0, False)
+            return
+
+        request = _QueuedRequest(asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(session_hash, deque()).append(request)
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled():
+                # 已放行但呼叫端被取消，名額交給下一位
+                self.running -= 1
+                self._dispatch()
+            else:
+                self._remove(priority, session_hash, request)
+                self._stats[priority].cancelled += 1
+            raise
+
+    def _has_waiting(self) -> bool:
+        return any(self._queues[priority] for priority in PRIORITY_CLASSES)
+
+    def _remove(self, priority: str, session_hash: str, request: _QueuedRequest):
+        sessions = self._queues[priority]
+        queue = sessions.get(session_hash)
+        if queue is None:
+            return
+        try:
+            queue.remove(request)
+        except ValueError:
+            return
+        if not queue:
+            del sessions[session_hash]
+
+    def _dispatch(self):
+        """依優先權、防飢餓與會話輪流放行排隊中的請求，直到名額用滿"""
+        while self.running < self.limiter.limit:
+            selected = self._select()
+            if selected is None:
+                return
+            priority, aged, session_hash = selected
+
+            sessions = self._queues[priority]
+            queue = sessions[session_hash]
+            request = queue.popleft()
+            # 放行過的會話移到隊尾
+            del sessions[session_hash]
+            if queue:
+                sessions[session_hash] = queue
+
+            if request.future.done():
+                continue
+            self._since_aged = 0 if aged else self._since_aged + 1
+            self.running += 1
+            self._stats[priority].record(time.monotonic() - request.enqueued_at, aged)
+            request.future.set_result(None)
+
+    def _select(self) -> Optional[Tuple[str, bool, str]]:
+        """
+        回傳（要放行的類別, 是否因防飢餓而放行, 會話）；沒有排隊請求時回傳None
+        一般放行取該類別輪流順序中的第一個會話；防飢餓放行取隊首請求等待最久的會話
+        """
+        now = time.monotonic()
+        highest = None
+        starving = None
+        starving_session = None
+        starving_since = None
+
+        for priority in PRIORITY_CLASSES:
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            if highest is None:
+                highest = priority
+                continue
+            session_hash, queue = min(sessions.items(), key=lambda item: item[1][0].enqueued_at)
+            oldest = queue[0].enqueued_at
+            if now - oldest >= self.starvation_seconds and (starving_since is None or oldest < starving_since):
+                starving, starving_session, starving_since = priority, session_hash, oldest
+
+        if starving is not None and self._since_aged >= self.AGED_SHARE - 1:
+            return starving, True, starving_session
+        if highest is not None:
+            return highest, False, next(iter(self._queues[highest]))
+        return None
+
+    def get_stats(self) -> Dict:
+        return {
+            'running': self.running,
+            'current_limit': self.limiter.limit,
+            'starvation_seconds': self.starvation_seconds,
+            'classes': {
+                priority: self._stats[priority].snapshot(
+                    queued=sum(len(queue) for queue in self._queues[priority].values()),
+                    sessions=len(self._queues[priority])
+                )
+                for priority in PRIORITY_CLASSES
+            }
+        }
+
+
+# 單例實例：同一worker內所有Qwen呼叫（QwenAPIService、問答服務）都經由此排程器
+llm_scheduler = LLMScheduler(qwen_concurrency_limiter)
@@ -0,0 +1,99 @@
+# src/ai_services/patent_dedup.py - LLM處理前的重複專利分群
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from src.ai_services.patent_record import PatentRecord
+
+# 正規化時移除的字元（空白、標點、符號）
+_NON_WORD_PATTERN = re.compile(r'[\W_]+', re.UNICODE)
+
+# 摘要正規化後至少需要的字數，太短的摘要不足以判定重複
+MIN_ABSTRACT_LENGTH = 20
+
+
+def _normalize_text(text: Optional[str]) -> str:
+    if not text or text == 'N/A':
+        return ''
+    return _NON_WORD_PATTERN.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def application_key(patent: PatentRecord) -> Optional[str]:
+    """同一國家的同一申請案（例如TWA公開案與TWB公告案）"""
+    number = _normalize_text(patent.application_number)
+    if not number:
+        return None
+    return f"AN:{patent.country}:{number}"
+
+
+def content_key(patent: PatentRecord) -> Optional[str]:
+    """正規化標題+摘要的雜湊（內容相同的同族或重複收錄專利）"""
+    abstract = _normalize_text(patent.abstract)
+    if len(abstract) < MIN_ABSTRACT_LENGTH:
+        return None
+    payload = f"{_normalize_text(patent.title)}\x00{abstract}"
+    return "TX:" + hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def cluster_duplicate_patents(patents: List[PatentRecord]) -> List[List[PatentRecord]]:
+    """
+    依申請號與標題+摘要雜湊將重複的專利分群（任一鍵相同即同群，具遞移性）
+    回傳群組列表，依各群第一筆出現的順序排列；每群第一筆為代表專利
+    （內容最完整者，即摘要+權利要求最長，相同時取先出現者）
+    """
+    parent = list(range(len(patents)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    first_by_key: Dict[str, int] = {}
+    for index, patent in enumerate(patents):
+        for key in (application_key(patent), content_key(patent)):
+            if key is None:
+                continue
+            other = first_by_key.setdefault(key, index)
+            if other != index:
+                root, other_root = find(index), find(other)
+                if root != other_root:
+                    parent[max(root, other_root)] = min(root, other_root)
+
+    groups: Dict[int, List[PatentRecord]] = {}
+    for index, patent in enumerate(patents):
+        groups.setdefault(find(index), []).append(patent)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) > 1:
+            representative = max(members, key=lambda p: len(p.abstract or '') + len(p.claims or ''))
+            members.remove(representative)
+            members.insert(0, representative)
+        clusters.append(members)
+    return clusters
+
+
+def mark_clusters(clusters: List[List[PatentRecord]]):
+    """在重複群組的每筆專利上標記代表專利與群組筆數"""
+    for members in clusters:
+        if len(members) < 2:
+            continue
+        representative = members[0]
+        group_id = representative.publication_number
+        if not group_id or group_id == 'N/A':
+            group_id = representative.application_number
+        for patent in members:
+            patent.duplicate_group = group_id
+            patent.duplicate_count = len(members)
+
+
+def copy_features_to_members(members: List[PatentRecord]):
+    """將代表專利的技術特徵/功效（或失敗狀態）複製到群組其他成員"""
+    representative = members[0]
+    for patent in members[1:]:
+        patent.technical_features = list(representative.technical_features) if representative.technical_features is not None else None
+        patent.technical_effects = list(representative.technical_effects) if representative.technical_effects is not None else None
+        patent.processing_error = representative.processing_error
@@ -0,0 +1,196 @@
+# src/ai_services/patent_record.py - 解析後的GPSS專利資料模型
+
+import sys
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+# GPSS專利詳細頁面連結格式
+PATENT_LINK_BASE_URL = "https://tiponet.tipo.gov.tw/gpss4/gpsskmc/gpssbkm"
+
+# 國家代碼到顯示名稱的映射
+COUNTRY_DISPLAY_MAPPING = {
+    'TW': 'TW',
+    'US': 'US',
+    'JP': 'JP',
+    'EP': 'EP',
+    'KR': 'KR',
+    'CN': 'CN',
+    'WO': 'WO',
+    'SEA': 'SEA',
+    'OTHER': '其他'
+}
+
+# 舊版dict鍵名 → 屬性名稱（相容仍以 patent.get(...) 存取的程式）
+_KEY_ALIASES = {
+    '_source_index': 'source_index',
+    '_hydrated': 'hydrated',
+    '_processing_error': 'processing_error',
+    'case_type': 'status'  # AG欄位：A=公開案, B=公告案，與@status相同
+}
+
+# 重複值極多的代碼欄位，以sys.intern共用同一字串物件
+_INTERNED_FIELDS = ('database', 'country', 'patent_type', 'status')
+
+
+def build_patent_link(publication_number: str) -> str:
+    """根據公開公告號生成GPSS專利連結"""
+    if not publication_number or publication_number == 'N/A':
+        return ''
+    return f"{PATENT_LINK_BASE_URL}?!!FRURL{publication_number}"
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True, eq=False)
+class PatentRecord:
+    """
+    單筆專利的精簡資料模型（__slots__，無逐筆dict）
+    從GPSS回應解析後一路沿用到Qwen處理與結果格式化，
+    只在輸出API回應時才轉為中文鍵名的dict（to_result_dict / to_feature_result_dict）。
+    保留 get / [] 存取，舊版以dict鍵名存取的程式不需修改。
+    """
+
+    title: str = 'N/A'
+    applicants: str = 'N/A'
+    inventors: str = 'N/A'
+    abstract: str = ''
+    claims: str = ''
+    publication_number: str = 'N/A'
+    application_number: str = 'N/A'
+    publication_date: str = 'N/A'
+    application_date: str = 'N/A'
+    priority_date: str = 'N/A'
+    ipc_classes: List[str] = field(default_factory=list)
+    database: str = 'Unknown'
+    country: str = 'TW'
+    patent_type: str = 'Unknown'
+    status: str = 'Unknown'
+
+    # 處理過程中補上的欄位
+    source_index: Optional[int] = None
+    hydrated: bool = False
+    sequence: Optional[int] = None
+    technical_features: Optional[List[str]] = None
+    technical_effects: Optional[List[str]] = None
+    processing_error: Optional[str] = None
+
+    # 重複專利分群（同申請案的公開/公告案、內容相同的同族專利）
+    duplicate_group: Optional[str] = None   # 代表專利的公開公告號
+    duplicate_count: Optional[int] = None   # 群組筆數
+
+    def __post_init__(self):
+        for name in _INTERNED_FIELDS:
+            setattr(self, name, _intern(getattr(self, name)))
+
+    @property
+    def case_type(self) -> str:
+        return self.status
+
+    # --- 序列化（行程池回傳時使用，比逐欄位dict小，並重新intern代碼欄位） ---
+
+    def __getstate__(self):
+        return tuple(getattr(self, f.name) for f in fields(self))
+
+    def __setstate__(self, state):
+        for f, value in zip(fields(self), state):
+            object.__setattr__(self, f.name, value)
+        self.__post_init__()
+
+    # --- dict相容存取 ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """與dict.get相同；值為None的處理欄位視為不存在"""
+        value = getattr(self, _KEY_ALIASES.get(key, key), None)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        name = _KEY_ALIASES.get(key, key)
+        try:
+            setattr(self, name, _intern(value) if name in _INTERNED_FIELDS else value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    # --- 輸出 ---
+
+    def feature_input(self) -> Dict[str, str]:
+        """Qwen技術特徵生成所需的欄位"""
+        return {
+            'title': self.title,
+            'abstract': self.abstract,
+            'claims': self.claims,
+            'main_claim': self.claims[:500] if self.claims else ''
+        }
+
+    def to_result_dict(self, sequence: Optional[int] = None) -> Dict[str, Any]:
+        """格式化為檢索結果API的中文欄位格式"""
+        applicants = self.applicants if self.applicants and self.applicants != 'N/A' else 'N/A'
+        result = {
+            "序號": sequence if sequence is not None else self.sequence,
+            "專利名稱": self.title,
+            "申請人": applicants,
+            "國家": COUNTRY_DISPLAY_MAPPING.get(self.country, self.country),
+            "申請號": self.application_number,
+            "公開公告號": self.publication_number,
+            "摘要": self.abstract,
+            "專利範圍": self.claims,
+            "技術特徵": self.technical_features or [],
+            "技術功效": self.technical_effects or [],
+            "專利連結": build_patent_link(self.publication_number),
+            "_debug_info": {
+                "raw_applicants": self.applicants,
+                "raw_country": self.country,
+                "database": self.database
+            }
+        }
+        if self.processing_error:
+            result["處理狀態"] = f"部分失敗: {self.processing_error}"
+        if self.duplicate_group:
+            result["重複群組"] = self.duplicate_group_info()
+        return result
+
+    def to_feature_result_dict(self, sequence: Optional[int] = None) -> Dict[str, Any]:
+        """格式化為同義詞檢索（含技術特徵）API的中文欄位格式"""
+        if self.processing_error:
+            technical_features = ['技術特徵生成失敗']
+            technical_effects = ['技術功效生成失敗']
+        else:
+            technical_features = self.technical_features if self.technical_features is not None else ['技術特徵生成中...']
+            technical_effects = self.technical_effects if self.technical_effects is not None else ['技術功效生成中...']
+
+        result = {
+            "序號": sequence if sequence is not None else self.sequence,
+            "專利名稱": self.title,
+            "公開公告號": self.publication_number,
+            "摘要": self.abstract,
+            "專利範圍": self.claims,
+            "技術特徵": technical_features,
+            "技術功效": technical_effects,
+            "申請人": self.applicants,
+            "發明人": self.inventors,
+            "國家": self.country,
+            "申請日": self.application_date,
+            "公開日": self.publication_date,
+            "IPC分類": self.ipc_classes
+        }
+        if self.duplicate_group:
+            result["重複群組"] = self.duplicate_group_info()
+        return result
+
+    def duplicate_group_info(self) -> Dict[str, Any]:
+        """重複群組資訊（技術特徵由代表專利生成後共用）"""
+        return {
+            "代表公開公告號": self.duplicate_group,
+            "群組筆數": self.duplicate_count,
+            "為代表專利": self.duplicate_group in (self.publication_number, self.application_number)
+        }
@@ -0,0 +1,323 @@
+# src/ai_services/qwen_endpoint_pool.py - 多個Qwen模型副本的請求分配（最少進行中請求、健康移出、對沖請求）
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def qwen_endpoint_urls() -> List[str]:
+    """設定的Qwen端點：QWEN_API_URLS（逗號分隔），未設定時為 QWEN_API_URL"""
+    return parse_endpoint_urls(settings.QWEN_API_URLS) or [settings.QWEN_API_URL.rstrip('/')]
+
+
+def parse_endpoint_urls(value: str) -> List[str]:
+    urls = []
+    for url in (value or '').split(','):
+        url = url.strip().rstrip('/')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+class QwenEndpoint:
+    """單一模型副本的狀態"""
+
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.ejections = 0
+        self.avg_latency: Optional[float] = None
+        self.last_failure: Optional[str] = None
+
+    def is_healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def get_stats(self, now: float) -> Dict:
+        return {
+            'url': self.url,
+            'healthy': self.is_healthy(now),
+            'ejected_for_seconds': round(max(self.ejected_until - now, 0.0), 1),
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'avg_latency_ms': round(self.avg_latency * 1000, 1) if self.avg_latency is not None else None,
+            'last_failure': self.last_failure
+        }
+
+
+class EndpointLease:
+    """單次請求選定的端點，請求完成後回報結果（與自適應並行上限的ticket用法相同）"""
+
+    __slots__ = ('pool', 'endpoint', 'started_at', 'reported')
+
+    def __init__(self, pool: "QwenEndpointPool", endpoint: QwenEndpoint):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.started_at = time.monotonic()
+        self.reported = False
+
+    @property
+    def url(self) -> str:
+        return self.endpoint.url
+
+    def succeeded(self):
+        if not self.reported:
+            self.reported = True
+            self.pool._on_success(self.endpoint, time.monotonic() - self.started_at)
+
+    def failed(self, reason: str):
+        """回報端點故障（5xx、429、逾時、連線錯誤）"""
+        if not self.reported:
+            self.reported = True
+            self.pool._on_failure(self.endpoint, reason)
+
+    def ignored(self):
+        """結果與端點健康無關（例如4xx請求錯誤）"""
+        self.reported = True
+
+
+class _KindLatency:
+    """同一類呼叫（例如關鍵字生成）的近期延遲與對沖統計"""
+
+    WINDOW = 200
+
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=self.WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+
+    def p95(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class QwenEndpointPool:
+    """
+    Qwen端點池
+    - 分配：選擇進行中請求最少的健康端點（相同時隨機），單一端點時等同直接呼叫
+    - 健康移出：連續失敗 eject_failures 次的端點移出 eject_seconds 秒，到期後重新參與分配；
+      所有端點都被移出時仍選擇最早到期者，不讓請求直接失敗
+    - 對沖請求（run 指定 hedge_kind 時）：超過該類呼叫近期p95仍未回應，改送一份相同請求到另一個端點，
+      採用先回應者並取消另一份；對沖數量以 hedge_max_ratio 限制，避免整體變慢時加倍負載
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        eject_failures: Optional[int] = None,
+        eject_seconds: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_min_samples: Optional[int] = None,
+        hedge_min_delay_ms: Optional[float] = None,
+        hedge_max_ratio: Optional[float] = None
+    ):
+        if not urls:
+            raise Exception("Qwen端點池至少需要一個端點")
+        self.endpoints = [QwenEndpoint(url) for url in urls]
+        self.eject_failures = eject_failures or settings.QWEN_ENDPOINT_EJECT_FAILURES
+        self.eject_seconds = eject_seconds or settings.QWEN_ENDPOINT_EJECT_SECONDS
+        self.hedge_enabled = settings.QWEN_HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.hedge_min_samples = hedge_min_samples or settings.QWEN_HEDGE_MIN_SAMPLES
+        self.hedge_min_delay = (hedge_min_delay_ms or settings.QWEN_HEDGE_MIN_DELAY_MS) / 1000
+        self.hedge_max_ratio = settings.QWEN_HEDGE_MAX_RATIO if hedge_max_ratio is None else hedge_max_ratio
+        self._kinds: Dict[str, _KindLatency] = {}
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def describe(self) -> str:
+        return ', '.join(self.urls)
+
+    # ------------------------------------------------------------------
+    # 分配
+    # ------------------------------------------------------------------
+    def _select(self, exclude: Iterable[str] = ()) -> Optional[QwenEndpoint]:
+        excluded = set(exclude)
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.url not in excluded]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in candidates if endpoint.is_healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda endpoint: endpoint.ejected_until)
+        fewest = min(endpoint.outstanding for endpoint in healthy)
+        return random.choice([endpoint for endpoint in healthy if endpoint.outstanding == fewest])
+
+    def healthy_count(self, exclude: Iterable[str] = ()) -> int:
+        excluded = set(exclude)
+        now = time.monotonic()
+        return sum(1 for endpoint in self.endpoints if endpoint.url not in excluded and endpoint.is_healthy(now))
+
+    @asynccontextmanager
+    async def lease(self, exclude: Iterable[str] = ()):
+        """選定一個端點（排除 exclude 中的網址，無其他端點時不排除）並計入進行中請求"""
+        endpoint = self._select(exclude) or self._select()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        lease = EndpointLease(self, endpoint)
+        try:
+            yield lease
+        except asyncio.CancelledError:
+            # 對沖落後的一方被取消，不影響端點健康
+            lease.ignored()
+            raise
+        except Exception as e:
+            # 逾時、連線錯誤等未回報的例外視為端點故障
+            lease.failed(type(e).__name__)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+
+    def _on_success(self, endpoint: QwenEndpoint, seconds: float):
+        endpoint.successes += 1
+        endpoint.consecutive_failures = 0
+        if endpoint.avg_latency is None:
+            endpoint.avg_latency = seconds
+        else:
+            endpoint.avg_latency += QwenEndpoint.LATENCY_ALPHA * (seconds - endpoint.avg_latency)
+
+    def _on_failure(self, endpoint: QwenEndpoint, reason: str):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.last_failure = reason
+        if len(self.endpoints) > 1 and endpoint.consecutive_failures >= self.eject_failures:
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            endpoint.consecutive_failures = 0
+            endpoint.ejections += 1
+            logger.warning(f"⚠️ Qwen端點 {endpoint.url} 連續失敗（{reason}），移出 {self.eject_seconds:.0f} 秒")
+
+    # ------------------------------------------------------------------
+    # 執行（可選對沖）
+    # ------------------------------------------------------------------
+    def _kind(self, hedge_kind: str) -> _KindLatency:
+        stats = self._kinds.get(hedge_kind)
+        if stats is None:
+            stats = self._kinds[hedge_kind] = _KindLatency()
+        return stats
+
+    def hedge_delay(self, hedge_kind: str) -> Optional[float]:
+        """該類呼叫的對沖等待秒數（近期p95）；樣本不足時回傳None"""
+        stats = self._kind(hedge_kind)
+        if len(stats.samples) < self.hedge_min_samples:
+            return None
+        return max(stats.p95(), self.hedge_min_delay)
+
+    async def run(
+        self,
+        attempt: Callable[[EndpointLease], Awaitable[T]],
+        hedge_kind: Optional[str] = None,
+        accept: Callable[[T], bool] = lambda result: True
+    ) -> T:
+        """
+        以選定的端點執行 attempt；accept 判斷回傳值是否為可用的回答（用於延遲統計與對沖時選擇結果）
+        hedge_kind 為None或未啟用對沖時只送出一份請求
+        """
+        if hedge_kind is None:
+            async with self.lease() as lease:
+                return await attempt(lease)
+
+        stats = self._kind(hedge_kind)
+        stats.requests += 1
+        delay = self.hedge_delay(hedge_kind) if self.hedge_enabled and len(self.endpoints) > 1 else None
+        chosen: List[str] = []
+        if delay is None:
+            return await self._timed(attempt, stats, accept, (), chosen)
+
+        primary = asyncio.ensure_future(self._timed(attempt, stats, accept, (), chosen))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if self.healthy_count(exclude=chosen) == 0 or stats.hedges >= stats.requests * self.hedge_max_ratio:
+                stats.hedges_skipped += 1
+                return await primary
+
+            stats.hedges += 1
+            logger.info(f"🔀 {hedge_kind} 超過p95（{delay * 1000:.0f} ms）未回應，對沖送往另一端點")
+            hedge = asyncio.ensure_future(self._timed(attempt, stats, accept, tuple(chosen), chosen))
+            tasks.append(hedge)
+
+            pending = set(tasks)
+            fallback = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 兩份同時完成時優先採用原請求
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None and accept(task.result()):
+                        if task is hedge:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    fallback = task
+            # 兩份都未得到可用回答：回傳（或拋出）最後完成者的結果
+            return fallback.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _timed(
+        self,
+        attempt: Callable[[EndpointLease], Awaitable[T]],
+        stats: _KindLatency,
+        accept: Callable[[T], bool],
+        exclude: Sequence[str],
+        chosen: List[str]
+    ) -> T:
+        async with self.lease(exclude) as lease:
+            chosen.append(lease.url)
+            result = await attempt(lease)
+            if accept(result):
+                stats.samples.append(time.monotonic() - lease.started_at)
+            return result
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            'endpoints': [endpoint.get_stats(now) for endpoint in self.endpoints],
+            'healthy_endpoints': self.healthy_count(),
+            'eject_failures': self.eject_failures,
+            'eject_seconds': self.eject_seconds,
+            'hedge_enabled': self.hedge_enabled,
+            'hedge_max_ratio': self.hedge_max_ratio,
+            'hedging': {
+                kind: {
+                    'requests': stats.requests,
+                    'p95_ms': round(stats.p95() * 1000, 1) if stats.samples else None,
+                    'hedges': stats.hedges,
+                    'hedge_wins': stats.hedge_wins,
+                    'hedges_skipped': stats.hedges_skipped
+                }
+                for kind, stats in self._kinds.items()
+            }
+        }
+
+
+# 單例實例：同一worker內的QwenAPIService與問答服務共用端點的進行中請求數與健康狀態
+qwen_endpoint_pool = QwenEndpointPool(qwen_endpoint_urls())
@@ -1,17 +1,39 @@
 import asyncio
 import aiohttp
+import hashlib
 import logging
 import json
 import re
 from typing import List, Dict, Optional, Tuple
+from src.config import settings
+from src.ai_services.adaptive_concurrency import LimiterTicket, qwen_concurrency_limiter
+from src.ai_services.llm_scheduler import PRIORITY_INTERACTIVE, llm_scheduler
+from src.ai_services.qwen_endpoint_pool import EndpointLease, QwenEndpointPool, parse_endpoint_urls, qwen_endpoint_pool
+from src.ai_services.structured_output import (
+    StructuredOutputSupport,
+    StructuredSchema,
+    keywords_schema,
+    keywords_with_synonyms_schema,
+    tech_features_batch_schema,
+    tech_features_schema
+)
+from src.ai_services.token_budget import token_budget
 
 logger = logging.getLogger(__name__)
 
 class QwenAPIService:
     """Qwen API服務類 - 優化版本"""
+
+    TECH_FEATURES_SYSTEM_PROMPT = "你是專業的專利技術分析專家，擅長從專利內容中提取技術特徵和功效。請仔細分析專利內容，識別核心技術特徵和實際效果。你必須嚴格按照要求的JSON格式回答。"
     
-    def __init__(self, api_url: str = "http://10.4.16.36:8001"):
-        self.api_url = api_url
+    def __init__(self, api_url: Optional[str] = None):
+        # 未指定時使用設定的端點（QWEN_API_URLS / QWEN_API_URL），與問答服務共用端點池；
+        # 指定時可為單一網址或逗號分隔的多個網址
+        if api_url is None:
+            self.endpoint_pool = qwen_endpoint_pool
+        else:
+            self.endpoint_pool = QwenEndpointPool(parse_endpoint_urls(api_url))
+        self.api_url = self.endpoint_pool.describe()
         self.model_name = "Qwen2.5-72B-Instruct"
         self.session = None
         self.total_api_calls = 0
@@ -26,8 +48,21 @@ class QwenAPIService:
         self.max_tokens_keywords = 400  # 關鍵字生成token限制
         self.max_tokens_features = 800  # 技術特徵生成token限制
 
+        # 多筆專利合併提示詞統計
+        self.batch_calls = 0
+        self.batched_patents = 0
+        self.batch_item_fallbacks = 0
+
+        # 關鍵字/同義詞/技術特徵回應的JSON Schema限制（依伺服器支援情況自動降級）
+        self.structured_output = StructuredOutputSupport()
+
+        # 所有Qwen呼叫共用的自適應並行上限（取代固定的請求間延遲）與優先權排程
+        self.concurrency_limiter = qwen_concurrency_limiter
+        self.scheduler = llm_scheduler
+
     async def initialize(self):
         """初始化 aiohttp session - 優化版本"""
+        await token_budget.ensure_loaded()
         if self.session is None:
             # 優化超時設置
             timeout = aiohttp.ClientTimeout(
@@ -38,8 +73,8 @@ class QwenAPIService:
             
             # 優化連接器設置
             connector = aiohttp.TCPConnector(
-                limit=20,              # 增加連接池大小
-                limit_per_host=8,      # 每主機連接數
+                limit=max(20, settings.QWEN_CONCURRENCY_MAX * 2),       # 對沖請求可能額外佔用連線
+                limit_per_host=settings.QWEN_CONCURRENCY_MAX,           # 實際並行數由自適應上限控制
                 ttl_dns_cache=300,     # DNS緩存時間
                 use_dns_cache=True,
                 keepalive_timeout=30,  # 保持連接時間
@@ -70,7 +105,7 @@ class QwenAPIService:
         """
         try:
             # 限制描述長度以避免超時
-            description = self._truncate_text(description, 1500)
+            description = self._truncate_text(description, settings.QWEN_KEYWORD_DESCRIPTION_TOKENS)
             prompt = self._build_keyword_generation_prompt(description, num_keywords)
 
             payload = {
@@ -94,11 +129,16 @@ class QwenAPIService:
             }
 
             # 使用帶重試的API調用
-            result = await self._call_qwen_api_with_retry(payload, operation="關鍵字生成")
+            result = await self._call_qwen_api_with_retry(
+                payload, operation="關鍵字生成", priority=PRIORITY_INTERACTIVE, hedge_kind="keywords",
+                structured=keywords_schema(num_keywords)
+            )
 
             if result.get('success', False):
                 parsed_data = self._parse_json_response(result['content'])
-                if parsed_data and 'keywords' in parsed_data:
+                parsed_ok = bool(parsed_data) and 'keywords' in parsed_data
+                self.structured_output.record_parse('keywords', result.get('structured_mode'), parsed_ok)
+                if parsed_ok:
                     keywords = parsed_data['keywords'][:num_keywords]
                     # 驗證關鍵字質量
                     validated_keywords = self._validate_keywords(keywords, description)
@@ -129,7 +169,7 @@ class QwenAPIService:
         """
         try:
             # 限制描述長度
-            description = self._truncate_text(description, 1500)
+            description = self._truncate_text(description, settings.QWEN_KEYWORD_DESCRIPTION_TOKENS)
             prompt = self._build_keyword_synonyms_generation_prompt(description, num_keywords, num_synonyms)
 
             payload = {
@@ -153,11 +193,16 @@ class QwenAPIService:
             }
 
             # 使用帶重試的API調用
-            result = await self._call_qwen_api_with_retry(payload, operation="關鍵字和同義詞生成")
+            result = await self._call_qwen_api_with_retry(
+                payload, operation="關鍵字和同義詞生成", priority=PRIORITY_INTERACTIVE, hedge_kind="keywords_synonyms",
+                structured=keywords_with_synonyms_schema(num_keywords, num_synonyms)
+            )
 
             if result.get('success', False):
                 parsed_data = self._parse_json_response(result['content'])
-                if parsed_data and 'keywords_with_synonyms' in parsed_data:
+                parsed_ok = bool(parsed_data) and 'keywords_with_synonyms' in parsed_data
+                self.structured_output.record_parse('keywords_with_synonyms', result.get('structured_mode'), parsed_ok)
+                if parsed_ok:
                     keywords_data = parsed_data['keywords_with_synonyms'][:num_keywords]
                     # 驗證和清理數據
                     validated_data = self._validate_keywords_with_synonyms(keywords_data, description)
@@ -189,14 +234,14 @@ class QwenAPIService:
                 return self._generate_features_fallback(patent_data)
 
             # 構建優化的提示詞
-            prompt = self._build_tech_features_prompt_optimized(title, abstract[:1000], claims[:1000])
+            prompt = self._build_tech_features_prompt_optimized(*self._feature_prompt_fields(patent_data))
 
             payload = {
                 "model": self.model_name,
                 "messages": [
                     {
                         "role": "system",
-                        "content": "你是專業的專利技術分析專家，擅長從專利內容中提取技術特徵和功效。請仔細分析專利內容，識別核心技術特徵和實際效果。你必須嚴格按照要求的JSON格式回答。"
+                        "content": self.TECH_FEATURES_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -210,11 +255,15 @@ class QwenAPIService:
             }
 
             # 使用帶重試的API調用
-            result = await self._call_qwen_api_with_retry(payload, operation="技術特徵生成")
+            result = await self._call_qwen_api_with_retry(
+                payload, operation="技術特徵生成", structured=tech_features_schema()
+            )
 
             if result.get('success', False):
                 parsed_data = self._parse_json_response(result['content'])
-                if parsed_data and 'technical_features' in parsed_data:
+                parsed_ok = bool(parsed_data) and 'technical_features' in parsed_data
+                self.structured_output.record_parse('tech_features', result.get('structured_mode'), parsed_ok)
+                if parsed_ok:
                     # 後處理結果，確保質量
                     features = self._post_process_features(parsed_data.get('technical_features', []))
                     effects = self._post_process_effects(parsed_data.get('technical_effects', []))
@@ -233,9 +282,170 @@ class QwenAPIService:
             logger.error(f"技術特徵生成失敗: {e}")
             return self._generate_features_fallback(patent_data)
 
-    async def _call_qwen_api_with_retry(self, payload: Dict, operation: str = "API調用") -> Dict:
-        """調用Qwen API並支持重試機制"""
+    async def generate_technical_features_batch(self, patents_data: List[Dict]) -> List[Dict]:
+        """
+        將多筆專利合併為一個提示詞生成技術特徵和功效，回傳與輸入順序相同的結果列表
+        回應為依專利編號標記的JSON陣列；缺漏或驗證失敗的項目改以單筆呼叫補上
+        """
+        if len(patents_data) <= 1:
+            return [await self.generate_technical_features_and_effects(patent_data) for patent_data in patents_data]
+
+        results: Dict[int, Dict] = {}
+        try:
+            items = [self._feature_prompt_fields(patent_data) for patent_data in patents_data]
+            prompt = self._build_tech_features_batch_prompt(items)
+
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": self.TECH_FEATURES_SYSTEM_PROMPT
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": 0.3,
+                "max_tokens": settings.QWEN_BATCH_OUTPUT_TOKENS_PER_PATENT * len(patents_data),
+                "stream": False,
+                "top_p": 0.8
+            }
+
+            self.batch_calls += 1
+            self.batched_patents += len(patents_data)
+            result = await self._call_qwen_api_with_retry(
+                payload, operation=f"批次技術特徵生成({len(patents_data)}筆)",
+                structured=tech_features_batch_schema(len(patents_data))
+            )
+
+            if result.get('success', False):
+                results = self._parse_batch_features_response(result['content'], len(patents_data))
+                # 有任何一筆缺漏都需單筆補呼叫，視為解析失敗
+                self.structured_output.record_parse(
+                    'tech_features_batch', result.get('structured_mode'), len(results) == len(patents_data)
+                )
+
+        except Exception as e:
+            logger.error(f"批次技術特徵生成失敗: {e}")
+
+        missing = [index for index in range(len(patents_data)) if index not in results]
+        if missing:
+            self.batch_item_fallbacks += len(missing)
+            logger.warning(f"批次技術特徵有 {len(missing)}/{len(patents_data)} 筆缺漏或格式錯誤，改以單筆生成")
+            fallback_results = await asyncio.gather(*(
+                self.generate_technical_features_and_effects(patents_data[index]) for index in missing
+            ))
+            results.update(zip(missing, fallback_results))
+
+        return [results[index] for index in range(len(patents_data))]
+
+    def plan_feature_batches(
+        self,
+        patents_data: List[Dict],
+        token_budget: Optional[int] = None,
+        max_patents: Optional[int] = None
+    ) -> List[List[int]]:
+        """依估算的輸入token數將專利分組（回傳各組在輸入列表中的索引）"""
+        token_budget = token_budget or settings.QWEN_BATCH_TOKEN_BUDGET
+        max_patents = max(1, max_patents or settings.QWEN_BATCH_MAX_PATENTS)
+        preamble_tokens = self.estimate_tokens(self.TECH_FEATURES_SYSTEM_PROMPT + self._build_tech_features_batch_prompt([]))
+
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = preamble_tokens
+        for index, patent_data in enumerate(patents_data):
+            title, abstract, claims = self._feature_prompt_fields(patent_data)
+            item_tokens = self.estimate_tokens(title + abstract + claims) + 20
+            if current and (current_tokens + item_tokens > token_budget or len(current) >= max_patents):
+                batches.append(current)
+                current, current_tokens = [], preamble_tokens
+            current.append(index)
+            current_tokens += item_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """token數（已載入Qwen分詞器時為實際值，否則粗估）"""
+        return token_budget.count(text)
+
+    def _feature_prompt_fields(self, patent_data: Dict) -> Tuple[str, str, str]:
+        """提示詞中使用的專利欄位（單筆與批次提示詞共用，依token上限截斷）"""
+        return (
+            token_budget.truncate(patent_data.get('title', '') or '', settings.QWEN_FEATURE_TITLE_TOKENS),
+            token_budget.truncate(patent_data.get('abstract', '') or '', settings.QWEN_FEATURE_ABSTRACT_TOKENS),
+            token_budget.truncate(patent_data.get('claims', '') or '', settings.QWEN_FEATURE_CLAIMS_TOKENS)
+        )
+
+    def _parse_batch_features_response(self, response_text: str, count: int) -> Dict[int, Dict]:
+        """解析批次回應，回傳 {輸入索引: 結果}；只保留通過驗證的項目"""
+        parsed = None
+        clean_text = (response_text or '').strip()
+        json_start = clean_text.find('[')
+        json_end = clean_text.rfind(']')
+        if json_start != -1 and json_end > json_start:
+            json_text = clean_text[json_start:json_end + 1]
+            for candidate in (json_text, self._fix_common_json_issues(json_text)):
+                if not candidate:
+                    continue
+                try:
+                    parsed = json.loads(candidate)
+                    break
+                except json.JSONDecodeError:
+                    continue
+
+        if parsed is None:
+            wrapped = self._parse_json_response(response_text)
+            parsed = wrapped.get('results') if isinstance(wrapped, dict) else None
+
+        if not isinstance(parsed, list):
+            self.json_parse_failures += 1
+            logger.warning("批次技術特徵回應無法解析為JSON陣列")
+            return {}
+
+        results = {}
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get('index')) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < count or index in results:
+                continue
+
+            features = self._post_process_features(item.get('technical_features') or [])
+            effects = self._post_process_effects(item.get('technical_effects') or [])
+            if not features or not effects:
+                continue
+
+            results[index] = {
+                "technical_features": features[:5],
+                "technical_effects": effects[:5],
+                "source": "qwen_api"
+            }
+        return results
+
+    async def _call_qwen_api_with_retry(
+        self,
+        payload: Dict,
+        operation: str = "API調用",
+        priority: Optional[str] = None,
+        hedge_kind: Optional[str] = None,
+        structured: Optional[StructuredSchema] = None
+    ) -> Dict:
+        """
+        調用Qwen API並支持重試機制
+        priority: 排程優先權，未指定時使用 llm_request_context 的設定
+        hedge_kind: 對沖請求的呼叫類別（用於統計該類呼叫的p95），只用於短呼叫
+        structured: 回應的JSON Schema；伺服器支援時以限制解碼產生，回傳結果的 structured_mode 為實際使用的方式
+        """
         last_exception = None
+        # 回應上限不超過上下文長度扣除實際輸入token數
+        payload = {**payload, "max_tokens": token_budget.fit_max_tokens(payload["messages"], payload["max_tokens"])}
         
         for attempt in range(self.max_retries + 1):
             try:
@@ -243,7 +453,7 @@ class QwenAPIService:
                 if attempt > 0:
                     logger.info(f"{operation} - 重試第 {attempt} 次")
                 
-                result = await self._call_qwen_api(payload)
+                result = await self._call_qwen_api_structured(payload, priority, hedge_kind, structured)
                 
                 if result.get('success', False):
                     if attempt > 0:
@@ -283,8 +493,38 @@ class QwenAPIService:
         logger.error(f"{operation} - 最終失敗，已達最大重試次數: {last_exception}")
         return {"success": False, "error": str(last_exception)}
 
-    async def _call_qwen_api(self, payload: Dict) -> Dict:
-        """調用Qwen API - 基礎方法"""
+    async def _call_qwen_api_structured(
+        self,
+        payload: Dict,
+        priority: Optional[str],
+        hedge_kind: Optional[str],
+        structured: Optional[StructuredSchema]
+    ) -> Dict:
+        """
+        附上JSON Schema呼叫；伺服器以400/422拒絕時立即改用下一種方式（最後為不附Schema）重送，
+        重送成功才將被拒絕的方式標記為不支援（請求本身有誤時不影響偵測結果）
+        """
+        rejected: Dict[str, str] = {}
+        while True:
+            request_payload, mode = self.structured_output.apply(payload, structured, skip=rejected)
+            result = await self._call_qwen_api(request_payload, priority, hedge_kind)
+            status = result.get('status')
+            if mode is not None and status in (400, 422):
+                logger.info(f"Qwen伺服器拒絕結構化輸出方式 {mode}（HTTP {status}），改用其他方式重送")
+                rejected[mode] = result.get('error', '')
+                continue
+            if status not in (400, 422):
+                for rejected_mode, reason in rejected.items():
+                    self.structured_output.mark_unsupported(rejected_mode, reason)
+            result['structured_mode'] = mode
+            return result
+
+    async def _call_qwen_api(self, payload: Dict, priority: Optional[str] = None, hedge_kind: Optional[str] = None) -> Dict:
+        """
+        調用Qwen API - 基礎方法（經由優先權排程與自適應並行上限，依回應狀態與延遲調整上限）
+        端點由端點池依最少進行中請求選定；指定 hedge_kind 且啟用對沖時，超過該類呼叫p95未回應會送一份到另一端點
+        （對沖請求與原請求共用同一個排程名額）
+        """
         self.total_api_calls += 1
         
         try:
@@ -294,48 +534,19 @@ class QwenAPIService:
             # 記錄請求詳情（僅在DEBUG模式）
             logger.debug(f"發送Qwen API請求，payload大小: {len(str(payload))} 字符")
             
-            async with self.session.post(
-                f"{self.api_url}/v1/chat/completions",
-                json=payload,
-                headers={'Content-Type': 'application/json'}
-            ) as response:
-                
-                if response.status == 200:
-                    data = await response.json()
-                    self.successful_calls += 1
-                    
-                    if 'choices' in data and len(data['choices']) > 0:
-                        content = data['choices'][0]['message']['content']
-                        usage = data.get('usage', {})
-                        
-                        # 記錄使用情況（僅在DEBUG模式）
-                        logger.debug(f"API調用成功，使用token: {usage.get('total_tokens', 'N/A')}")
-                        
-                        return {
-                            "success": True,
-                            "content": content,
-                            "usage": usage
-                        }
-                    else:
-                        logger.error(f"API回應格式異常: {data}")
-                        return {"success": False, "error": "Invalid response format"}
-                        
-                elif response.status == 429:
-                    # 限流錯誤，特殊處理
-                    error_text = await response.text()
-                    logger.warning("API限流，請求過於頻繁")
-                    return {"success": False, "error": f"Rate limit exceeded: {error_text}"}
-                    
-                elif response.status >= 500:
-                    # 服務器錯誤
-                    error_text = await response.text()
-                    logger.error(f"服務器錯誤 - Status: {response.status}")
-                    return {"success": False, "error": f"Server error {response.status}: {error_text}"}
-                    
-                else:
-                    error_text = await response.text()
-                    logger.error(f"API請求失敗 - Status: {response.status}, Error: {error_text}")
-                    return {"success": False, "error": f"HTTP {response.status}: {error_text}"}
+            async with self.scheduler.slot(priority) as ticket:
+                try:
+                    return await self.endpoint_pool.run(
+                        lambda lease: self._post_chat_completion(lease, payload, ticket),
+                        hedge_kind=hedge_kind,
+                        accept=lambda result: result.get('success', False)
+                    )
+                except asyncio.TimeoutError:
+                    ticket.overloaded('timeout')
+                    raise
+                except aiohttp.ClientError:
+                    ticket.overloaded('connection')
+                    raise
                     
         except asyncio.TimeoutError:
             logger.error("API請求超時")
@@ -347,10 +558,64 @@ class QwenAPIService:
             logger.error(f"API調用異常: {e}")
             raise
 
+    async def _post_chat_completion(self, lease: EndpointLease, payload: Dict, ticket: LimiterTicket) -> Dict:
+        """向端點池選定的端點送出一次請求，並向端點池（端點健康）與自適應並行上限（負載）回報結果"""
+        async with self.session.post(
+            f"{lease.url}/v1/chat/completions",
+            json=payload,
+            headers={'Content-Type': 'application/json'}
+        ) as response:
+            
+            if response.status == 200:
+                data = await response.json()
+                self.successful_calls += 1
+                lease.succeeded()
+                
+                if 'choices' in data and len(data['choices']) > 0:
+                    content = data['choices'][0]['message']['content']
+                    usage = data.get('usage', {})
+                    ticket.succeeded(usage.get('completion_tokens'))
+                    
+                    # 記錄使用情況（僅在DEBUG模式）
+                    logger.debug(f"API調用成功（{lease.url}），使用token: {usage.get('total_tokens', 'N/A')}")
+                    
+                    return {
+                        "success": True,
+                        "content": content,
+                        "usage": usage
+                    }
+                else:
+                    ticket.ignored()
+                    logger.error(f"API回應格式異常: {data}")
+                    return {"success": False, "error": "Invalid response format"}
+                    
+            elif response.status == 429:
+                # 限流錯誤，特殊處理
+                ticket.overloaded('429')
+                lease.failed('429')
+                error_text = await response.text()
+                logger.warning(f"API限流，請求過於頻繁（{lease.url}）")
+                return {"success": False, "status": response.status, "error": f"Rate limit exceeded: {error_text}"}
+                
+            elif response.status >= 500:
+                # 服務器錯誤
+                ticket.overloaded('5xx')
+                lease.failed('5xx')
+                error_text = await response.text()
+                logger.error(f"服務器錯誤 - Status: {response.status}（{lease.url}）")
+                return {"success": False, "status": response.status, "error": f"Server error {response.status}: {error_text}"}
+                
+            else:
+                ticket.ignored()
+                lease.ignored()
+                error_text = await response.text()
+                logger.error(f"API請求失敗 - Status: {response.status}, Error: {error_text}")
+                return {"success": False, "status": response.status, "error": f"HTTP {response.status}: {error_text}"}
+
     async def generate_keywords_with_synonyms(self, description: str, num_keywords: int = 3, num_synonyms: int = 5) -> Dict:
         try:
             # 限制描述長度
-            description = self._truncate_text(description, 1500)
+            description = self._truncate_text(description, settings.QWEN_KEYWORD_DESCRIPTION_TOKENS)
             prompt = self._build_keyword_synonyms_generation_prompt(description, num_keywords, num_synonyms)
 
             payload = {
@@ -379,11 +644,16 @@ class QwenAPIService:
             }
 
             # 使用帶重試的API調用
-            result = await self._call_qwen_api_with_retry(payload, operation="關鍵字和同義詞生成")
+            result = await self._call_qwen_api_with_retry(
+                payload, operation="關鍵字和同義詞生成", priority=PRIORITY_INTERACTIVE, hedge_kind="keywords_synonyms",
+                structured=keywords_with_synonyms_schema(num_keywords, num_synonyms)
+            )
 
             if result.get('success', False):
                 parsed_data = self._parse_json_response(result['content'])
-                if parsed_data and 'keywords_with_synonyms' in parsed_data:
+                parsed_ok = bool(parsed_data) and 'keywords_with_synonyms' in parsed_data
+                self.structured_output.record_parse('keywords_with_synonyms', result.get('structured_mode'), parsed_ok)
+                if parsed_ok:
                     keywords_data = parsed_data['keywords_with_synonyms'][:num_keywords]
                     # 驗證和清理數據
                     validated_data = self._validate_keywords_with_synonyms(keywords_data, description)
@@ -481,20 +751,13 @@ class QwenAPIService:
 
     def _prepare_patent_text_for_processing(self, title: str, abstract: str, claims: str) -> str:
         """準備專利文本用於處理，智能限制長度以避免超時"""
-        # 清理和截斷文本
-        title = self._clean_text(title or "")[:200]
-        abstract = self._clean_text(abstract or "")[:1000]
-        claims = self._clean_text(claims or "")[:800]
+        # 清理並依token上限截斷
+        title = token_budget.truncate(self._clean_text(title or ""), settings.QWEN_FEATURE_TITLE_TOKENS)
+        abstract = token_budget.truncate(self._clean_text(abstract or ""), settings.QWEN_FEATURE_ABSTRACT_TOKENS)
+        claims = token_budget.truncate(self._clean_text(claims or ""), settings.QWEN_FEATURE_CLAIMS_TOKENS)
         
         # 組合文本
-        combined = f"{title} {abstract} {claims}".strip()
-        
-        # 最終長度限制（確保不會超過API限制）
-        if len(combined) > 2000:
-            combined = combined[:2000]
-            logger.debug("專利文本已截斷以避免超時")
-        
-        return combined
+        return f"{title} {abstract} {claims}".strip()
 
     def _clean_text(self, text: str) -> str:
         """清理文本，移除多餘空白和特殊字符"""
@@ -508,20 +771,9 @@ class QwenAPIService:
         
         return text.strip()
 
-    def _truncate_text(self, text: str, max_length: int) -> str:
-        """智能截斷文本，保持語義完整性"""
-        if len(text) <= max_length:
-            return text
-        
-        # 嘗試在句號、逗號或空格處截斷
-        truncated = text[:max_length]
-        for delimiter in ['.', '。', ',', '，', ' ']:
-            last_pos = truncated.rfind(delimiter)
-            if last_pos > max_length * 0.8:  # 只要保留80%以上內容就可以
-                return text[:last_pos + 1]
-        
-        # 如果找不到合適的截斷點，直接截斷
-        return text[:max_length]
+    def _truncate_text(self, text: str, max_tokens: int) -> str:
+        """依token數截斷文本，盡量在句號、逗號或空格處截斷以保持語義完整性"""
+        return token_budget.truncate(text, max_tokens)
 
     def _build_keyword_synonyms_generation_prompt(self, description: str, num_keywords: int, num_synonyms: int) -> str:
         """構建關鍵字和同義詞生成的prompt"""
@@ -688,6 +940,42 @@ class QwenAPIService:
 5. 確保返回有效的JSON格式
 """
 
+    def keyword_prompt_version(self) -> str:
+        """
+        關鍵字/同義詞提示詞的版本指紋（兩種提示詞模板、生成參數與手動版本號的雜湊）
+        系統提示詞寫在各生成方法內，修改時需遞增 KEYWORD_CACHE_PROMPT_VERSION
+        """
+        payload = json.dumps([
+            settings.KEYWORD_CACHE_PROMPT_VERSION,
+            self._build_keyword_generation_prompt('{description}', 0),
+            self._build_keyword_synonyms_generation_prompt('{description}', 0, 0),
+            self.max_tokens_keywords,
+            settings.QWEN_KEYWORD_DESCRIPTION_TOKENS,
+            settings.QWEN_STRUCTURED_OUTPUT,
+            keywords_schema(1).schema,
+            keywords_with_synonyms_schema(1, 1).schema
+        ], ensure_ascii=False)
+        return f"{settings.KEYWORD_CACHE_PROMPT_VERSION}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]}"
+
+    def tech_features_prompt_version(self) -> str:
+        """
+        技術特徵提示詞的版本指紋（單筆與批次模板、系統提示詞、生成參數與手動版本號的雜湊）
+        任何一項變更都會產生新版本，使舊的技術特徵快取失效
+        """
+        template = self._build_tech_features_prompt_optimized('{title}', '{abstract}', '{claims}')
+        batch_template = self._build_tech_features_batch_prompt([('{title}', '{abstract}', '{claims}')])
+        payload = json.dumps([
+            settings.TECH_FEATURE_PROMPT_VERSION,
+            self.TECH_FEATURES_SYSTEM_PROMPT,
+            template,
+            batch_template,
+            self.max_tokens_features,
+            [settings.QWEN_FEATURE_TITLE_TOKENS, settings.QWEN_FEATURE_ABSTRACT_TOKENS, settings.QWEN_FEATURE_CLAIMS_TOKENS],
+            settings.QWEN_STRUCTURED_OUTPUT,
+            tech_features_schema().schema
+        ], ensure_ascii=False)
+        return f"{settings.TECH_FEATURE_PROMPT_VERSION}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]}"
+
     def _build_tech_features_prompt_optimized(self, title: str, abstract: str, claims: str) -> str:
         """構建技術特徵和功效提取提示詞 - 移除信心度"""
         return f"""
@@ -717,6 +1005,34 @@ class QwenAPIService:
 3. 每項特徵和功效要簡潔明確，每項20-50字
 4. 基於實際專利內容提取，不要編造
 5. 每類最多3項，確保質量
+"""
+
+    def _build_tech_features_batch_prompt(self, items: List[Tuple[str, str, str]]) -> str:
+        """構建多筆專利的技術特徵和功效提取提示詞（要求與單筆提示詞相同）"""
+        patents_text = "\n".join(
+            f"【專利{index}】\n專利標題：{title}\n專利摘要：{abstract}\n專利範圍：{claims}\n"
+            for index, (title, abstract, claims) in enumerate(items, 1)
+        )
+        return f"""
+請分別分析以下 {len(items)} 筆專利內容，提取每筆專利的技術特徵和技術功效。
+
+{patents_text}
+請按照以下JSON陣列格式回答，每筆專利一個物件，index為專利編號，只返回JSON：
+[
+    {{
+        "index": 1,
+        "technical_features": ["特徵1：具體的技術組成或創新點", "特徵2：核心技術機制或結構"],
+        "technical_effects": ["功效1：具體的技術效果或優勢", "功效2：性能提升或問題解決"]
+    }}
+]
+
+要求：
+1. 技術特徵：專利的核心技術組成、創新點、技術機制
+2. 技術功效：專利能達到的具體效果、性能提升、解決的問題
+3. 每項特徵和功效要簡潔明確，每項20-50字
+4. 基於各專利實際內容提取，不要編造，不同專利的內容不可混用
+5. 每筆專利每類最多3項，確保質量
+6. 必須涵蓋全部 {len(items)} 筆專利
 """
 
     def _parse_json_response(self, response_text: str) -> Optional[Dict]:
@@ -895,6 +1211,17 @@ class QwenAPIService:
                 "max_retries": self.max_retries,
                 "max_tokens_keywords": self.max_tokens_keywords,
                 "max_tokens_features": self.max_tokens_features
+            },
+            "adaptive_concurrency": self.concurrency_limiter.get_stats(),
+            "llm_scheduler": self.scheduler.get_stats(),
+            "endpoint_pool": self.endpoint_pool.get_stats(),
+            "structured_output": self.structured_output.get_stats(),
+            "token_budget": token_budget.get_stats(),
+            "feature_batching": {
+                "enabled": settings.QWEN_BATCH_FEATURES_ENABLED,
+                "batch_calls": self.batch_calls,
+                "batched_patents": self.batched_patents,
+                "item_fallbacks": self.batch_item_fallbacks
             }
         }
 
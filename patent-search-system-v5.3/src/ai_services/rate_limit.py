@@ -0,0 +1,255 @@
+# src/ai_services/rate_limit.py - 外部API限流與熔斷
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """預估等待時間超過上限，直接拒絕請求"""
+    pass
+
+
+class CircuitOpenError(Exception):
+    """熔斷器開啟中，快速失敗"""
+    pass
+
+
+class TokenBucket:
+    """
+    權杖桶限流器
+    採預約制：取得權杖時先扣除（可為負數）再睡到輪到自己，確保先到先服務
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.waiting = 0
+        self.total_acquired = 0
+        self.total_wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> float:
+        """預約一個權杖，回傳需等待的秒數"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if max_wait is not None and wait > max_wait:
+            raise RateLimitExceeded(f"預估等待 {wait:.1f} 秒超過上限 {max_wait:.1f} 秒")
+        self.tokens -= 1
+        self.total_acquired += 1
+        self.total_wait_seconds += wait
+        return wait
+
+    def release(self):
+        """歸還未使用的預約權杖"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.waiting == 0 and self.tokens >= self.capacity
+
+    def get_stats(self) -> Dict:
+        return {
+            'rate_per_second': self.rate,
+            'capacity': self.capacity,
+            'available_tokens': round(max(self.tokens, 0.0), 2),
+            'queue_depth': self.waiting,
+            'total_acquired': self.total_acquired,
+            'avg_wait_ms': round(self.total_wait_seconds / self.total_acquired * 1000, 1) if self.total_acquired else 0
+        }
+
+
+class KeyedRateLimiter:
+    """全域權杖桶 + 每個用戶代碼各自的權杖桶（同一行程內共用）"""
+
+    # 閒置的用戶權杖桶超過此數量時清理
+    MAX_IDLE_KEYS = 256
+
+    def __init__(
+        self,
+        global_rate: Optional[float] = None,
+        global_burst: Optional[float] = None,
+        per_key_rate: Optional[float] = None,
+        per_key_burst: Optional[float] = None,
+        max_wait: Optional[float] = None
+    ):
+        self.global_bucket = TokenBucket(
+            global_rate or settings.GPSS_RATE_LIMIT_GLOBAL_RPS,
+            global_burst or settings.GPSS_RATE_LIMIT_GLOBAL_BURST
+        )
+        self.per_key_rate = per_key_rate or settings.GPSS_RATE_LIMIT_PER_USER_RPS
+        self.per_key_burst = per_key_burst or settings.GPSS_RATE_LIMIT_PER_USER_BURST
+        self.max_wait = max_wait if max_wait is not None else settings.GPSS_RATE_LIMIT_MAX_WAIT
+        self.key_buckets: Dict[str, TokenBucket] = {}
+        self.rejected = 0
+
+    @staticmethod
+    def _key_for(user_code: str) -> str:
+        # 不以明文保存驗證碼
+        return hashlib.sha256(user_code.encode('utf-8')).hexdigest()[:16]
+
+    def _get_key_bucket(self, user_code: Optional[str]) -> Optional[TokenBucket]:
+        if not user_code:
+            return None
+        key = self._key_for(user_code)
+        bucket = self.key_buckets.get(key)
+        if bucket is None:
+            if len(self.key_buckets) >= self.MAX_IDLE_KEYS:
+                self._prune_idle()
+            bucket = TokenBucket(self.per_key_rate, self.per_key_burst)
+            self.key_buckets[key] = bucket
+        return bucket
+
+    def _prune_idle(self):
+        for key in [key for key, bucket in self.key_buckets.items() if bucket.is_idle()]:
+            del self.key_buckets[key]
+
+    async def acquire(self, user_code: Optional[str] = None):
+        """取得發送請求的權杖（用戶與全域皆需取得）"""
+        key_bucket = self._get_key_bucket(user_code)
+        try:
+            key_wait = key_bucket.reserve(self.max_wait) if key_bucket else 0.0
+            try:
+                global_wait = self.global_bucket.reserve(self.max_wait)
+            except RateLimitExceeded:
+                if key_bucket:
+                    key_bucket.release()
+                raise
+        except RateLimitExceeded:
+            self.rejected += 1
+            raise
+
+        wait = max(key_wait, global_wait)
+        if wait <= 0:
+            return
+
+        buckets = [bucket for bucket in (key_bucket, self.global_bucket) if bucket]
+        for bucket in buckets:
+            bucket.waiting += 1
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            for bucket in buckets:
+                bucket.waiting -= 1
+
+    def get_stats(self) -> Dict:
+        return {
+            'global': self.global_bucket.get_stats(),
+            'per_user_rate_per_second': self.per_key_rate,
+            'per_user_burst': self.per_key_burst,
+            'tracked_users': len(self.key_buckets),
+            'per_user_queue_depth': sum(bucket.waiting for bucket in self.key_buckets.values()),
+            'max_wait_seconds': self.max_wait,
+            'rejected': self.rejected
+        }
+
+
+class CircuitBreaker:
+    """
+    熔斷器（closed / open / half_open）
+    - closed: 正常放行，連續失敗達門檻後開啟
+    - open: 直接拒絕，經過冷卻時間後進入半開
+    - half_open: 只放行少量試探請求，成功則關閉，失敗則重新開啟
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.GPSS_CIRCUIT_FAILURE_THRESHOLD
+        self.recovery_timeout = recovery_timeout or settings.GPSS_CIRCUIT_RECOVERY_SECONDS
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_in_flight = 0
+
+        self.total_failures = 0
+        self.total_rejections = 0
+        self.times_opened = 0
+        self.last_failure: Optional[str] = None
+
+    def before_request(self):
+        """請求前檢查，熔斷中直接拋出CircuitOpenError"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self.half_open_in_flight = 0
+                logger.info(f"🔌 {self.name} 熔斷器進入半開狀態，放行試探請求")
+            else:
+                self.total_rejections += 1
+                retry_after = self.recovery_timeout - (time.monotonic() - self.opened_at)
+                raise CircuitOpenError(f"{self.name}服務暫時無法使用（熔斷中），約 {retry_after:.0f} 秒後重試")
+
+        if self.state == self.HALF_OPEN:
+            if self.half_open_in_flight >= self.half_open_max_calls:
+                self.total_rejections += 1
+                raise CircuitOpenError(f"{self.name}服務恢復檢測中，請稍後再試")
+            self.half_open_in_flight += 1
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            logger.info(f"✅ {self.name} 熔斷器已關閉，服務恢復")
+            self.half_open_in_flight = 0
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self, reason: str = ""):
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.last_failure = reason or None
+
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"⛔ {self.name} 熔斷器開啟（連續失敗 {self.consecutive_failures} 次）: {reason}")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.half_open_in_flight = 0
+
+    def release_trial(self):
+        """半開狀態的試探請求未產生結果（如被取消）時釋放名額"""
+        if self.state == self.HALF_OPEN and self.half_open_in_flight > 0:
+            self.half_open_in_flight -= 1
+
+    def get_stats(self) -> Dict:
+        retry_after = None
+        if self.state == self.OPEN and self.opened_at is not None:
+            retry_after = max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_threshold': self.failure_threshold,
+            'recovery_timeout_seconds': self.recovery_timeout,
+            'retry_after_seconds': round(retry_after, 1) if retry_after is not None else None,
+            'times_opened': self.times_opened,
+            'total_failures': self.total_failures,
+            'total_rejections': self.total_rejections,
+            'last_failure': self.last_failure
+        }
+
+
+# GPSS共用的限流器與熔斷器（同一行程內所有GPSSAPIService實例共用）
+gpss_rate_limiter = KeyedRateLimiter()
+gpss_circuit_breaker = CircuitBreaker("GPSS")
@@ -0,0 +1,67 @@
+# src/ai_services/single_flight.py - 相同請求合併執行（single-flight）
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    相同鍵值的並行呼叫只執行一次
+    第一個呼叫者建立共用任務，其餘呼叫者等待同一個結果（包含例外）
+    共用任務與個別呼叫者的取消互不影響
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+        self.total_calls = 0
+        self.executions = 0
+        self.coalesced_calls = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """執行func，若相同key已在執行中則等待其結果"""
+        self.total_calls += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        else:
+            self.coalesced_calls += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            logger.info(f"🔗 {self.name} 合併相同請求: {key[:12]}（等待數 {self._waiters[key]}）")
+
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # 避免無人等待時出現 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight_count(self) -> int:
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict:
+        """統計資訊（含各鍵目前的等待數）"""
+        return {
+            'in_flight': len(self._inflight),
+            'waiters_by_key': {key[:12]: count for key, count in self._waiters.items()},
+            'total_calls': self.total_calls,
+            'executions': self.executions,
+            'coalesced_calls': self.coalesced_calls
+        }
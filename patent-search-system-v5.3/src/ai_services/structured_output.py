@@ -0,0 +1,197 @@
+# src/ai_services/structured_output.py - Qwen結構化輸出（JSON Schema限制解碼）與伺服器支援偵測
+
+import copy
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 與提示詞要求一致的長度上限（關鍵字2-20字、特徵/功效每項20-50字，另留前綴「特徵1：」等空間）
+KEYWORD_MAX_CHARS = 20
+SYNONYM_MAX_CHARS = 40
+FEATURE_MAX_CHARS = 80
+FEATURE_MAX_ITEMS = 3
+
+
+class StructuredSchema:
+    """一種結構化回應：名稱、JSON Schema，以及依Schema估算的回應token上限"""
+
+    __slots__ = ('name', 'schema', 'max_tokens')
+
+    def __init__(self, name: str, schema: Dict):
+        self.name = name
+        self.schema = schema
+        self.max_tokens = estimate_json_tokens(schema)
+
+
+def _string(max_chars: int) -> Dict:
+    return {"type": "string", "minLength": 1, "maxLength": max_chars}
+
+
+def _array(items: Dict, min_items: int, max_items: int) -> Dict:
+    return {"type": "array", "items": items, "minItems": min_items, "maxItems": max_items}
+
+
+def _object(properties: Dict) -> Dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def keywords_schema(num_keywords: int) -> StructuredSchema:
+    return StructuredSchema('keywords', _object({
+        "keywords": _array(_string(KEYWORD_MAX_CHARS), num_keywords, num_keywords)
+    }))
+
+
+def keywords_with_synonyms_schema(num_keywords: int, num_synonyms: int) -> StructuredSchema:
+    item = _object({
+        "keyword": _string(KEYWORD_MAX_CHARS),
+        "synonyms": _array(_string(SYNONYM_MAX_CHARS), num_synonyms, num_synonyms)
+    })
+    return StructuredSchema('keywords_with_synonyms', _object({
+        "keywords_with_synonyms": _array(item, num_keywords, num_keywords)
+    }))
+
+
+def _feature_properties() -> Dict:
+    return {
+        "technical_features": _array(_string(FEATURE_MAX_CHARS), 1, FEATURE_MAX_ITEMS),
+        "technical_effects": _array(_string(FEATURE_MAX_CHARS), 1, FEATURE_MAX_ITEMS)
+    }
+
+
+def tech_features_schema() -> StructuredSchema:
+    return StructuredSchema('tech_features', _object(_feature_properties()))
+
+
+def tech_features_batch_schema(count: int) -> StructuredSchema:
+    item = _object({
+        "index": {"type": "integer", "minimum": 1, "maximum": count},
+        **_feature_properties()
+    })
+    return StructuredSchema('tech_features_batch', _array(item, count, count))
+
+
+def estimate_json_tokens(schema: Dict) -> int:
+    """
+    符合Schema的最長回應token數上限（字串每字至多1個token，另計引號、鍵名與標點）
+    只支援本模組產生的Schema（object / array / string / integer）
+    """
+    schema_type = schema.get('type')
+    if schema_type == 'object':
+        return 2 + sum(
+            len(key) // 3 + 4 + estimate_json_tokens(value)
+            for key, value in schema['properties'].items()
+        )
+    if schema_type == 'array':
+        return 2 + schema['maxItems'] * (estimate_json_tokens(schema['items']) + 1)
+    if schema_type == 'string':
+        return schema['maxLength'] + 2
+    return 4
+
+
+class StructuredOutputSupport:
+    """
+    為結構化呼叫附加JSON Schema（限制解碼後不會產生不合法的JSON或多餘文字），並偵測伺服器支援的方式
+    - response_format：OpenAI相容的 {"type": "json_schema", ...}（vLLM、SGLang等）
+    - guided_json：vLLM舊版的額外參數
+    mode 為 auto 時依序嘗試上述兩種；伺服器以400/422拒絕、而改用下一種方式（或不附Schema）成功時，
+    將該方式標記為不支援，之後的請求不再使用
+    使用Schema時 max_tokens 收緊至Schema允許的最長回應（乘上 token_slack）
+    另分別統計有無Schema限制的回應解析失敗率
+    """
+
+    MODES = ('response_format', 'guided_json')
+
+    def __init__(self, mode: Optional[str] = None, token_slack: Optional[float] = None):
+        self.mode = (mode or settings.QWEN_STRUCTURED_OUTPUT).lower()
+        if self.mode not in ('auto', 'off') + self.MODES:
+            logger.warning(f"⚠️ 未知的結構化輸出設定 {self.mode}，改用 auto")
+            self.mode = 'auto'
+        self.token_slack = token_slack or settings.QWEN_STRUCTURED_TOKEN_SLACK
+        self.unsupported: Dict[str, str] = {}
+        self.max_tokens_saved = 0
+        self._parse: Dict[str, Dict[str, List[int]]] = {}
+
+    def candidate_modes(self, skip: Iterable[str] = ()) -> List[str]:
+        if self.mode == 'off':
+            return []
+        modes = self.MODES if self.mode == 'auto' else (self.mode,)
+        skipped = set(skip)
+        return [mode for mode in modes if mode not in self.unsupported and mode not in skipped]
+
+    def apply(
+        self,
+        payload: Dict,
+        structured: Optional[StructuredSchema],
+        skip: Iterable[str] = ()
+    ) -> Tuple[Dict, Optional[str]]:
+        """回傳（實際送出的payload, 使用的方式）；不使用Schema時方式為None"""
+        if structured is None:
+            return payload, None
+        modes = self.candidate_modes(skip)
+        if not modes:
+            return payload, None
+
+        mode = modes[0]
+        request_payload = dict(payload)
+        schema = copy.deepcopy(structured.schema)
+        if mode == 'response_format':
+            request_payload['response_format'] = {
+                "type": "json_schema",
+                "json_schema": {"name": structured.name, "schema": schema, "strict": True}
+            }
+        else:
+            request_payload['guided_json'] = schema
+
+        bound = int(structured.max_tokens * self.token_slack)
+        if bound < request_payload.get('max_tokens', bound + 1):
+            self.max_tokens_saved += request_payload['max_tokens'] - bound
+            request_payload['max_tokens'] = bound
+        return request_payload, mode
+
+    def mark_unsupported(self, mode: str, reason: str):
+        if mode not in self.unsupported:
+            self.unsupported[mode] = reason[:200]
+            logger.warning(f"⚠️ Qwen伺服器不支援結構化輸出方式 {mode}，之後不再使用: {reason[:200]}")
+
+    def record_parse(self, name: str, mode: Optional[str], ok: bool):
+        """記錄一次回應解析結果（依有無Schema限制分開統計）"""
+        key = 'constrained' if mode else 'unconstrained'
+        counts = self._parse.setdefault(name, {}).setdefault(key, [0, 0])
+        counts[0] += 1
+        counts[1] += int(not ok)
+
+    @staticmethod
+    def _rate(counts: List[int]) -> Dict:
+        calls, failures = counts
+        return {
+            'calls': calls,
+            'failures': failures,
+            'failure_rate': f"{(failures / calls * 100) if calls else 0:.1f}%"
+        }
+
+    def get_stats(self) -> Dict:
+        totals = {'constrained': [0, 0], 'unconstrained': [0, 0]}
+        by_schema = {}
+        for name, kinds in self._parse.items():
+            by_schema[name] = {key: self._rate(counts) for key, counts in kinds.items()}
+            for key, counts in kinds.items():
+                totals[key][0] += counts[0]
+                totals[key][1] += counts[1]
+        return {
+            'mode': self.mode,
+            'active_modes': self.candidate_modes(),
+            'unsupported_modes': dict(self.unsupported),
+            'token_slack': self.token_slack,
+            'max_tokens_saved': self.max_tokens_saved,
+            # unconstrained 為未附Schema（或伺服器不支援時）的解析失敗率，constrained 為附Schema後
+            'parse_failures': {key: self._rate(counts) for key, counts in totals.items()},
+            'parse_failures_by_schema': by_schema
+        }
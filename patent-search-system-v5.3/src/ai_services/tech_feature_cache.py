@@ -0,0 +1,159 @@
+# src/ai_services/tech_feature_cache.py - Qwen技術特徵/功效快取
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class TechFeatureCache:
+    """
+    Qwen技術特徵/功效的讀穿式快取
+    - 第一層：行程內LRU
+    - 第二層：資料庫（tech_feature_cache表），跨使用者、跨請求、跨worker共用
+    快取鍵為 SHA256(標題, 摘要, 權利要求, 提示詞版本, 模型名稱)，
+    提示詞模板或模型變更後自然不再命中；只快取Qwen實際生成的結果，不快取fallback。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        prompt_version: str,
+        max_memory_entries: Optional[int] = None,
+        ttl_days: Optional[int] = None,
+        persistent: bool = True
+    ):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.max_memory_entries = max_memory_entries or settings.TECH_FEATURE_CACHE_MEMORY_SIZE
+        self.ttl_days = ttl_days or settings.TECH_FEATURE_CACHE_TTL_DAYS
+        self.persistent = persistent
+        self._memory: "OrderedDict[str, Tuple[float, List[str], List[str]]]" = OrderedDict()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bulk_lookups = 0
+
+    def build_key(self, patent_data: Dict) -> str:
+        payload = json.dumps([
+            (patent_data.get('title') or '').strip(),
+            (patent_data.get('abstract') or '').strip(),
+            (patent_data.get('claims') or '').strip(),
+            self.prompt_version,
+            self.model_name
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def purge_stale_versions(self):
+        """刪除其他提示詞版本或模型的快取資料"""
+        if not self.persistent:
+            return
+        removed = await DatabaseManager.purge_stale_tech_feature_cache(self.prompt_version, self.model_name)
+        if removed:
+            logger.info(f"🧹 已刪除 {removed} 筆舊版技術特徵快取（目前版本 {self.prompt_version}）")
+
+    async def get(self, patent_data: Dict) -> Optional[Dict]:
+        """讀取單筆專利的快取結果"""
+        results = await self.get_many([patent_data])
+        return results.get(0)
+
+    async def get_many(self, patents_data: List[Dict]) -> Dict[int, Dict]:
+        """
+        批次讀取整個結果集：先查記憶體，未命中的鍵以一次資料庫查詢取得
+        回傳 {在輸入列表中的索引: 快取結果}
+        """
+        now = time.time()
+        found: Dict[int, Dict] = {}
+        missing: Dict[str, List[int]] = {}
+
+        for index, patent_data in enumerate(patents_data):
+            cache_key = self.build_key(patent_data)
+            entry = self._memory.get(cache_key)
+            if entry is not None:
+                expires_at, features, effects = entry
+                if expires_at > now:
+                    self._memory.move_to_end(cache_key)
+                    self.memory_hits += 1
+                    found[index] = self._to_result(features, effects)
+                    continue
+                del self._memory[cache_key]
+            missing.setdefault(cache_key, []).append(index)
+
+        if missing and self.persistent:
+            if len(patents_data) > 1:
+                self.bulk_lookups += 1
+            cached = await DatabaseManager.get_tech_feature_cache_bulk(list(missing))
+            for cache_key, (features, effects, expires_at) in cached.items():
+                remaining = (expires_at - datetime.utcnow()).total_seconds()
+                self._put_memory(cache_key, features, effects, now + remaining)
+                for index in missing.pop(cache_key):
+                    self.persistent_hits += 1
+                    found[index] = self._to_result(features, effects)
+
+        self.misses += sum(len(indexes) for indexes in missing.values())
+        return found
+
+    async def set(self, patent_data: Dict, result: Dict):
+        """寫入Qwen生成的結果（fallback結果不寫入）"""
+        if result.get('source') != 'qwen_api':
+            return
+
+        cache_key = self.build_key(patent_data)
+        features = list(result.get('technical_features', []))
+        effects = list(result.get('technical_effects', []))
+        self._put_memory(cache_key, features, effects, time.time() + self.ttl_days * 86400)
+        self.stores += 1
+
+        if self.persistent:
+            await DatabaseManager.save_tech_feature_cache(
+                cache_key=cache_key,
+                prompt_version=self.prompt_version,
+                model_name=self.model_name,
+                technical_features=features,
+                technical_effects=effects,
+                ttl_days=self.ttl_days
+            )
+
+    @staticmethod
+    def _to_result(features: List[str], effects: List[str]) -> Dict:
+        return {
+            "technical_features": list(features),
+            "technical_effects": list(effects),
+            "source": "qwen_cache"
+        }
+
+    def _put_memory(self, cache_key: str, features: List[str], effects: List[str], expires_at: float):
+        self._memory[cache_key] = (expires_at, features, effects)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        hit_rate = (hits / lookups * 100) if lookups > 0 else 0
+
+        return {
+            'model_name': self.model_name,
+            'prompt_version': self.prompt_version,
+            'memory_entries': len(self._memory),
+            'max_memory_entries': self.max_memory_entries,
+            'ttl_days': self.ttl_days,
+            'persistent': self.persistent,
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': f"{hit_rate:.1f}%",
+            'stores': self.stores,
+            'bulk_lookups': self.bulk_lookups
+        }
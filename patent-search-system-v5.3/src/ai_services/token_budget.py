@@ -0,0 +1,224 @@
+# src/ai_services/token_budget.py - 以Qwen分詞器計算token數（截斷、對話歷史修剪、max_tokens）
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.config import settings
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # 未安裝時退回粗估
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+TRUNCATE_DELIMITERS = ('。', '.', '；', ';', '，', ',', ' ')
+
+
+def estimate_tokens_heuristic(text: str) -> int:
+    """粗估token數：中日韓文字約每字1個token，其他字元約每4字1個token"""
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _is_cjk(char: str) -> bool:
+    return '\u3000' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uff00' <= char <= '\uffef'
+
+
+class TokenBudget:
+    """
+    所有提示詞token計算的單一入口
+    - 啟動時載入一次Qwen分詞器（QWEN_TOKENIZER_PATH 的 tokenizer.json，或 QWEN_TOKENIZER_NAME 的Hub模型），
+      未安裝 tokenizers 或載入失敗時退回粗估
+    - 重複出現的字串（系統提示詞、專利摘要、對話歷史）的token數以LRU快取
+    - 提供截斷（依token數，盡量在標點處截斷）、訊息列表計數與 max_tokens 上限計算
+    """
+
+    # ChatML每則訊息的額外token：<|im_start|>、角色、換行、<|im_end|>、換行
+    MESSAGE_OVERHEAD = 5
+    # 回應開頭的 <|im_start|>assistant\n
+    REPLY_PRIMING = 3
+    MIN_COMPLETION_TOKENS = 64
+
+    def __init__(
+        self,
+        context_window: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        safety_margin: Optional[int] = None
+    ):
+        self.context_window = context_window or settings.QWEN_CONTEXT_WINDOW
+        self.cache_size = cache_size or settings.TOKEN_COUNT_CACHE_SIZE
+        self.safety_margin = settings.TOKEN_BUDGET_SAFETY_MARGIN if safety_margin is None else safety_margin
+
+        self._tokenizer = None
+        self.tokenizer_source: Optional[str] = None
+        self._load_attempted = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+        self.count_calls = 0
+        self.cache_hits = 0
+        self.encode_calls = 0
+        self.encode_seconds = 0.0
+        self.truncations = 0
+        self.completion_clamps = 0
+
+    @property
+    def backend(self) -> str:
+        return 'tokenizer' if self._tokenizer is not None else 'heuristic'
+
+    # ------------------------------------------------------------------
+    # 載入分詞器
+    # ------------------------------------------------------------------
+    def load(self) -> bool:
+        """同步載入分詞器（只嘗試一次），回傳是否使用實際分詞器"""
+        if self._load_attempted:
+            return self._tokenizer is not None
+        self._load_attempted = True
+
+        if Tokenizer is None:
+            logger.warning("⚠️ 未安裝 tokenizers，token數改以粗估計算")
+            return False
+
+        path = settings.QWEN_TOKENIZER_PATH
+        name = settings.QWEN_TOKENIZER_NAME
+        try:
+            if path:
+                tokenizer, source = Tokenizer.from_file(path), path
+            elif name:
+                tokenizer, source = Tokenizer.from_pretrained(name), name
+            else:
+                logger.info("未設定Qwen分詞器，token數以粗估計算")
+                return False
+        except Exception as e:
+            logger.warning(f"⚠️ Qwen分詞器載入失敗，token數改以粗估計算: {e}")
+            return False
+
+        self._tokenizer = tokenizer
+        self.tokenizer_source = source
+        # 粗估的快取值與實際分詞結果不同，載入後重新計算
+        self._counts.clear()
+        logger.info(f"✅ Qwen分詞器已載入（{source}）")
+        return True
+
+    async def ensure_loaded(self) -> bool:
+        """於服務初始化時呼叫；載入（可能需下載）在執行緒中進行，不阻塞事件迴圈"""
+        if self._load_attempted:
+            return self._tokenizer is not None
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._load_attempted:
+                return self._tokenizer is not None
+            return await asyncio.to_thread(self.load)
+
+    # ------------------------------------------------------------------
+    # 計數
+    # ------------------------------------------------------------------
+    def count(self, text: str) -> int:
+        """單一字串的token數（不含訊息格式的額外token）"""
+        if not text:
+            return 0
+        self.count_calls += 1
+        cached = self._counts.get(text)
+        if cached is not None:
+            self._counts.move_to_end(text)
+            self.cache_hits += 1
+            return cached
+
+        if self._tokenizer is not None:
+            started = time.perf_counter()
+            tokens = len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+            self.encode_calls += 1
+            self.encode_seconds += time.perf_counter() - started
+        else:
+            tokens = estimate_tokens_heuristic(text)
+
+        self._counts[text] = tokens
+        if len(self._counts) > self.cache_size:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        """chat messages 的輸入token數（含ChatML格式與回應開頭）"""
+        return sum(
+            self.count(message.get('content') or '') + self.MESSAGE_OVERHEAD
+            for message in messages
+        ) + self.REPLY_PRIMING
+
+    # ------------------------------------------------------------------
+    # 截斷與上限
+    # ------------------------------------------------------------------
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截斷至不超過 max_tokens 個token；保留80%以上內容時改在最近的標點或空白處截斷"""
+        if max_tokens <= 0:
+            return ''
+        if not text or self.count(text) <= max_tokens:
+            return text
+
+        self.truncations += 1
+        if self._tokenizer is not None:
+            encoding = self._tokenizer.encode(text, add_special_tokens=False)
+            end = encoding.offsets[max_tokens - 1][1]
+        else:
+            end = self._heuristic_cut(text, max_tokens)
+
+        truncated = text[:end]
+        for delimiter in TRUNCATE_DELIMITERS:
+            last_pos = truncated.rfind(delimiter)
+            if last_pos > len(truncated) * 0.8:
+                return truncated[:last_pos + 1]
+        return truncated
+
+    @staticmethod
+    def _heuristic_cut(text: str, max_tokens: int) -> int:
+        """粗估模式下不超過 max_tokens 的最長前綴長度"""
+        cjk = 0
+        other = 0
+        for position, char in enumerate(text):
+            if _is_cjk(char):
+                cjk += 1
+            else:
+                other += 1
+            if cjk + (other + 3) // 4 > max_tokens:
+                return position
+        return len(text)
+
+    def fit_max_tokens(self, messages: List[Dict], desired: int) -> int:
+        """
+        回應token上限：不超過 desired，且輸入加回應不超過模型上下文長度（扣除安全邊界）
+        輸入本身已接近上限時仍保留 MIN_COMPLETION_TOKENS
+        """
+        available = self.context_window - self.count_messages(messages) - self.safety_margin
+        if available >= desired:
+            return desired
+        self.completion_clamps += 1
+        if available < self.MIN_COMPLETION_TOKENS:
+            logger.warning(f"⚠️ 提示詞約 {self.context_window - available - self.safety_margin} tokens，已接近上下文上限 {self.context_window}")
+            return self.MIN_COMPLETION_TOKENS
+        return available
+
+    def get_stats(self) -> Dict:
+        return {
+            'backend': self.backend,
+            'tokenizer_source': self.tokenizer_source,
+            'context_window': self.context_window,
+            'cached_strings': len(self._counts),
+            'cache_size': self.cache_size,
+            'count_calls': self.count_calls,
+            'cache_hits': self.cache_hits,
+            'cache_hit_rate': f"{(self.cache_hits / self.count_calls * 100) if self.count_calls else 0:.1f}%",
+            'encode_calls': self.encode_calls,
+            'avg_encode_ms': round(self.encode_seconds / self.encode_calls * 1000, 3) if self.encode_calls else 0.0,
+            'truncations': self.truncations,
+            'completion_clamps': self.completion_clamps
+        }
+
+
+# 單例實例：同一worker內的提示詞截斷、對話歷史修剪與max_tokens計算共用一個分詞器與快取
+token_budget = TokenBudget()
@@ -17,6 +17,108 @@ class Settings(BaseSettings):
     #AI服務設定
     QWEN_API_URL: str = Field(default="http://10.4.16.36:8001", env="QWEN_API_URL")
     QWEN_MODEL: str = Field(default="Qwen2.5-72B-Instruct", env="QWEN_MODEL")
+    QWEN_BATCH_FEATURES_ENABLED: bool = Field(default=False, env="QWEN_BATCH_FEATURES_ENABLED")  # 多筆專利合併為一個提示詞
+    QWEN_BATCH_TOKEN_BUDGET: int = Field(default=6000, env="QWEN_BATCH_TOKEN_BUDGET")  # 每個合併提示詞的輸入token上限（估算）
+    QWEN_BATCH_MAX_PATENTS: int = Field(default=8, env="QWEN_BATCH_MAX_PATENTS")
+    QWEN_BATCH_OUTPUT_TOKENS_PER_PATENT: int = Field(default=300, env="QWEN_BATCH_OUTPUT_TOKENS_PER_PATENT")
+    QWEN_STRUCTURED_OUTPUT: str = Field(default="auto", env="QWEN_STRUCTURED_OUTPUT")  # 關鍵字/同義詞/技術特徵附JSON Schema：auto / response_format / guided_json / off
+    QWEN_STRUCTURED_TOKEN_SLACK: float = Field(default=1.2, env="QWEN_STRUCTURED_TOKEN_SLACK")  # 附Schema時max_tokens為Schema最長回應乘上此係數
+
+    #GPSS檢索設定
+    GPSS_API_BASE_URL: str = Field(default="https://tiponet.tipo.gov.tw/gpss1/gpsskmc/gpss_api", env="GPSS_API_BASE_URL")  # 可改指向本機替身伺服器
+    GPSS_SHARD_CONCURRENCY: int = Field(default=3, env="GPSS_SHARD_CONCURRENCY")  # 分段檢索同時請求數
+    GPSS_SHARD_MIN_DAYS: int = Field(default=7, env="GPSS_SHARD_MIN_DAYS")  # 子視窗最小天數
+    GPSS_CACHE_ENABLED: bool = Field(default=True, env="GPSS_CACHE_ENABLED")
+    GPSS_CACHE_TTL_SECONDS: int = Field(default=21600, env="GPSS_CACHE_TTL_SECONDS")  # 回應快取有效時間（6小時）
+    GPSS_CACHE_MEMORY_SIZE: int = Field(default=128, env="GPSS_CACHE_MEMORY_SIZE")  # 記憶體LRU筆數
+    GPSS_FANOUT_ENABLED: bool = Field(default=False, env="GPSS_FANOUT_ENABLED")  # 依資料庫分組並行檢索
+    GPSS_FANOUT_CONCURRENCY: int = Field(default=3, env="GPSS_FANOUT_CONCURRENCY")
+    GPSS_STREAMING_PARSE: bool = Field(default=False, env="GPSS_STREAMING_PARSE")  # 邊下載邊解析回應
+    GPSS_STREAMING_PROCESS_CHUNK: int = Field(default=20, env="GPSS_STREAMING_PROCESS_CHUNK")  # 串流解析時每累積幾筆即開始補齊與Qwen處理
+    GPSS_LAZY_HYDRATION: bool = Field(default=False, env="GPSS_LAZY_HYDRATION")  # 檢索只取列表欄位，處理前再補齊摘要/權利要求
+    GPSS_HYDRATION_BATCH_SIZE: int = Field(default=50, env="GPSS_HYDRATION_BATCH_SIZE")  # 每次補齊查詢的公開號數量
+    GPSS_MAX_URL_LENGTH: int = Field(default=2000, env="GPSS_MAX_URL_LENGTH")  # 複雜查詢URL長度上限，超過時拆分子查詢
+    GPSS_QUERY_SPLIT_ENABLED: bool = Field(default=True, env="GPSS_QUERY_SPLIT_ENABLED")
+    GPSS_QUERY_MAX_SUBQUERIES: int = Field(default=16, env="GPSS_QUERY_MAX_SUBQUERIES")  # 單一查詢最多拆成幾個子查詢
+    GPSS_QUERY_SPLIT_CONCURRENCY: int = Field(default=3, env="GPSS_QUERY_SPLIT_CONCURRENCY")  # 子查詢同時請求數
+    GPSS_SPECULATIVE_PREFETCH: bool = Field(default=False, env="GPSS_SPECULATIVE_PREFETCH")  # 關鍵字生成後即預先檢索預設選擇
+    GPSS_PREFETCH_MAX_RESULTS: int = Field(default=1000, env="GPSS_PREFETCH_MAX_RESULTS")
+    GPSS_PREFETCH_TTL_SECONDS: int = Field(default=600, env="GPSS_PREFETCH_TTL_SECONDS")  # 未取用的預先檢索保留時間
+    GPSS_PREFETCH_MAX_SESSIONS: int = Field(default=100, env="GPSS_PREFETCH_MAX_SESSIONS")
+
+    #GPSS限流與熔斷設定（每個worker行程各自計算）
+    GPSS_RATE_LIMIT_GLOBAL_RPS: float = Field(default=5.0, env="GPSS_RATE_LIMIT_GLOBAL_RPS")
+    GPSS_RATE_LIMIT_GLOBAL_BURST: float = Field(default=10.0, env="GPSS_RATE_LIMIT_GLOBAL_BURST")
+    GPSS_RATE_LIMIT_PER_USER_RPS: float = Field(default=2.0, env="GPSS_RATE_LIMIT_PER_USER_RPS")
+    GPSS_RATE_LIMIT_PER_USER_BURST: float = Field(default=5.0, env="GPSS_RATE_LIMIT_PER_USER_BURST")
+    GPSS_RATE_LIMIT_MAX_WAIT: float = Field(default=60.0, env="GPSS_RATE_LIMIT_MAX_WAIT")  # 預估排隊超過此秒數直接拒絕
+    GPSS_CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5, env="GPSS_CIRCUIT_FAILURE_THRESHOLD")  # 連續失敗次數
+    GPSS_CIRCUIT_RECOVERY_SECONDS: float = Field(default=30.0, env="GPSS_CIRCUIT_RECOVERY_SECONDS")  # 熔斷後冷卻時間
+
+    #Qwen多端點設定（多個模型副本時依最少進行中請求分配，連續失敗的端點暫時移出）
+    QWEN_API_URLS: str = Field(default="", env="QWEN_API_URLS")  # 逗號分隔的端點網址；空字串時只使用QWEN_API_URL
+    QWEN_ENDPOINT_EJECT_FAILURES: int = Field(default=3, env="QWEN_ENDPOINT_EJECT_FAILURES")  # 連續失敗此次數後移出
+    QWEN_ENDPOINT_EJECT_SECONDS: float = Field(default=30.0, env="QWEN_ENDPOINT_EJECT_SECONDS")  # 移出時間，到期後重新分配
+    QWEN_HEDGE_ENABLED: bool = Field(default=False, env="QWEN_HEDGE_ENABLED")  # 關鍵字生成等短呼叫超過p95未回應時送往另一端點
+    QWEN_HEDGE_MIN_SAMPLES: int = Field(default=20, env="QWEN_HEDGE_MIN_SAMPLES")  # 累積此數量的延遲樣本後才開始對沖
+    QWEN_HEDGE_MIN_DELAY_MS: float = Field(default=200.0, env="QWEN_HEDGE_MIN_DELAY_MS")  # 對沖等待時間下限
+    QWEN_HEDGE_MAX_RATIO: float = Field(default=0.1, env="QWEN_HEDGE_MAX_RATIO")  # 對沖請求數佔該類呼叫的比例上限
+
+    #Qwen自適應並行設定（AIMD，每個worker行程各自計算，所有Qwen呼叫共用）
+    QWEN_ADAPTIVE_CONCURRENCY: bool = Field(default=True, env="QWEN_ADAPTIVE_CONCURRENCY")  # 關閉時上限固定為初始值
+    QWEN_CONCURRENCY_INITIAL: int = Field(default=8, env="QWEN_CONCURRENCY_INITIAL")
+    QWEN_CONCURRENCY_MIN: int = Field(default=1, env="QWEN_CONCURRENCY_MIN")
+    QWEN_CONCURRENCY_MAX: int = Field(default=32, env="QWEN_CONCURRENCY_MAX")
+    QWEN_CONCURRENCY_DECREASE_FACTOR: float = Field(default=0.7, env="QWEN_CONCURRENCY_DECREASE_FACTOR")  # 過載時上限乘上此係數
+    QWEN_LATENCY_SPIKE_RATIO: float = Field(default=2.0, env="QWEN_LATENCY_SPIKE_RATIO")  # 延遲超過基準此倍數視為過載
+
+    #LLM請求排程設定（優先權：interactive > standard > bulk）
+    LLM_SCHEDULER_STARVATION_SECONDS: float = Field(default=30.0, env="LLM_SCHEDULER_STARVATION_SECONDS")  # 低優先權請求排隊超過此秒數優先放行（需小於處理逾時60秒）
+    LLM_BULK_PATENT_THRESHOLD: int = Field(default=100, env="LLM_BULK_PATENT_THRESHOLD")  # 單次技術特徵生成超過此筆數視為批量工作
+
+    #Token計算設定（以Qwen分詞器計算；未安裝tokenizers或載入失敗時粗估）
+    QWEN_TOKENIZER_PATH: str = Field(default="", env="QWEN_TOKENIZER_PATH")  # 本機tokenizer.json路徑，優先於QWEN_TOKENIZER_NAME
+    QWEN_TOKENIZER_NAME: str = Field(default="Qwen/Qwen2.5-72B-Instruct", env="QWEN_TOKENIZER_NAME")  # Hub模型名稱，空字串表示不下載
+    QWEN_CONTEXT_WINDOW: int = Field(default=32768, env="QWEN_CONTEXT_WINDOW")  # 需與模型伺服器的最大序列長度一致
+    TOKEN_BUDGET_SAFETY_MARGIN: int = Field(default=256, env="TOKEN_BUDGET_SAFETY_MARGIN")
+    TOKEN_COUNT_CACHE_SIZE: int = Field(default=4096, env="TOKEN_COUNT_CACHE_SIZE")  # 快取token數的字串筆數
+    QWEN_KEYWORD_DESCRIPTION_TOKENS: int = Field(default=1200, env="QWEN_KEYWORD_DESCRIPTION_TOKENS")  # 關鍵字生成的技術描述上限
+    QWEN_FEATURE_TITLE_TOKENS: int = Field(default=100, env="QWEN_FEATURE_TITLE_TOKENS")  # 技術特徵提示詞各欄位上限
+    QWEN_FEATURE_ABSTRACT_TOKENS: int = Field(default=800, env="QWEN_FEATURE_ABSTRACT_TOKENS")
+    QWEN_FEATURE_CLAIMS_TOKENS: int = Field(default=800, env="QWEN_FEATURE_CLAIMS_TOKENS")
+    QA_CONTEXT_ABSTRACT_TOKENS: int = Field(default=600, env="QA_CONTEXT_ABSTRACT_TOKENS")  # 問答上下文中每筆專利摘要上限
+
+    #問答提示詞排列設定（固定前綴在前、本輪內容在後，讓模型伺服器的前綴快取可跨輪沿用）
+    QA_SESSION_DIGEST_TOKENS: int = Field(default=6000, env="QA_SESSION_DIGEST_TOKENS")  # 系統訊息中本會話專利清單的上限
+    QA_SESSION_DIGEST_FEATURES: int = Field(default=2, env="QA_SESSION_DIGEST_FEATURES")  # 清單中每筆專利列出的技術特徵數
+    QA_HISTORY_DROP_BLOCK: int = Field(default=4, env="QA_HISTORY_DROP_BLOCK")  # 捨棄舊對話時一次捨棄的輪數，1表示逐輪捨棄
+    QA_PREFIX_STATS_SESSIONS: int = Field(default=500, env="QA_PREFIX_STATS_SESSIONS")  # 統計前綴重用時記錄的會話數
+
+    #Qwen技術特徵快取設定（以專利內容+提示詞版本+模型為鍵）
+    TECH_FEATURE_CACHE_ENABLED: bool = Field(default=True, env="TECH_FEATURE_CACHE_ENABLED")
+    TECH_FEATURE_CACHE_TTL_DAYS: int = Field(default=90, env="TECH_FEATURE_CACHE_TTL_DAYS")
+    TECH_FEATURE_CACHE_MEMORY_SIZE: int = Field(default=2000, env="TECH_FEATURE_CACHE_MEMORY_SIZE")
+    TECH_FEATURE_PROMPT_VERSION: str = Field(default="v1", env="TECH_FEATURE_PROMPT_VERSION")  # 手動使快取失效時遞增
+
+    #關鍵字/同義詞生成快取設定（以正規化技術描述為鍵，近似描述以MinHash/LSH比對）
+    KEYWORD_CACHE_ENABLED: bool = Field(default=True, env="KEYWORD_CACHE_ENABLED")
+    KEYWORD_CACHE_TTL_DAYS: int = Field(default=30, env="KEYWORD_CACHE_TTL_DAYS")
+    KEYWORD_CACHE_MEMORY_SIZE: int = Field(default=5000, env="KEYWORD_CACHE_MEMORY_SIZE")  # 記憶體LRU與近似索引筆數
+    KEYWORD_CACHE_PROMPT_VERSION: str = Field(default="v1", env="KEYWORD_CACHE_PROMPT_VERSION")  # 手動使快取失效時遞增
+    KEYWORD_CACHE_NEAR_DUPLICATE: bool = Field(default=True, env="KEYWORD_CACHE_NEAR_DUPLICATE")  # 關閉時只做完全比對
+    KEYWORD_CACHE_SIMILARITY_THRESHOLD: float = Field(default=0.8, env="KEYWORD_CACHE_SIMILARITY_THRESHOLD")  # 字元2-gram Jaccard相似度下限（約等於95%字元相同）
+    KEYWORD_CACHE_MINHASH_PERMUTATIONS: int = Field(default=64, env="KEYWORD_CACHE_MINHASH_PERMUTATIONS")
+    KEYWORD_CACHE_LSH_BANDS: int = Field(default=16, env="KEYWORD_CACHE_LSH_BANDS")  # 需整除排列數；band越多候選越多
+
+    #重複專利去重設定（同申請號或標題+摘要相同者只呼叫一次Qwen）
+    PATENT_DEDUP_ENABLED: bool = Field(default=True, env="PATENT_DEDUP_ENABLED")
+
+    #CPU卸載設定（JSON解析/修復移出事件迴圈）
+    CPU_OFFLOAD_ENABLED: bool = Field(default=True, env="CPU_OFFLOAD_ENABLED")
+    CPU_OFFLOAD_PROCESS_THRESHOLD_BYTES: int = Field(default=1048576, env="CPU_OFFLOAD_PROCESS_THRESHOLD_BYTES")  # 超過此大小送往行程池
+    CPU_OFFLOAD_PROCESS_THRESHOLD_ITEMS: int = Field(default=300, env="CPU_OFFLOAD_PROCESS_THRESHOLD_ITEMS")  # 回應解析超過此筆數送往行程池
+    CPU_OFFLOAD_PROCESS_WORKERS: int = Field(default=2, env="CPU_OFFLOAD_PROCESS_WORKERS")  # 0表示不使用行程池
+    CPU_OFFLOAD_THREAD_WORKERS: int = Field(default=4, env="CPU_OFFLOAD_THREAD_WORKERS")
 
     #Elasticsearch設定
     ELASTICSEARCH_URL: str = Field(default="http://localhost:9200", env="ELASTICSEARCH_URL")
@@ -30,6 +132,12 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(default="change-this-secret-key-in-production", env="SECRET_KEY")
     JWT_EXPIRE_MINUTES: int = Field(default=1440, env="JWT_EXPIRE_MINUTES")
 
+    #API密鑰驗證快取設定（以SECRET_KEY做HMAC雜湊，跨worker共用）
+    API_KEY_CACHE_BACKEND: str = Field(default="database", env="API_KEY_CACHE_BACKEND")  # database / memory
+    API_KEY_CACHE_TTL_SECONDS: int = Field(default=86400, env="API_KEY_CACHE_TTL_SECONDS")  # 驗證成功的有效時間
+    API_KEY_NEGATIVE_TTL_SECONDS: int = Field(default=300, env="API_KEY_NEGATIVE_TTL_SECONDS")  # 確定無效的密鑰暫不重試
+    API_KEY_CACHE_MEMORY_SIZE: int = Field(default=1024, env="API_KEY_CACHE_MEMORY_SIZE")
+
     #真實API配置（保持向後兼容）
     ENABLE_CPC_CLASSIFICATION: bool = Field(default=False, env="ENABLE_CPC_CLASSIFICATION")
     REQUIRE_API_VALIDATION: bool = Field(default=True, env="REQUIRE_API_VALIDATION")
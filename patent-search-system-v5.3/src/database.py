@@ -144,6 +144,61 @@ class KeywordQuality(Base):
     quality_score = Column(Float, default=0.5)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# 🆕 新增：GPSS API回應快取表
+class GPSSResponseCacheEntry(Base):
+    """GPSS API回應快取表"""
+    __tablename__ = "gpss_response_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)  # 正規化查詢參數的SHA256
+    query_params = Column(JSON, nullable=True)        # 查詢參數（不含userCode）
+    response = Column(Text, nullable=False)           # 原始回應（JSON字串）
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# 🆕 新增：GPSS API密鑰驗證結果快取表
+class APIKeyVerification(Base):
+    """GPSS API密鑰驗證結果快取表（只存HMAC雜湊，不存原始密鑰）"""
+    __tablename__ = "api_key_verifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key_hash = Column(String(64), nullable=False, unique=True, index=True)  # HMAC-SHA256(SECRET_KEY, userCode)
+    is_valid = Column(Boolean, nullable=False)         # 驗證成功 / 確定無效
+    status = Column(String(50), nullable=True)         # test_api_connection 回傳的狀態
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# 🆕 新增：Qwen技術特徵/功效快取表
+class TechFeatureCacheEntry(Base):
+    """Qwen技術特徵/功效快取表（以專利內容、提示詞版本與模型名稱的雜湊為鍵）"""
+    __tablename__ = "tech_feature_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)  # SHA256(標題, 摘要, 權利要求, 提示詞版本, 模型)
+    prompt_version = Column(String(32), nullable=False, index=True)
+    model_name = Column(String(100), nullable=False)
+    technical_features = Column(JSON, nullable=False)
+    technical_effects = Column(JSON, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# 🆕 新增：關鍵字/同義詞生成快取表
+class KeywordCacheEntry(Base):
+    """Qwen關鍵字/同義詞生成快取表（以正規化技術描述、生成類型、提示詞版本與模型名稱的雜湊為鍵）"""
+    __tablename__ = "keyword_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)  # SHA256(生成類型, 正規化描述, 提示詞版本, 模型)
+    kind = Column(String(32), nullable=False, index=True)  # 例如 keywords:5、synonyms:3x5
+    prompt_version = Column(String(32), nullable=False, index=True)
+    model_name = Column(String(100), nullable=False)
+    normalized_description = Column(Text, nullable=False)  # 重建近似比對索引用
+    result = Column(JSON, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 async def init_db():
     """初始化資料庫"""
     try:
@@ -507,6 +562,341 @@ class DatabaseManager:
             logger.error(f"獲取問答歷史失敗: {e}")
             return []
 
+    # 🆕 新增：GPSS API回應快取
+    @staticmethod
+    async def get_gpss_response_cache(cache_key: str) -> Optional[tuple]:
+        """讀取未過期的GPSS回應快取，回傳 (回應, 過期時間)"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(GPSSResponseCacheEntry)
+                    .where(GPSSResponseCacheEntry.cache_key == cache_key)
+                    .where(GPSSResponseCacheEntry.expires_at > datetime.utcnow())
+                )
+                entry = result.scalar_one_or_none()
+                if entry is None:
+                    return None
+                return json.loads(entry.response), entry.expires_at
+
+        except Exception as e:
+            logger.error(f"讀取GPSS回應快取失敗: {e}")
+            return None
+
+    @staticmethod
+    async def save_gpss_response_cache(
+        cache_key: str,
+        query_params: dict,
+        response: dict,
+        ttl_seconds: int
+    ):
+        """保存GPSS回應快取（相同快取鍵則覆寫）"""
+        try:
+            async with async_session_maker() as session:
+                expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+                response_text = json.dumps(response, ensure_ascii=False)
+
+                result = await session.execute(
+                    select(GPSSResponseCacheEntry).where(GPSSResponseCacheEntry.cache_key == cache_key)
+                )
+                existing = result.scalar_one_or_none()
+
+                if existing:
+                    existing.query_params = query_params
+                    existing.response = response_text
+                    existing.created_at = datetime.utcnow()
+                    existing.expires_at = expires_at
+                else:
+                    session.add(GPSSResponseCacheEntry(
+                        cache_key=cache_key,
+                        query_params=query_params,
+                        response=response_text,
+                        expires_at=expires_at
+                    ))
+
+                await session.commit()
+                logger.debug(f"GPSS回應快取已保存: {cache_key[:12]}")
+
+        except Exception as e:
+            logger.error(f"保存GPSS回應快取失敗: {e}")
+
+    # 🆕 新增：API密鑰驗證結果快取
+    @staticmethod
+    async def get_api_key_verification(key_hash: str) -> Optional[tuple]:
+        """讀取未過期的密鑰驗證結果，回傳 (是否有效, 過期時間)"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(APIKeyVerification)
+                    .where(APIKeyVerification.key_hash == key_hash)
+                    .where(APIKeyVerification.expires_at > datetime.utcnow())
+                )
+                entry = result.scalar_one_or_none()
+                if entry is None:
+                    return None
+                return entry.is_valid, entry.expires_at
+
+        except Exception as e:
+            logger.error(f"讀取API密鑰驗證快取失敗: {e}")
+            return None
+
+    @staticmethod
+    async def save_api_key_verification(
+        key_hash: str,
+        is_valid: bool,
+        status: str,
+        ttl_seconds: int
+    ):
+        """保存密鑰驗證結果（相同雜湊則覆寫）"""
+        try:
+            async with async_session_maker() as session:
+                expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+
+                result = await session.execute(
+                    select(APIKeyVerification).where(APIKeyVerification.key_hash == key_hash)
+                )
+                existing = result.scalar_one_or_none()
+
+                if existing:
+                    existing.is_valid = is_valid
+                    existing.status = status
+                    existing.created_at = datetime.utcnow()
+                    existing.expires_at = expires_at
+                else:
+                    session.add(APIKeyVerification(
+                        key_hash=key_hash,
+                        is_valid=is_valid,
+                        status=status,
+                        expires_at=expires_at
+                    ))
+
+                await session.commit()
+
+        except Exception as e:
+            logger.error(f"保存API密鑰驗證快取失敗: {e}")
+
+    @staticmethod
+    async def delete_api_key_verification(key_hash: str):
+        """刪除密鑰驗證結果"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(APIKeyVerification).where(APIKeyVerification.key_hash == key_hash)
+                )
+                entry = result.scalar_one_or_none()
+                if entry is not None:
+                    await session.delete(entry)
+                    await session.commit()
+
+        except Exception as e:
+            logger.error(f"刪除API密鑰驗證快取失敗: {e}")
+
+    @staticmethod
+    async def count_valid_api_keys() -> int:
+        """未過期的有效密鑰數量"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(func.count(APIKeyVerification.id))
+                    .where(APIKeyVerification.is_valid == True)
+                    .where(APIKeyVerification.expires_at > datetime.utcnow())
+                )
+                return result.scalar() or 0
+
+        except Exception as e:
+            logger.error(f"統計API密鑰驗證快取失敗: {e}")
+            return 0
+
+    # 🆕 新增：Qwen技術特徵快取
+    @staticmethod
+    async def get_tech_feature_cache_bulk(cache_keys: List[str]) -> Dict[str, tuple]:
+        """一次查詢多個快取鍵，回傳 {快取鍵: (技術特徵, 技術功效, 過期時間)}"""
+        found = {}
+        if not cache_keys:
+            return found
+        try:
+            async with async_session_maker() as session:
+                # SQLite單一查詢的參數數量有限，分段查詢
+                for i in range(0, len(cache_keys), 500):
+                    result = await session.execute(
+                        select(TechFeatureCacheEntry)
+                        .where(TechFeatureCacheEntry.cache_key.in_(cache_keys[i:i + 500]))
+                        .where(TechFeatureCacheEntry.expires_at > datetime.utcnow())
+                    )
+                    for entry in result.scalars().all():
+                        entry.hit_count = (entry.hit_count or 0) + 1
+                        found[entry.cache_key] = (entry.technical_features, entry.technical_effects, entry.expires_at)
+                await session.commit()
+            return found
+
+        except Exception as e:
+            logger.error(f"讀取技術特徵快取失敗: {e}")
+            return found
+
+    @staticmethod
+    async def save_tech_feature_cache(
+        cache_key: str,
+        prompt_version: str,
+        model_name: str,
+        technical_features: List[str],
+        technical_effects: List[str],
+        ttl_days: int
+    ):
+        """保存技術特徵快取（相同快取鍵則覆寫）"""
+        try:
+            async with async_session_maker() as session:
+                expires_at = datetime.utcnow() + timedelta(days=ttl_days)
+
+                result = await session.execute(
+                    select(TechFeatureCacheEntry).where(TechFeatureCacheEntry.cache_key == cache_key)
+                )
+                existing = result.scalar_one_or_none()
+
+                if existing:
+                    existing.technical_features = technical_features
+                    existing.technical_effects = technical_effects
+                    existing.created_at = datetime.utcnow()
+                    existing.expires_at = expires_at
+                else:
+                    session.add(TechFeatureCacheEntry(
+                        cache_key=cache_key,
+                        prompt_version=prompt_version,
+                        model_name=model_name,
+                        technical_features=technical_features,
+                        technical_effects=technical_effects,
+                        expires_at=expires_at
+                    ))
+
+                await session.commit()
+
+        except Exception as e:
+            logger.error(f"保存技術特徵快取失敗: {e}")
+
+    @staticmethod
+    async def purge_stale_tech_feature_cache(prompt_version: str, model_name: str) -> int:
+        """刪除其他提示詞版本或模型的技術特徵快取（提示詞模板變更後不再命中）"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(TechFeatureCacheEntry).where(
+                        (TechFeatureCacheEntry.prompt_version != prompt_version)
+                        | (TechFeatureCacheEntry.model_name != model_name)
+                    )
+                )
+                stale_entries = result.scalars().all()
+                for entry in stale_entries:
+                    await session.delete(entry)
+                await session.commit()
+                return len(stale_entries)
+
+        except Exception as e:
+            logger.error(f"清理舊版技術特徵快取失敗: {e}")
+            return 0
+
+    # 🆕 新增：關鍵字/同義詞生成快取
+    @staticmethod
+    async def get_keyword_cache(cache_key: str) -> Optional[tuple]:
+        """讀取單筆關鍵字快取，回傳 (生成類型, 正規化描述, 結果, 過期時間)"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(KeywordCacheEntry)
+                    .where(KeywordCacheEntry.cache_key == cache_key)
+                    .where(KeywordCacheEntry.expires_at > datetime.utcnow())
+                )
+                entry = result.scalar_one_or_none()
+                if entry is None:
+                    return None
+                entry.hit_count = (entry.hit_count or 0) + 1
+                await session.commit()
+                return (entry.kind, entry.normalized_description, entry.result, entry.expires_at)
+
+        except Exception as e:
+            logger.error(f"讀取關鍵字快取失敗: {e}")
+            return None
+
+    @staticmethod
+    async def get_recent_keyword_cache(prompt_version: str, model_name: str, limit: int) -> List[tuple]:
+        """讀取目前版本最近寫入的關鍵字快取（啟動時重建近似比對索引），回傳 [(快取鍵, 生成類型, 正規化描述, 結果, 過期時間)]"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(KeywordCacheEntry)
+                    .where(KeywordCacheEntry.prompt_version == prompt_version)
+                    .where(KeywordCacheEntry.model_name == model_name)
+                    .where(KeywordCacheEntry.expires_at > datetime.utcnow())
+                    .order_by(KeywordCacheEntry.created_at.desc())
+                    .limit(limit)
+                )
+                return [
+                    (entry.cache_key, entry.kind, entry.normalized_description, entry.result, entry.expires_at)
+                    for entry in result.scalars().all()
+                ]
+
+        except Exception as e:
+            logger.error(f"讀取近期關鍵字快取失敗: {e}")
+            return []
+
+    @staticmethod
+    async def save_keyword_cache(
+        cache_key: str,
+        kind: str,
+        prompt_version: str,
+        model_name: str,
+        normalized_description: str,
+        result: Dict,
+        ttl_days: int
+    ):
+        """保存關鍵字快取（相同快取鍵則覆寫）"""
+        try:
+            async with async_session_maker() as session:
+                expires_at = datetime.utcnow() + timedelta(days=ttl_days)
+
+                query = await session.execute(
+                    select(KeywordCacheEntry).where(KeywordCacheEntry.cache_key == cache_key)
+                )
+                existing = query.scalar_one_or_none()
+
+                if existing:
+                    existing.result = result
+                    existing.created_at = datetime.utcnow()
+                    existing.expires_at = expires_at
+                else:
+                    session.add(KeywordCacheEntry(
+                        cache_key=cache_key,
+                        kind=kind,
+                        prompt_version=prompt_version,
+                        model_name=model_name,
+                        normalized_description=normalized_description,
+                        result=result,
+                        expires_at=expires_at
+                    ))
+
+                await session.commit()
+
+        except Exception as e:
+            logger.error(f"保存關鍵字快取失敗: {e}")
+
+    @staticmethod
+    async def purge_stale_keyword_cache(prompt_version: str, model_name: str) -> int:
+        """刪除其他提示詞版本或模型的關鍵字快取"""
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(KeywordCacheEntry).where(
+                        (KeywordCacheEntry.prompt_version != prompt_version)
+                        | (KeywordCacheEntry.model_name != model_name)
+                    )
+                )
+                stale_entries = result.scalars().all()
+                for entry in stale_entries:
+                    await session.delete(entry)
+                await session.commit()
+                return len(stale_entries)
+
+        except Exception as e:
+            logger.error(f"清理舊版關鍵字快取失敗: {e}")
+            return 0
+
     # 🆕 新增：清理過期的暫存結果
     @staticmethod
     async def cleanup_expired_cache():
@@ -522,11 +912,47 @@ class DatabaseManager:
                 
                 for entry in expired_entries:
                     await session.delete(entry)
+
+                # 刪除過期的GPSS回應快取
+                gpss_result = await session.execute(
+                    select(GPSSResponseCacheEntry)
+                    .where(GPSSResponseCacheEntry.expires_at <= datetime.utcnow())
+                )
+                expired_gpss_entries = gpss_result.scalars().all()
+
+                for entry in expired_gpss_entries:
+                    await session.delete(entry)
+
+                # 刪除過期的技術特徵快取
+                feature_result = await session.execute(
+                    select(TechFeatureCacheEntry)
+                    .where(TechFeatureCacheEntry.expires_at <= datetime.utcnow())
+                )
+                for entry in feature_result.scalars().all():
+                    await session.delete(entry)
+
+                # 刪除過期的關鍵字快取
+                keyword_result = await session.execute(
+                    select(KeywordCacheEntry)
+                    .where(KeywordCacheEntry.expires_at <= datetime.utcnow())
+                )
+                for entry in keyword_result.scalars().all():
+                    await session.delete(entry)
+
+                # 刪除過期的API密鑰驗證結果
+                key_result = await session.execute(
+                    select(APIKeyVerification)
+                    .where(APIKeyVerification.expires_at <= datetime.utcnow())
+                )
+                for entry in key_result.scalars().all():
+                    await session.delete(entry)
                 
                 await session.commit()
                 
                 if expired_entries:
                     logger.info(f"清理了 {len(expired_entries)} 筆過期的暫存結果")
+                if expired_gpss_entries:
+                    logger.info(f"清理了 {len(expired_gpss_entries)} 筆過期的GPSS回應快取")
                 
         except Exception as e:
             logger.error(f"清理過期暫存失敗: {e}")
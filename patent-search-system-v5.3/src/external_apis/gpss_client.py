@@ -29,11 +29,11 @@ class GPSSAPIClient(ABC):
 class RealGPSSClient(GPSSAPIClient):
     """真實的GPSS API客戶端"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
         self.api_key = api_key
         self.session = None
         from src.ai_services.gpss_service import GPSSAPIService
-        self.gpss_service = GPSSAPIService()
+        self.gpss_service = GPSSAPIService(base_url=base_url)
     
     async def initialize(self):
         """初始化HTTP會話"""
@@ -275,13 +275,14 @@ class MockGPSSClient(GPSSAPIClient):
             }
         ]
 
-def create_gpss_client(use_mock: bool = True, api_key: str = "") -> GPSSAPIClient:
+def create_gpss_client(use_mock: bool = True, api_key: str = "", base_url: Optional[str] = None) -> GPSSAPIClient:
     """
     工廠方法：創建GPSS客戶端
     
     Args:
         use_mock: 是否使用模擬客戶端
         api_key: GPSS API密鑰
+        base_url: GPSS API端點（預設為設定值，可指向gpss_standin_server）
         
     Returns:
         GPSSAPIClient實例
@@ -291,4 +292,4 @@ def create_gpss_client(use_mock: bool = True, api_key: str = "") -> GPSSAPIClien
     else:
         if not api_key:
             raise ValueError("真實GPSS客戶端需要提供API密鑰")
-        return RealGPSSClient(api_key)
\ No newline at end of file
+        return RealGPSSClient(api_key, base_url=base_url)
\ No newline at end of file
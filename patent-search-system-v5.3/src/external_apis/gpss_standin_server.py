@@ -0,0 +1,509 @@
+# src/external_apis/gpss_standin_server.py - GPSS API本機替身伺服器（錄製/重播/合成）
+#
+# 用於在不連線tiponet的情況下，對真實的 GPSSAPIService HTTP + 解析路徑進行壓測與延遲測試。
+#
+# 模式：
+#   synthetic - 依查詢參數產生確定性的合成 gpss-API 回應（同一查詢每次結果相同）
+#   replay    - 重播錄製檔，找不到對應錄製時改用合成回應（--strict 則回傳404）
+#   record    - 轉發至正式GPSS API並將回應錄製到 --record-dir，供之後重播
+#
+# 執行方式（於專案根目錄）：
+#   python -m src.external_apis.gpss_standin_server --port 8765 --latency lognormal:0.8,0.5 --error-rate 0.02
+#   GPSS_API_BASE_URL=http://127.0.0.1:8765/gpss_api GPSS_CACHE_ENABLED=false python -m src.main
+#
+# 合成模式下 ID/AD 日期條件、patDB、expQty、expFld 皆會生效，
+# 因此分段檢索、資料庫分流與延遲補齊（PN查詢）都能得到一致的結果。
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_BASE_URL = "https://tiponet.tipo.gov.tw/gpss1/gpsskmc/gpss_api"
+
+ALL_DATABASES = [
+    'TWA', 'TWB', 'USA', 'USB', 'JPA', 'JPB', 'EPA', 'EPB', 'KPA', 'KPB',
+    'CNA', 'CNB', 'WO', 'SEAA', 'SEAB', 'OTA', 'OTB'
+]
+
+DEFAULT_OUTPUT_FIELDS = 'PN,AN,ID,AD,TI,AX,PA,IN,AB,IC,CS,CL,AG,PD'
+
+# 不參與錄製鍵的參數；寬鬆比對時另外忽略日期視窗與筆數
+_EXCLUDED_PARAMS = {'userCode'}
+_LOOSE_EXCLUDED_PARAMS = {'userCode', 'ID', 'AD', 'expQty'}
+
+# 合成資料：公開日均勻分佈於最近10年，申請日固定早於公開日
+_SYNTHETIC_SPAN_DAYS = 3650
+_APPLICATION_LEAD_DAYS = 400
+
+_TEXT_BASE = "一種半導體封裝結構，包含基板、晶片與導線架，其中該晶片透過凸塊電性連接至該基板。"
+_APPLICANTS = ['台灣積體電路製造股份有限公司', '日月光半導體製造股份有限公司', '聯華電子股份有限公司',
+               'INTEL CORPORATION', 'SAMSUNG ELECTRONICS CO., LTD.', 'TOKYO ELECTRON LIMITED']
+_INVENTORS = ['王大明', '陳小華', '林志強', '張美玲', 'SMITH, JOHN', 'TANAKA, HIROSHI']
+_IPC_CODES = ['H01L 23/00', 'H01L 21/56', 'G01R 31/28', 'H05K 1/18', 'B81B 7/00', 'G06F 30/39']
+# 正式回應中出現過的不合法跳脫（malformed模式插入）
+_MALFORMED_SNIPPETS = [r'溫度\<100℃', r'壓力\>5MPa', r'x\=y', r'濃度\%', r'C\+\+', r'\中間層', r'C:\path']
+
+
+class LatencyModel:
+    """
+    回應延遲分佈，格式為 "分佈:參數"（秒）
+      none / fixed:0.3 / uniform:0.1,1.2 / normal:0.5,0.1 / lognormal:0.8,0.5（中位數, sigma）
+    """
+
+    def __init__(self, spec: str = 'none'):
+        self.spec = spec or 'none'
+        kind, _, raw_args = self.spec.partition(':')
+        self.kind = kind.strip().lower()
+        self.args = [float(arg) for arg in raw_args.split(',') if arg.strip()]
+
+        expected_args = {'none': 0, 'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if self.kind not in expected_args or len(self.args) != expected_args[self.kind]:
+            raise ValueError(f"不支援的延遲分佈設定: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'none':
+            return 0.0
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return rng.uniform(self.args[0], self.args[1])
+        if self.kind == 'normal':
+            return max(0.0, rng.gauss(self.args[0], self.args[1]))
+        median, sigma = self.args
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+@dataclass
+class StandinConfig:
+    """替身伺服器設定"""
+    mode: str = 'synthetic'                 # synthetic / replay / record
+    path: str = '/gpss_api'
+    latency: str = 'none'                   # 首位元組前的延遲分佈
+    per_item_latency_ms: float = 0.0        # 每筆結果額外延遲（模擬大查詢較慢）
+    error_rate: float = 0.0                 # HTTP 503 比例
+    api_error_rate: float = 0.0             # 200 + gpss-API error 比例
+    malformed_rate: float = 0.0             # 插入不合法跳脫的項目比例
+    truncate_rate: float = 0.0              # 回應在中途截斷的比例
+    hang_rate: float = 0.0                  # 長時間不回應（觸發客戶端逾時）的比例
+    hang_seconds: float = 150.0
+    total_hits: int = 3000                  # 每個查詢在10年範圍內的合成命中數
+    abstract_repeat: Tuple[int, int] = (3, 8)
+    claim_count: Tuple[int, int] = (3, 15)
+    claim_repeat: Tuple[int, int] = (1, 4)
+    chunk_size: int = 64 * 1024
+    record_dir: Optional[Path] = None
+    strict_replay: bool = False
+    upstream_url: str = UPSTREAM_BASE_URL
+    seed: int = 0
+
+
+@dataclass
+class _Recording:
+    status: int
+    body: str
+    params: Dict[str, str] = field(default_factory=dict)
+
+
+def _span_start() -> datetime:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=_SYNTHETIC_SPAN_DAYS)
+
+
+def recording_key(params: Dict[str, str], loose: bool = False) -> str:
+    """錄製/重播的比對鍵（移除userCode；寬鬆模式另忽略日期視窗與筆數）"""
+    excluded = _LOOSE_EXCLUDED_PARAMS if loose else _EXCLUDED_PARAMS
+    canonical = {
+        key: str(value).strip()
+        for key, value in params.items()
+        if key not in excluded and value not in (None, '')
+    }
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GPSSStandinServer:
+    """GPSS API替身伺服器"""
+
+    def __init__(self, config: Optional[StandinConfig] = None):
+        self.config = config or StandinConfig()
+        if self.config.mode not in ('synthetic', 'replay', 'record'):
+            raise ValueError(f"不支援的模式: {self.config.mode}")
+
+        self.latency = LatencyModel(self.config.latency)
+        self.rng = random.Random(self.config.seed)
+
+        self.recordings: Dict[str, _Recording] = {}
+        self.loose_recordings: Dict[str, _Recording] = {}
+        self.corpus: List[_Recording] = []
+        self._corpus_index = 0
+
+        self._runner: Optional[web.AppRunner] = None
+        self._upstream: Optional[aiohttp.ClientSession] = None
+
+        self.stats = {
+            'requests': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'bytes_sent': 0,
+            'items_sent': 0,
+            'outcomes': {}
+        }
+
+        if self.config.record_dir and self.config.mode == 'replay':
+            self.load_recordings(self.config.record_dir)
+
+    # --- 伺服器生命週期 ---
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(self.config.path, self.handle_search)
+        app.router.add_get('/_standin/stats', self.handle_stats)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """於目前事件迴圈內啟動，回傳可設定為 GPSS_API_BASE_URL 的網址"""
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_port = self._runner.addresses[0][1]
+        base_url = f"http://{host}:{bound_port}{self.config.path}"
+        logger.info(f"🧪 GPSS替身伺服器啟動: {base_url}（{self.config.mode}）")
+        return base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _on_cleanup(self, app: web.Application):
+        if self._upstream is not None:
+            await self._upstream.close()
+            self._upstream = None
+
+    # --- 錄製檔 ---
+
+    def load_recordings(self, record_dir: Path):
+        """
+        載入錄製檔：
+        - 本伺服器錄製的檔案（含params/status/body）依查詢參數比對
+        - 其他 *.json（直接擷取的GPSS回應）作為共用語料，依序輪流回應
+        """
+        count = 0
+        for path in sorted(Path(record_dir).glob('*.json')):
+            text = path.read_text(encoding='utf-8', errors='replace')
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError:
+                data = None
+
+            if isinstance(data, dict) and {'params', 'status', 'body'} <= data.keys():
+                recording = _Recording(status=data['status'], body=data['body'], params=data['params'])
+                self.recordings[recording_key(recording.params)] = recording
+                self.loose_recordings.setdefault(recording_key(recording.params, loose=True), recording)
+            else:
+                # 不合法的原始回應同樣保留，用於測試修復路徑
+                self.corpus.append(_Recording(status=200, body=text))
+            count += 1
+
+        logger.info(f"📼 已載入 {count} 個錄製檔（查詢比對 {len(self.recordings)}，共用語料 {len(self.corpus)}）")
+
+    def _save_recording(self, params: Dict[str, str], status: int, body: str):
+        record_dir = Path(self.config.record_dir)
+        record_dir.mkdir(parents=True, exist_ok=True)
+        saved_params = {key: value for key, value in params.items() if key not in _EXCLUDED_PARAMS}
+        path = record_dir / f"{recording_key(params)}.json"
+        path.write_text(
+            json.dumps({'params': saved_params, 'status': status, 'body': body}, ensure_ascii=False),
+            encoding='utf-8'
+        )
+
+    def _find_recording(self, params: Dict[str, str]) -> Optional[_Recording]:
+        recording = self.recordings.get(recording_key(params))
+        if recording is None:
+            recording = self.loose_recordings.get(recording_key(params, loose=True))
+        if recording is None and self.corpus:
+            recording = self.corpus[self._corpus_index % len(self.corpus)]
+            self._corpus_index += 1
+        return recording
+
+    # --- 請求處理 ---
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            **self.stats,
+            'mode': self.config.mode,
+            'latency': self.latency.spec,
+            'recordings': len(self.recordings),
+            'corpus': len(self.corpus)
+        })
+
+    async def handle_search(self, request: web.Request) -> web.StreamResponse:
+        params = dict(request.query)
+        self.stats['requests'] += 1
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            return await self._handle_search(request, params)
+        finally:
+            self.stats['in_flight'] -= 1
+
+    async def _handle_search(self, request: web.Request, params: Dict[str, str]) -> web.StreamResponse:
+        if not params.get('userCode'):
+            return self._finish('api_error', web.json_response({'gpss-API': {'error': '缺少userCode'}}))
+
+        await asyncio.sleep(self.latency.sample(self.rng))
+
+        roll = self.rng.random()
+        for outcome, rate in (
+            ('hang', self.config.hang_rate),
+            ('http_error', self.config.error_rate),
+            ('api_error', self.config.api_error_rate),
+        ):
+            if roll < rate:
+                break
+            roll -= rate
+        else:
+            outcome = None
+
+        if outcome == 'hang':
+            await asyncio.sleep(self.config.hang_seconds)
+            return self._finish('hang', web.Response(status=504, text='Gateway Timeout'))
+        if outcome == 'http_error':
+            return self._finish('http_error', web.Response(status=503, text='Service Unavailable'))
+        if outcome == 'api_error':
+            return self._finish('api_error', web.json_response({'gpss-API': {'error': '系統忙碌中，請稍後再試'}}))
+
+        if self.config.mode == 'record':
+            status, body = await self._fetch_upstream(params)
+            self._save_recording(params, status, body)
+            return await self._send_body(request, body, status=status, outcome='recorded')
+
+        if self.config.mode == 'replay':
+            recording = self._find_recording(params)
+            if recording is not None:
+                return await self._send_body(request, recording.body, status=recording.status, outcome='replayed')
+            if self.config.strict_replay:
+                return self._finish('not_recorded', web.Response(status=404, text='No recording for query'))
+
+        items = self.generate_items(params)
+        if self.config.per_item_latency_ms:
+            await asyncio.sleep(len(items) * self.config.per_item_latency_ms / 1000)
+        self.stats['items_sent'] += len(items)
+        body = json.dumps(
+            {'gpss-API': {'patent': {'patentcontent': []}}},
+            ensure_ascii=False
+        ).replace('[]', '[' + ','.join(items) + ']', 1)
+        return await self._send_body(request, body, outcome='synthetic')
+
+    async def _fetch_upstream(self, params: Dict[str, str]) -> Tuple[int, str]:
+        if self._upstream is None:
+            self._upstream = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120))
+        async with self._upstream.get(self.config.upstream_url, params=params) as response:
+            return response.status, await response.text(errors='replace')
+
+    async def _send_body(self, request: web.Request, body: str, status: int = 200, outcome: str = 'ok') -> web.StreamResponse:
+        """分段送出回應（讓客戶端的串流解析路徑也能被測到），可依設定中途截斷"""
+        data = body.encode('utf-8')
+        if self.config.truncate_rate and self.rng.random() < self.config.truncate_rate:
+            data = data[:max(1, int(len(data) * self.rng.uniform(0.3, 0.9)))]
+            outcome = 'truncated'
+
+        response = web.StreamResponse(status=status)
+        response.content_type = 'application/json'
+        response.charset = 'utf-8'
+        await response.prepare(request)
+        for offset in range(0, len(data), self.config.chunk_size):
+            await response.write(data[offset:offset + self.config.chunk_size])
+        await response.write_eof()
+
+        self.stats['bytes_sent'] += len(data)
+        return self._finish(outcome, response)
+
+    def _finish(self, outcome: str, response: web.StreamResponse) -> web.StreamResponse:
+        outcomes = self.stats['outcomes']
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return response
+
+    # --- 合成資料 ---
+
+    def generate_items(self, params: Dict[str, str]) -> List[str]:
+        """依查詢參數產生patentcontent項目（JSON字串）"""
+        seed = int(recording_key(params, loose=True)[:16], 16) ^ self.config.seed
+        fields = set((params.get('expFld') or DEFAULT_OUTPUT_FIELDS).split(','))
+        databases = set((params.get('patDB') or ','.join(ALL_DATABASES)).split(','))
+        limit = int(params.get('expQty') or 1000)
+
+        pn_query = params.get('PN', '')
+        if ' OR ' in pn_query.upper() or (pn_query and 'ID' not in params and 'AD' not in params):
+            # 依公開號查詢（延遲補齊）：每個號碼回傳一筆
+            numbers = [number.strip() for number in re.split(r'\s+OR\s+', pn_query, flags=re.IGNORECASE) if number.strip()]
+            return [self._build_item(seed, index, fields, publication_number=number) for index, number in enumerate(numbers[:limit])]
+
+        items = []
+        for index in self._indices_in_window(params):
+            if len(items) >= limit:
+                break
+            if self._database_for(seed, index) in databases:
+                items.append(self._build_item(seed, index, fields))
+        return items
+
+    def _indices_in_window(self, params: Dict[str, str]):
+        """公開日依序號均勻分佈於10年內；ID/AD條件換算為序號範圍（由新到舊）"""
+        total = self.config.total_hits
+        span_start = _span_start()
+        today = span_start + timedelta(days=_SYNTHETIC_SPAN_DAYS)
+
+        window_start, window_end = span_start, today
+        for key, lead_days in (('ID', 0), ('AD', _APPLICATION_LEAD_DAYS)):
+            start, end = self._parse_window(params.get(key))
+            if start:
+                window_start = max(window_start, start + timedelta(days=lead_days))
+            if end:
+                window_end = min(window_end, end + timedelta(days=lead_days))
+
+        if window_end < window_start:
+            return range(0)
+
+        days_per_item = _SYNTHETIC_SPAN_DAYS / total
+        first = max(0, math.ceil((window_start - span_start).days / days_per_item))
+        last = min(total - 1, int((window_end - span_start).days / days_per_item))
+        return range(last, first - 1, -1)
+
+    @staticmethod
+    def _parse_window(value: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+        if not value:
+            return None, None
+        parts = [part.strip()[:8] for part in value.split(':', 1)]
+        parsed = []
+        for part in parts + [''] * (2 - len(parts)):
+            try:
+                parsed.append(datetime.strptime(part, '%Y%m%d') if part else None)
+            except ValueError:
+                parsed.append(None)
+        return parsed[0], parsed[1]
+
+    @staticmethod
+    def _database_for(seed: int, index: int) -> str:
+        return ALL_DATABASES[(seed + index * 2654435761) % len(ALL_DATABASES)]
+
+    def _build_item(self, seed: int, index: int, fields: set, publication_number: Optional[str] = None) -> str:
+        rng = random.Random(seed * 1000003 + index)
+        database = self._database_for(seed, index)
+        status = database[-1] if database[-1] in 'AB' else 'A'
+        publication_date = _span_start() + timedelta(days=index * _SYNTHETIC_SPAN_DAYS / self.config.total_hits)
+        application_date = publication_date - timedelta(days=_APPLICATION_LEAD_DAYS)
+
+        item = {'@database': database, '@type': rng.choice('IM'), '@status': status}
+        if 'PN' in fields or 'ID' in fields:
+            item['publication-reference'] = {
+                'doc-number': publication_number or f"{database[:2]}{seed % 10000:04d}{index:07d}{status}",
+                'date': f"{publication_date:%Y%m%d}"
+            }
+        if 'AN' in fields or 'AD' in fields:
+            item['application-reference'] = {
+                'doc-number': f"{seed % 1000:03d}{index:08d}",
+                'date': f"{application_date:%Y%m%d}"
+            }
+        if 'TI' in fields:
+            item['patent-title'] = {'title': f"半導體封裝結構及其製造方法 {index}"}
+        if 'PA' in fields or 'IN' in fields:
+            item['parties'] = {
+                'applicants': {'applicant': [{'name': name, 'country-code': database[:2]} for name in rng.sample(_APPLICANTS, 2)]},
+                'inventors': {'inventor': [{'name': name} for name in rng.sample(_INVENTORS, 2)]}
+            }
+        if 'IC' in fields:
+            item['classifications-ipc'] = {'ipc': [{'keyValue': code} for code in rng.sample(_IPC_CODES, 2)]}
+        if 'PD' in fields:
+            item['priority-claims'] = {'date': f"{application_date:%Y%m%d}"}
+        if 'AB' in fields:
+            item['abstract'] = {'p': _TEXT_BASE * rng.randint(*self.config.abstract_repeat)}
+        if 'CL' in fields:
+            item['claims'] = {'claim': [
+                {'claim-text': f"如請求項{number}所述之結構，" + _TEXT_BASE * rng.randint(*self.config.claim_repeat)}
+                for number in range(1, rng.randint(*self.config.claim_count) + 1)
+            ]}
+
+        text = json.dumps(item, ensure_ascii=False)
+        if self.config.malformed_rate and rng.random() < self.config.malformed_rate:
+            # 在標題內插入GPSS常見的不合法跳脫
+            text = text.replace('半導體封裝結構', '半導體封裝結構' + rng.choice(_MALFORMED_SNIPPETS), 1)
+        return text
+
+
+def _int_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition(',')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPSS API本機替身伺服器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=['synthetic', 'replay', 'record'], default='synthetic')
+    parser.add_argument('--path', default='/gpss_api', help="API路徑")
+    parser.add_argument('--latency', default='none', help="延遲分佈，例如 lognormal:0.8,0.5")
+    parser.add_argument('--per-item-latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="HTTP 503比例")
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help="gpss-API error比例")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="項目含不合法跳脫的比例")
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help="回應中途截斷比例")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="不回應（客戶端逾時）比例")
+    parser.add_argument('--hang-seconds', type=float, default=150.0)
+    parser.add_argument('--total-hits', type=int, default=3000, help="每個查詢10年內的合成命中數")
+    parser.add_argument('--abstract-repeat', type=_int_range, default=(3, 8), help="摘要長度（基本段落重複次數，min,max）")
+    parser.add_argument('--claim-count', type=_int_range, default=(3, 15), help="每筆權利要求項數（min,max）")
+    parser.add_argument('--claim-repeat', type=_int_range, default=(1, 4), help="每項權利要求長度（min,max）")
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    parser.add_argument('--record-dir', type=Path, help="錄製檔目錄（record寫入 / replay讀取）")
+    parser.add_argument('--strict', action='store_true', help="replay找不到錄製時回傳404而非合成回應")
+    parser.add_argument('--upstream-url', default=UPSTREAM_BASE_URL)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == 'record' and not args.record_dir:
+        parser.error("record模式需要 --record-dir")
+
+    logging.basicConfig(level=logging.INFO)
+    config = StandinConfig(
+        mode=args.mode,
+        path=args.path,
+        latency=args.latency,
+        per_item_latency_ms=args.per_item_latency_ms,
+        error_rate=args.error_rate,
+        api_error_rate=args.api_error_rate,
+        malformed_rate=args.malformed_rate,
+        truncate_rate=args.truncate_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        total_hits=args.total_hits,
+        abstract_repeat=args.abstract_repeat,
+        claim_count=args.claim_count,
+        claim_repeat=args.claim_repeat,
+        chunk_size=args.chunk_size,
+        record_dir=args.record_dir,
+        strict_replay=args.strict,
+        upstream_url=args.upstream_url,
+        seed=args.seed
+    )
+    server = GPSSStandinServer(config)
+    print(f"GPSS_API_BASE_URL=http://{args.host}:{args.port}{args.path}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
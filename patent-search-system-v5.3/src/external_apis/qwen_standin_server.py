@@ -0,0 +1,297 @@
+# src/external_apis/qwen_standin_server.py - Qwen（OpenAI相容）API本機替身伺服器
+#
+# 用於在不佔用正式72B模型的情況下，比較逐筆與合併提示詞兩種技術特徵生成路徑的吞吐量。
+# 以token計費的延遲模型模擬推論伺服器（vLLM等）的行為：
+#   每個請求固定開銷 + 輸入token的prefill時間 + 輸出token的decode時間，
+#   prefill與decode的總吞吐量由所有進行中的請求分攤（processor sharing），
+#   單一序列的decode速度另有上限，同時處理的序列數超過 max_sequences 時排隊。
+# 啟用 --prefix-cache 時模擬自動前綴快取：與先前請求開頭相同的訊息不再計算prefill
+# （以整則訊息為單位比對，較實際伺服器以token區塊比對保守）。
+#
+# 執行方式（於專案根目錄）：
+#   python -m src.external_apis.qwen_standin_server --port 8766
+#   QWEN_API_URL=http://127.0.0.1:8766 python -m src.main
+#
+# 回應內容為確定性的合成技術特徵/功效；提示詞含多筆專利（【專利N】）時回傳對應的JSON陣列，
+# 可依 --drop-rate / --malformed-rate 模擬批次回應缺漏項目或JSON格式錯誤。
+# 請求附上JSON Schema（response_format / guided_json）且替身支援該方式時模擬限制解碼：不產生缺漏或格式錯誤；
+# 不支援的方式回傳400（--structured-output 設定支援的方式）。
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+_PATENT_MARKER = re.compile(r'【專利(\d+)】\s*專利標題：([^\n]*)')
+_SINGLE_TITLE = re.compile(r'專利標題：([^\n]*)')
+
+_FEATURE_TEMPLATES = ['{}之基板與晶片堆疊結構設計', '{}採用凸塊電性連接機制', '{}之導線架佈局與封裝材料配置']
+_EFFECT_TEMPLATES = ['提升{}的散熱效率與可靠度', '降低{}的封裝厚度與製造成本', '改善{}的訊號傳輸品質']
+
+
+def estimate_tokens(text: str) -> int:
+    """與token_budget未載入分詞器時相同的粗估方式（替身伺服器不載入分詞器）"""
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if '\u3000' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uff00' <= char <= '\uffef')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class QwenStandinConfig:
+    """替身伺服器設定（預設值約略對應單機72B模型）"""
+    request_overhead_ms: float = 150.0      # 排程、網路與首token前的固定開銷
+    prefill_tokens_per_s: float = 6000.0    # 所有請求共用的prefill吞吐量
+    decode_tokens_per_s: float = 600.0      # 所有序列共用的decode總吞吐量
+    max_sequence_decode_rate: float = 35.0  # 單一序列的decode上限（token/s）
+    max_sequences: int = 32                 # 同時處理的序列數上限，超過時排隊
+    drop_rate: float = 0.0                  # 批次回應中省略某筆項目的比例
+    malformed_rate: float = 0.0             # 回應JSON格式錯誤的比例
+    time_scale: float = 1.0                 # 所有延遲乘上此倍率（壓測時可縮短）
+    prefix_cache: bool = False              # 模擬自動前綴快取
+    prefix_cache_entries: int = 4096        # 快取的訊息前綴數（LRU）
+    structured_output: str = 'both'         # 支援的Schema方式：both / response_format / guided_json / none
+    seed: int = 0
+
+
+class _SharedThroughput:
+    """以processor sharing分攤的吞吐量（每個工作依目前進行中的工作數取得速率）"""
+
+    TICK_SECONDS = 0.02
+
+    def __init__(self, tokens_per_s: float, per_job_cap: Optional[float] = None):
+        self.tokens_per_s = tokens_per_s
+        self.per_job_cap = per_job_cap
+        self.active = 0
+
+    async def consume(self, tokens: float, time_scale: float):
+        if tokens <= 0:
+            return
+        self.active += 1
+        try:
+            remaining = tokens
+            while remaining > 0:
+                rate = self.tokens_per_s / self.active
+                if self.per_job_cap:
+                    rate = min(rate, self.per_job_cap)
+                step = min(remaining / rate, self.TICK_SECONDS)
+                await asyncio.sleep(step * time_scale)
+                remaining -= rate * step
+        finally:
+            self.active -= 1
+
+
+class QwenStandinServer:
+    """Qwen chat completions替身伺服器"""
+
+    def __init__(self, config: Optional[QwenStandinConfig] = None):
+        self.config = config or QwenStandinConfig()
+        self.rng = random.Random(self.config.seed)
+        self.prefill = _SharedThroughput(self.config.prefill_tokens_per_s)
+        self.decode = _SharedThroughput(self.config.decode_tokens_per_s, self.config.max_sequence_decode_rate)
+        self.slots = asyncio.Semaphore(self.config.max_sequences)
+        self._runner: Optional[web.AppRunner] = None
+        # 訊息前綴鏈雜湊 -> 該前綴的累計token數
+        self._prefix_cache: "OrderedDict[str, int]" = OrderedDict()
+
+        self.stats = {
+            'requests': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'prompt_tokens': 0,
+            'cached_prompt_tokens': 0,
+            'completion_tokens': 0,
+            'patents': 0,
+            'busy_seconds': 0.0,
+            'outcomes': {}
+        }
+
+    # --- 伺服器生命週期 ---
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.handle_chat)
+        app.router.add_get('/_standin/stats', self.handle_stats)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """於目前事件迴圈內啟動，回傳可設定為 QWEN_API_URL 的網址"""
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_port = self._runner.addresses[0][1]
+        api_url = f"http://{host}:{bound_port}"
+        logger.info(f"🧪 Qwen替身伺服器啟動: {api_url}")
+        return api_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- 請求處理 ---
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.stats['requests'] += 1
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        started = time.perf_counter()
+        try:
+            return await self._handle_chat(payload)
+        finally:
+            self.stats['in_flight'] -= 1
+            self.stats['busy_seconds'] += time.perf_counter() - started
+
+    async def _handle_chat(self, payload: Dict) -> web.Response:
+        messages = payload.get('messages') or []
+        prompt = '\n'.join(str(message.get('content', '')) for message in messages)
+        user_prompt = str(messages[-1].get('content', '')) if messages else ''
+
+        structured_mode = 'response_format' if 'response_format' in payload else ('guided_json' if 'guided_json' in payload else None)
+        if structured_mode and self.config.structured_output not in ('both', structured_mode):
+            outcomes = self.stats['outcomes']
+            outcomes['rejected_schema'] = outcomes.get('rejected_schema', 0) + 1
+            return web.json_response({'error': {'message': f"{structured_mode} is not supported", 'type': 'invalid_request_error'}}, status=400)
+
+        content, patents, outcome = self.generate_content(user_prompt, constrained=structured_mode is not None)
+        prompt_tokens = estimate_tokens(prompt)
+        cached_tokens = min(self._match_prefix_cache(messages), prompt_tokens) if self.config.prefix_cache else 0
+        completion_tokens = min(estimate_tokens(content), int(payload.get('max_tokens') or 10 ** 6))
+
+        async with self.slots:
+            await asyncio.sleep(self.config.request_overhead_ms / 1000 * self.config.time_scale)
+            await self.prefill.consume(prompt_tokens - cached_tokens, self.config.time_scale)
+            await self.decode.consume(completion_tokens, self.config.time_scale)
+
+        self.stats['prompt_tokens'] += prompt_tokens
+        self.stats['cached_prompt_tokens'] += cached_tokens
+        self.stats['completion_tokens'] += completion_tokens
+        self.stats['patents'] += patents
+        outcomes = self.stats['outcomes']
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        return web.json_response({
+            'id': f"standin-{self.stats['requests']}",
+            'object': 'chat.completion',
+            'model': payload.get('model', 'standin'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens}
+            }
+        })
+
+    def _match_prefix_cache(self, messages: List[Dict]) -> int:
+        """
+        回傳可沿用的前綴token數，並將本請求的各層訊息前綴寫入快取
+        最後一則訊息不計入可沿用部分（至少需重新計算一則訊息）
+        """
+        cached_tokens = 0
+        cumulative = 0
+        matching = True
+        chain = hashlib.sha1()
+        for position, message in enumerate(messages):
+            content = str(message.get('content', ''))
+            chain.update(f"{message.get('role')}\0{content}\0".encode('utf-8'))
+            key = chain.hexdigest()
+            cumulative += estimate_tokens(content)
+            if matching and position < len(messages) - 1 and key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                cached_tokens = cumulative
+            else:
+                matching = False
+                self._prefix_cache[key] = cumulative
+        while len(self._prefix_cache) > self.config.prefix_cache_entries:
+            self._prefix_cache.popitem(last=False)
+        return cached_tokens
+
+    # --- 合成回應 ---
+
+    def generate_content(self, user_prompt: str, constrained: bool = False):
+        """回傳（回應文字, 專利筆數, 結果類型）；constrained 時模擬限制解碼，不產生缺漏或格式錯誤"""
+        batch_items = _PATENT_MARKER.findall(user_prompt)
+        if batch_items:
+            results = []
+            for index, title in batch_items:
+                if not constrained and self.config.drop_rate and self.rng.random() < self.config.drop_rate:
+                    continue
+                results.append({'index': int(index), **self._features_for(title)})
+            content = json.dumps(results, ensure_ascii=False, indent=2)
+            outcome = 'batch' if len(results) == len(batch_items) else 'batch_partial'
+            patents = len(batch_items)
+        else:
+            match = _SINGLE_TITLE.search(user_prompt)
+            title = match.group(1) if match else user_prompt[:30]
+            content = json.dumps(self._features_for(title), ensure_ascii=False, indent=2)
+            outcome = 'single'
+            patents = 1
+
+        if not constrained and self.config.malformed_rate and self.rng.random() < self.config.malformed_rate:
+            content = content.replace('"technical_effects"', 'technical_effects', 1)
+            outcome = 'malformed'
+        return content, patents, outcome
+
+    @staticmethod
+    def _features_for(title: str) -> Dict[str, List[str]]:
+        subject = (title or '本專利').strip()[:20]
+        offset = int(hashlib.md5(subject.encode('utf-8')).hexdigest()[:4], 16) % 3
+        order = [(offset + i) % 3 for i in range(3)]
+        return {
+            'technical_features': [_FEATURE_TEMPLATES[i].format(subject) for i in order],
+            'technical_effects': [_EFFECT_TEMPLATES[i].format(subject) for i in order]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qwen API本機替身伺服器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--request-overhead-ms', type=float, default=150.0)
+    parser.add_argument('--prefill-tokens-per-s', type=float, default=6000.0)
+    parser.add_argument('--decode-tokens-per-s', type=float, default=600.0)
+    parser.add_argument('--max-sequence-decode-rate', type=float, default=35.0)
+    parser.add_argument('--max-sequences', type=int, default=32)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="批次回應省略項目的比例")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="回應JSON格式錯誤的比例")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prefix-cache', action='store_true', help="模擬自動前綴快取")
+    parser.add_argument('--structured-output', default='both', choices=['both', 'response_format', 'guided_json', 'none'],
+                        help="支援的JSON Schema方式")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = QwenStandinServer(QwenStandinConfig(
+        request_overhead_ms=args.request_overhead_ms,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        decode_tokens_per_s=args.decode_tokens_per_s,
+        max_sequence_decode_rate=args.max_sequence_decode_rate,
+        max_sequences=args.max_sequences,
+        drop_rate=args.drop_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        prefix_cache=args.prefix_cache,
+        structured_output=args.structured_output
+    ))
+    print(f"QWEN_API_URL=http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,9 @@ from src.patents.router import router as patents_router
 from src.services.improved_patent_processing_service import improved_patent_processing_service
 from src.exceptions import APIException
 from src.services.enhanced_patent_qa_service import enhanced_patent_qa_service
+from src.ai_services.cpu_offload import cpu_offload_executor
+from src.ai_services.adaptive_concurrency import qwen_concurrency_limiter
+from src.ai_services.llm_scheduler import llm_scheduler
 
 # 新增：導入資料庫相關模組
 from src.database import init_db, close_db, DatabaseManager
@@ -238,7 +241,7 @@ async def on_startup():
             logger.info("🎃 專利處理服務初始化完成（純技術特徵版本）")
 
             if improved_patent_processing_service.qwen_service:
-                logger.info(f"🎃 Qwen API服務已連接: {settings.QWEN_API_URL}")
+                logger.info(f"🎃 Qwen API服務已連接: {improved_patent_processing_service.qwen_service.api_url}")
                 logger.info(f"🎃 Qwen模型: {settings.QWEN_MODEL}")
             
             if improved_patent_processing_service.gpss_service:
@@ -270,6 +273,8 @@ async def on_shutdown():
         await improved_patent_processing_service.close()
         logger.info("🗂 專利處理服務已關閉")
         await enhanced_patent_qa_service.close()
+        # 關閉CPU卸載執行緒池/行程池
+        cpu_offload_executor.shutdown()
         # 關閉資料庫連接
         try:
             await close_db()
@@ -362,7 +367,9 @@ async def system_diagnostics():
                 "database_url": settings.DATABASE_URL
             },
             "services": {},
-            "verified_api_keys": len(improved_patent_processing_service.verified_api_keys),
+            "verified_api_keys": improved_patent_processing_service.api_key_cache.valid_count(),
+            "qwen_concurrency": qwen_concurrency_limiter.get_stats(),
+            "llm_scheduler": llm_scheduler.get_stats(),
             "database_stats": {}
         }
 
@@ -384,6 +391,8 @@ async def system_diagnostics():
         try:
             db_stats = await DatabaseManager.get_feedback_statistics()
             diagnostics["database_stats"] = db_stats
+            # 所有worker共用的已驗證密鑰數量
+            diagnostics["verified_api_keys_shared"] = await DatabaseManager.count_valid_api_keys()
         except Exception as e:
             diagnostics["database_stats"] = {"error": str(e)}
 
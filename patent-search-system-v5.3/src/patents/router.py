@@ -10,9 +10,12 @@ from io import BytesIO
 import json
 import uuid
 from urllib.parse import quote
+from contextlib import aclosing
 from src.database import DatabaseManager
 from src.services.enhanced_patent_qa_service import enhanced_patent_qa_service
 from src.services.improved_patent_processing_service import improved_patent_processing_service
+from src.ai_services.api_key_cache import KeyVerificationUnavailable
+from src.ai_services.llm_scheduler import PRIORITY_BULK, llm_request_context
  
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -42,6 +45,10 @@ class ConditionSearchRequest(BaseModel):
     publication_date_from: Optional[str] = Field(None, description="公開日（開始）")
     publication_date_to: Optional[str] = Field(None, description="公開日（結束）")
 
+class PatentDetailRequest(BaseModel):
+    user_code: str = Field(..., description="GPSS API驗證碼", min_length=16)
+    publication_numbers: List[str] = Field(..., description="公開公告號列表", min_length=1, max_length=200)
+
 class GPSSTestRequest(BaseModel):
     user_code: str = Field(..., description="GPSS API驗證碼")
 
@@ -52,6 +59,7 @@ class ExcelExportRequest(BaseModel):
 class KeywordGenerationRequest(BaseModel):
     description: str = Field(..., description="技術描述", min_length=50, max_length=3000)
     session_id: Optional[str] = Field(None, description="會話ID（可選，系統自動生成）")
+    user_code: Optional[str] = Field(None, description="GPSS API驗證碼（可選，提供時於確認期間預先檢索）")
 
 class KeywordConfirmationRequest(BaseModel):
     session_id: str = Field(..., description="會話ID")
@@ -166,7 +174,15 @@ async def test_gpss_connection(request: GPSSTestRequest):
                 "message": "GPSS API驗證失敗，請檢查驗證碼是否正確",
                 "timestamp": time.time()
             }
-        
+
+    except KeyVerificationUnavailable as e:
+        # 熔斷或限流中無法判定密鑰是否有效，不回報為驗證碼錯誤
+        return {
+            "success": False,
+            "status": e.status,
+            "message": str(e),
+            "timestamp": time.time()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"GPSS API測試失敗: {str(e)}")
 
@@ -224,12 +240,18 @@ async def generate_keywords_for_confirmation(request: KeywordGenerationRequest):
             # 如果Qwen失敗，使用fallback方法
             fallback_result = improved_patent_processing_service._generate_keywords_synonyms_fallback(request.description, 3, 5)
             keywords_with_synonyms = fallback_result.get('keywords_with_synonyms', [])
+
+        # 🔮 推測式預先檢索：使用者確認期間先以全部關鍵字與同義詞檢索
+        prefetch_started = improved_patent_processing_service.start_speculative_prefetch(
+            session_id, request.user_code, keywords_with_synonyms
+        )
         
         return {
             "success": True,
             "session_id": session_id,
             "description": request.description,
             "keywords_with_synonyms": keywords_with_synonyms,
+            "prefetch_started": prefetch_started,
             "message": f"成功生成 {len(keywords_with_synonyms)} 個關鍵字及其同義詞，請確認或修改",
             "timestamp": time.time(),
             "note": "✨ 支持關鍵字和同義詞組合的AND/OR搜索邏輯",
@@ -366,6 +388,8 @@ async def tech_description_search_confirmed(request: KeywordConfirmationRequest)
         
     except HTTPException:
         raise
+    except KeyVerificationUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"❌ 確認後搜索失敗: {e}")
         raise HTTPException(status_code=500, detail=f"確認後搜索失敗: {str(e)}")
@@ -406,7 +430,8 @@ async def tech_description_search_with_synonyms(request: KeywordSynonymConfirmat
             selected_keyword_groups=request.selected_keyword_groups,
             custom_keywords=request.custom_keywords,
             user_code=request.user_code,
-            max_results=request.max_results
+            max_results=request.max_results,
+            session_id=request.session_id
         )
         
         if result.success:
@@ -436,6 +461,8 @@ async def tech_description_search_with_synonyms(request: KeywordSynonymConfirmat
         
     except HTTPException:
         raise
+    except KeyVerificationUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"❌ 關鍵字同義詞搜索失敗: {e}")
         raise HTTPException(status_code=500, detail=f"搜索失敗: {str(e)}")
@@ -531,9 +558,48 @@ async def condition_search(search_params: Dict[str, Any]):
         
     except HTTPException:
         raise
+    except KeyVerificationUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"🎭 流程B搜索失敗: {e}")
         raise HTTPException(status_code=500, detail=f"流程B搜索失敗: {str(e)}")
+
+@router.post(
+    "/details/hydrate",
+    summary="補齊專利詳細內容",
+    description="依公開公告號取得摘要與專利範圍（列表僅載入精簡欄位時使用）",
+    tags=["流程B-條件查詢"]
+)
+async def hydrate_patent_details(request: PatentDetailRequest):
+    try:
+        if not improved_patent_processing_service.initialized:
+            await improved_patent_processing_service.initialize()
+
+        result = await improved_patent_processing_service.get_patent_details(
+            user_code=request.user_code,
+            publication_numbers=request.publication_numbers
+        )
+
+        if not result.success:
+            if "驗證失敗" in result.error:
+                raise HTTPException(status_code=401, detail=result.error)
+            raise HTTPException(status_code=400, detail=result.error)
+
+        return {
+            "success": True,
+            "results": result.results or [],
+            "total_found": result.total_found,
+            "message": result.message
+        }
+
+    except HTTPException:
+        raise
+    except KeyVerificationUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"補齊專利詳細內容失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"補齊專利詳細內容失敗: {str(e)}")
+
 # ================================
 # Excel分析功能相關端點
 # ================================
@@ -925,7 +991,7 @@ async def get_service_status():
         "initialized": improved_patent_processing_service.initialized,
         "qwen_service": improved_patent_processing_service.qwen_service is not None,
         "gpss_service": improved_patent_processing_service.gpss_service is not None,
-        "verified_api_keys_count": len(improved_patent_processing_service.verified_api_keys),
+        "verified_api_keys_count": improved_patent_processing_service.api_key_cache.valid_count(),
         "timestamp": time.time(),
         "version": "6.0.0",
         "classification_removed": True,
@@ -981,6 +1047,45 @@ async def ask_question_with_memory(request: QARequest):
         logger.error(f"❌ 問答請求失敗: {e}")
         raise HTTPException(status_code=500, detail=f"問答處理失敗: {str(e)}")
 
+@router.post(
+    "/qa/ask-with-memory/stream",
+    summary="智能問答（串流回應，支持對話記憶）",
+    description="與 /qa/ask-with-memory 相同，但以Server-Sent Events逐段回傳模型輸出（事件：start、delta、done、error），完整回答於結束後保存至問答歷史。",
+    tags=["🤖 智能問答"]
+)
+async def ask_question_with_memory_stream(request: QARequest):
+    """
+    串流版智能問答 - 不必等待整段回答生成完畢
+    每個事件格式為 "event: <類型>\ndata: <JSON>\n\n"
+    """
+    logger.info(f"🤖 收到串流問答請求（記憶模式: {request.use_memory}）")
+
+    if not enhanced_patent_qa_service.session:
+        await enhanced_patent_qa_service.initialize()
+
+    async def event_stream():
+        async with aclosing(enhanced_patent_qa_service.answer_question_with_memory_stream(
+            session_id=request.session_id,
+            question=request.question,
+            use_memory=request.use_memory
+        )) as events:
+            async for event in events:
+                event_type = event.pop('type')
+                if event_type == 'done':
+                    event['timestamp'] = time.time()
+                yield f"event: {event_type}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 避免反向代理緩衝
+            # 已設定Content-Encoding時GZipMiddleware不會壓縮（壓縮會緩衝事件，延後首個token）
+            "Content-Encoding": "identity"
+        }
+    )
+
 @router.post(
     "/qa/ask-simple", 
     summary="簡單問答（無記憶）",
@@ -1218,7 +1323,8 @@ async def _process_excel_batch(batch_df: pd.DataFrame, session_id: str, start_in
                 continue
             
             # 生成技術特徵和功效
-            features_result = await improved_patent_processing_service._generate_tech_features_and_effects(patent_data)
+            with llm_request_context(PRIORITY_BULK, session_id):
+                features_result = await improved_patent_processing_service._generate_tech_features_and_effects(patent_data)
             
             # 組裝結果
             result = {
@@ -2,30 +2,37 @@
 
 import asyncio
 import aiohttp
+import hashlib
 import logging
 import json
 import re
 import time
-from typing import List, Dict, Optional, Any
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 
 from src.database import DatabaseManager
 from src.config import settings
+from src.ai_services.llm_scheduler import PRIORITY_INTERACTIVE, llm_scheduler
+from src.ai_services.qwen_endpoint_pool import qwen_endpoint_pool
+from src.ai_services.token_budget import token_budget
 
 logger = logging.getLogger(__name__)
 
 class ConversationManager:
-    """對話管理器 - 處理對話歷史和token控制"""
+    """對話管理器 - 處理對話歷史和token控制（token數由Qwen分詞器計算）"""
     
-    def __init__(self, max_tokens: int = 128000):
-        self.max_tokens = max_tokens
-        self.system_prompt_tokens = 500  # 預估系統提示詞token數
-        self.context_tokens = 2000       # 預估專利上下文token數  
-        self.response_tokens = 1000      # 預留回應token數
-        self.safety_margin = 1000        # 安全邊界
-        
-        # 可用於對話歷史的token數
+    def __init__(self, max_tokens: Optional[int] = None, response_tokens: int = 1500):
+        self.max_tokens = max_tokens or settings.QWEN_CONTEXT_WINDOW
+        self.system_prompt_tokens = 500  # 預估系統提示詞token數（僅用於狀態查詢）
+        self.context_tokens = 2000       # 預估專利上下文token數（僅用於狀態查詢）
+        self.response_tokens = response_tokens  # 預留回應token數（即問答請求的max_tokens）
+        self.safety_margin = settings.TOKEN_BUDGET_SAFETY_MARGIN
+        self.history_drop_block = settings.QA_HISTORY_DROP_BLOCK  # 捨棄舊對話時一次捨棄的輪數
+        
+        # 未指定實際提示詞時可用於對話歷史的token數
         self.available_history_tokens = (
             self.max_tokens - 
             self.system_prompt_tokens - 
@@ -35,52 +42,93 @@ class ConversationManager:
         )
     
     def estimate_tokens(self, text: str) -> int:
-        """估算文本token數量（簡化方法）"""
-        # 中文約1.5個字符=1個token，英文約4個字符=1個token
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_chars = len(text) - chinese_chars
-        
-        estimated_tokens = (chinese_chars / 1.5) + (english_chars / 4)
-        return int(estimated_tokens * 1.2)  # 加20%安全邊界
+        """文本token數（已載入Qwen分詞器時為實際值，否則粗估）"""
+        return token_budget.count(text)
     
-    def trim_conversation_history(self, history: List[Dict]) -> List[Dict]:
-        """修剪對話歷史以適應token限制"""
+    def trim_conversation_history(self, history: List[Dict], available_tokens: Optional[int] = None) -> List[Dict]:
+        """
+        修剪對話歷史以適應token限制（available_tokens 未指定時使用預估值）
+        需捨棄舊對話時，保留起點對齊 history_drop_block 的倍數：起點只會跳躍式後移，
+        之後數輪的對話前綴維持不變，模型伺服器的前綴快取才能沿用
+        """
         if not history:
             return []
         
-        trimmed_history = []
-        current_tokens = 0
+        budget = self.available_history_tokens if available_tokens is None else available_tokens
+        # 每輪為一則user與一則assistant訊息
+        costs = [
+            self.estimate_tokens(item.get('question', '')) +
+            self.estimate_tokens(item.get('answer', '')) +
+            2 * token_budget.MESSAGE_OVERHEAD
+            for item in history
+        ]
         
         # 從最新的對話開始往前添加
-        for item in reversed(history):
-            question_tokens = self.estimate_tokens(item.get('question', ''))
-            answer_tokens = self.estimate_tokens(item.get('answer', ''))
-            total_tokens = question_tokens + answer_tokens
-            
-            if current_tokens + total_tokens <= self.available_history_tokens:
-                current_tokens += total_tokens
-                trimmed_history.insert(0, item)  # 插入到開頭保持順序
-            else:
-                break
+        start = len(history)
+        current_tokens = 0
+        while start > 0 and current_tokens + costs[start - 1] <= budget:
+            start -= 1
+            current_tokens += costs[start]
         
-        logger.info(f"對話歷史修剪: 保留 {len(trimmed_history)}/{len(history)} 輪對話，約 {current_tokens} tokens")
+        block = self.history_drop_block
+        if 0 < start and block > 1:
+            aligned = -(-start // block) * block
+            if aligned < len(history):
+                start = aligned
+                current_tokens = sum(costs[start:])
+        
+        trimmed_history = history[start:]
+        logger.info(f"對話歷史修剪: 保留 {len(trimmed_history)}/{len(history)} 輪對話，{current_tokens}/{max(budget, 0)} tokens")
         return trimmed_history
     
+    @staticmethod
+    def build_turn_message(context: str, current_question: str) -> str:
+        """本輪的user訊息：本輪參考資料（依問題而變）接在問題之前，放在訊息列表最後"""
+        if not context:
+            return current_question
+        return f"本輪參考資料：\n{context}\n\n{current_question}"
+    
     def build_messages_with_history(self, 
                                   system_prompt: str,
                                   context: str, 
                                   current_question: str,
-                                  history: List[Dict]) -> List[Dict]:
-        """構建包含對話歷史的messages"""
+                                  history: List[Dict],
+                                  session_digest: str = "") -> List[Dict]:
+        """
+        構建包含對話歷史的messages，排列為「固定前綴 + 本輪內容」：
+        系統提示詞與本會話專利清單（session_digest）→ 先前各輪對話 → 本輪參考資料與問題
+        前兩段在同一會話的各輪之間不變（僅追加），模型伺服器可沿用前綴/KV快取，只需計算新增部分
+        """
+        system_content = system_prompt
+        if session_digest:
+            system_content += f"\n\n本會話的專利檢索結果：\n{session_digest}"
+        turn_content = self.build_turn_message(context, current_question)
+        
+        fixed_tokens = (
+            self.estimate_tokens(system_content) +
+            2 * token_budget.MESSAGE_OVERHEAD +
+            token_budget.REPLY_PRIMING +
+            self.response_tokens +
+            self.safety_margin
+        )
+        available = self.max_tokens - fixed_tokens - self.estimate_tokens(turn_content)
+        
+        if available < 0:
+            # 本輪參考資料超過上下文長度：只截斷最後一則訊息（不影響前綴），不保留對話歷史
+            context_budget = max(self.estimate_tokens(context) + available, 0)
+            logger.warning(f"⚠️ 本輪參考資料超過上下文長度，截斷至 {context_budget} tokens")
+            turn_content = self.build_turn_message(token_budget.truncate(context, context_budget), current_question)
+            available = 0
+        
         messages = [
             {
                 "role": "system",
-                "content": system_prompt + f"\n\n專利檢索結果：\n{context}"
+                "content": system_content
             }
         ]
         
         # 添加修剪後的對話歷史
-        trimmed_history = self.trim_conversation_history(history)
+        trimmed_history = self.trim_conversation_history(history, available)
         
         for item in trimmed_history:
             messages.append({
@@ -92,10 +140,10 @@ class ConversationManager:
                 "content": item['answer']
             })
         
-        # 添加當前問題
+        # 添加本輪參考資料與問題
         messages.append({
             "role": "user",
-            "content": current_question
+            "content": turn_content
         })
         
         return messages
@@ -103,17 +151,42 @@ class ConversationManager:
 class EnhancedPatentQAService:
     """增強版專利問答服務 - 支持對話記憶和多重搜尋結果"""
     
+    # 系統提示詞（固定不變，為每個問答請求前綴的開頭）
+    QA_SYSTEM_PROMPT = """你是一個專業的專利檢索助手。你能夠記住我們之前的對話內容，並基於檢索結果和對話歷史來回答問題。
+
+回答要求：
+1. 用繁體中文回答
+2. 基於提供的專利檢索結果回答問題；下方清單為本會話的全部檢索結果，每輪問題前的「本輪參考資料」為本題相關專利的詳細內容
+3. 如果用戶問到特定專利（如"第3筆專利"），請根據序號找到對應的專利資料
+4. 如果涉及翻譯，請提供準確的中英文對照
+5. 如果是技術分析，請聚焦於技術特徵和功效
+6. 記住我們之前討論的內容，可以參考前面的對話
+7. 回答要簡潔明確，避免冗長
+8. 如果用戶問題超出檢索結果範圍，請說明無法回答的原因"""
+    
     def __init__(self):
-        self.qwen_api_url = settings.QWEN_API_URL
+        self.endpoint_pool = qwen_endpoint_pool  # 與QwenAPIService共用端點池（QWEN_API_URLS / QWEN_API_URL）
+        self.qwen_api_url = self.endpoint_pool.describe()
         self.qwen_model = settings.QWEN_MODEL
         self.session = None
-        self.conversation_manager = ConversationManager(max_tokens=128000)
+        self.conversation_manager = ConversationManager()
         
         # 會話對話緩存（內存中）
         self.session_conversations = {}
         
+        # 前綴重用統計：各會話上一個請求的訊息雜湊（與本次請求開頭相同的訊息可沿用伺服器前綴快取）
+        self._previous_message_hashes: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.prefix_stats = {
+            'requests': 0,
+            'follow_up_requests': 0,
+            'prompt_tokens': 0,
+            'reusable_prefix_tokens': 0,
+            'follow_up_prompt_tokens': 0
+        }
+        
     async def initialize(self):
         """初始化HTTP會話"""
+        await token_budget.ensure_loaded()
         if self.session is None:
             timeout = aiohttp.ClientTimeout(total=120.0)
             self.session = aiohttp.ClientSession(timeout=timeout)
@@ -147,125 +220,41 @@ class EnhancedPatentQAService:
             logger.info(f"🤖 處理問答請求（記憶模式: {use_memory}）: {session_id}")
             logger.info(f"❓ 問題: {question}")
 
-            # 🆕 檢查可用的搜尋類型
-            available_types = await DatabaseManager.get_available_search_types(session_id)
-
-            if not available_types:
-                return {
-                    'success': True,
-                    'answer': self._generate_no_search_results_response(question),
-                    'context_info': {
-                        'memory_enabled': use_memory,
-                        'has_search_cache': False,
-                        'search_results_count': 0,
-                        'available_search_types': [],
-                        'response_type': 'no_search_data_guidance'
-                    },
-                    'session_id': session_id
-                }
-        
-            # 🆕 智能判斷用戶想詢問哪種搜尋結果
-            target_search_type = self._determine_target_search_type(question, available_types)
-
-            # 🆕 獲取對應的搜尋結果
-            if target_search_type:
-                context_patents = await DatabaseManager.get_cached_search_results_by_type(
-                    session_id, target_search_type
-                )
-            else:
-                # 如果無法判斷，獲取所有結果
-                context_patents = await DatabaseManager.get_cached_search_results_by_type(session_id)
-
-            if not context_patents:
-                return {
-                    'success': False,
-                    'answer': '抱歉，沒有找到相關的專利數據。請先進行專利檢索。',
-                    'error': 'No cached patents found'
-                }
-
-            # 獲取對話歷史
-            conversation_history = []
-            if use_memory:
-                # 先從內存緩存獲取
-                if session_id in self.session_conversations:
-                    conversation_history = self.session_conversations[session_id]
-                else:
-                    # 從數據庫獲取
-                    db_history = await DatabaseManager.get_qa_history(session_id, limit=20)
-                    conversation_history = db_history
-                    # 緩存到內存
-                    self.session_conversations[session_id] = conversation_history
-
-            # 解析問題，確定需要引用的專利
-            referenced_patents = self._extract_patent_references(question, context_patents)
-
-            # 🆕 構建多重搜尋上下文
-            context = self._build_multi_search_context(
-                question, context_patents, referenced_patents, target_search_type
-            )
-
-            # 🆕 增強問題，加入搜尋類型信息
-            enhanced_question = self._enhance_question_with_search_info(
-                question, available_types, target_search_type, len(context_patents)
-            )
+            prepared = await self._prepare_question(session_id, question, use_memory)
+            if 'early_result' in prepared:
+                return prepared['early_result']
 
             # 調用QWEN API（包含對話歷史）
             if not self.session:
                 await self.initialize()
 
             answer = await self._call_qwen_api_with_memory(
-                enhanced_question, 
-                context, 
-                conversation_history if use_memory else []
-            )
-
-            # 🆕 在回答後加入搜尋來源說明
-            answer_with_source = self._add_source_info_to_answer(
-                answer, available_types, target_search_type, len(context_patents)
-            )
-
-            execution_time = time.time() - start_time
-
-            # 保存問答歷史到數據庫
-            await DatabaseManager.save_qa_history(
+                prepared['enhanced_question'], 
+                prepared['context'], 
+                prepared['conversation_history'] if use_memory else [],
                 session_id=session_id,
-                question=question,
-                answer=answer_with_source,
-                referenced_patents=referenced_patents,
-                execution_time=execution_time
+                session_digest=prepared['session_digest']
             )
 
-            # 更新內存緩存
-            if use_memory:
-                if session_id not in self.session_conversations:
-                    self.session_conversations[session_id] = []
-
-                self.session_conversations[session_id].append({
-                    'question': question,
-                    'answer': answer_with_source,
-                    'referenced_patents': referenced_patents,
-                    'created_at': datetime.now().isoformat()
-                })
-
-                # 限制內存緩存大小
-                if len(self.session_conversations[session_id]) > 50:
-                    self.session_conversations[session_id] = self.session_conversations[session_id][-30:]
+            answer_with_source, execution_time = await self._finalize_answer(
+                session_id, question, answer, prepared, use_memory, start_time
+            )
 
             logger.info(f"✅ 問答完成（使用記憶: {use_memory}），耗時: {execution_time:.2f}秒")
 
             return {
                 'success': True,
                 'answer': answer_with_source,
-                'referenced_patents': referenced_patents,
+                'referenced_patents': prepared['referenced_patents'],
                 'execution_time': execution_time,
-                'context_patent_count': len(context_patents),
-                'conversation_history_used': len(conversation_history) if use_memory else 0,
+                'context_patent_count': len(prepared['context_patents']),
+                'conversation_history_used': len(prepared['conversation_history']) if use_memory else 0,
                 'memory_enabled': use_memory,
                 # 🆕 新增多重搜尋相關信息
                 'context_info': {
-                    'available_search_types': available_types,
-                    'target_search_type': target_search_type,
-                    'search_results_count': len(context_patents),
+                    'available_search_types': prepared['available_types'],
+                    'target_search_type': prepared['target_search_type'],
+                    'search_results_count': len(prepared['context_patents']),
                     'response_type': 'normal'
                 }
             }
@@ -278,78 +267,415 @@ class EnhancedPatentQAService:
                 'error': str(e)
             }
 
+    async def answer_question_with_memory_stream(
+        self,
+        session_id: str,
+        question: str,
+        use_memory: bool = True
+    ) -> AsyncIterator[Dict]:
+        """
+        串流版問答：邊生成邊回傳，依序產生事件
+        - {'type': 'start'}：上下文資訊（開始生成前）
+        - {'type': 'delta', 'content': 文字片段}：模型逐段輸出
+        - {'type': 'done', 'answer': 完整回答（含來源說明）, ...}
+        - {'type': 'error', 'answer': 錯誤訊息, 'error': ...}
+        完整回答於串流結束後保存到QAHistory並更新內存對話歷史；串流中斷時不保存
+        """
+        start_time = time.time()
+
+        try:
+            logger.info(f"🤖 處理串流問答請求（記憶模式: {use_memory}）: {session_id}")
+            logger.info(f"❓ 問題: {question}")
+
+            prepared = await self._prepare_question(session_id, question, use_memory)
+            if 'early_result' in prepared:
+                result = prepared['early_result']
+                yield {'type': 'done' if result.get('success') else 'error', **result}
+                return
+
+            if not self.session:
+                await self.initialize()
+
+            yield {
+                'type': 'start',
+                'session_id': session_id,
+                'referenced_patents': prepared['referenced_patents'],
+                'context_info': {
+                    'available_search_types': prepared['available_types'],
+                    'target_search_type': prepared['target_search_type'],
+                    'search_results_count': len(prepared['context_patents']),
+                    'conversation_history_used': len(prepared['conversation_history']) if use_memory else 0,
+                    'memory_enabled': use_memory
+                }
+            }
+
+            parts = []
+            time_to_first_token = None
+            async with aclosing(self._stream_qwen_api_with_memory(
+                prepared['enhanced_question'],
+                prepared['context'],
+                prepared['conversation_history'] if use_memory else [],
+                session_id=session_id,
+                session_digest=prepared['session_digest']
+            )) as stream:
+                async for content in stream:
+                    if time_to_first_token is None:
+                        time_to_first_token = time.time() - start_time
+                        logger.info(f"⚡ 串流問答首個token: {time_to_first_token:.2f}秒")
+                    parts.append(content)
+                    yield {'type': 'delta', 'content': content}
+
+            answer = ''.join(parts)
+            if not answer.strip():
+                raise Exception("AI回應為空")
+
+            answer_with_source, execution_time = await self._finalize_answer(
+                session_id, question, answer, prepared, use_memory, start_time
+            )
+            # 來源說明接在回答之後，以最後一段文字送出
+            if len(answer_with_source) > len(answer):
+                yield {'type': 'delta', 'content': answer_with_source[len(answer):]}
+
+            logger.info(f"✅ 串流問答完成（使用記憶: {use_memory}），耗時: {execution_time:.2f}秒")
+
+            yield {
+                'type': 'done',
+                'success': True,
+                'answer': answer_with_source,
+                'referenced_patents': prepared['referenced_patents'],
+                'execution_time': execution_time,
+                'time_to_first_token': time_to_first_token,
+                'context_patent_count': len(prepared['context_patents']),
+                'conversation_history_used': len(prepared['conversation_history']) if use_memory else 0,
+                'memory_enabled': use_memory
+            }
+
+        except Exception as e:
+            logger.error(f"❌ 串流問答處理失敗: {e}")
+            yield {
+                'type': 'error',
+                'success': False,
+                'answer': '抱歉，處理您的問題時發生錯誤，請稍後再試。',
+                'error': str(e)
+            }
+
+    async def _prepare_question(self, session_id: str, question: str, use_memory: bool) -> Dict:
+        """
+        問答前置處理：取得搜尋結果、對話歷史並構建上下文（一般與串流問答共用）
+        無法回答時回傳 {'early_result': 回應}
+        """
+        # 🆕 檢查可用的搜尋類型
+        available_types = await DatabaseManager.get_available_search_types(session_id)
+
+        if not available_types:
+            return {'early_result': {
+                'success': True,
+                'answer': self._generate_no_search_results_response(question),
+                'context_info': {
+                    'memory_enabled': use_memory,
+                    'has_search_cache': False,
+                    'search_results_count': 0,
+                    'available_search_types': [],
+                    'response_type': 'no_search_data_guidance'
+                },
+                'session_id': session_id
+            }}
+
+        # 🆕 智能判斷用戶想詢問哪種搜尋結果
+        target_search_type = self._determine_target_search_type(question, available_types)
+
+        # 🆕 獲取本會話所有搜尋結果（依搜尋類型、序號排序），再篩選出對應類型
+        session_patents = await DatabaseManager.get_cached_search_results_by_type(session_id)
+        if target_search_type:
+            context_patents = [
+                patent for patent in session_patents
+                if patent.get('_search_type') == target_search_type
+            ]
+        else:
+            # 如果無法判斷，使用所有結果
+            context_patents = session_patents
+
+        if not context_patents:
+            return {'early_result': {
+                'success': False,
+                'answer': '抱歉，沒有找到相關的專利數據。請先進行專利檢索。',
+                'error': 'No cached patents found'
+            }}
+
+        # 獲取對話歷史
+        conversation_history = []
+        if use_memory:
+            # 先從內存緩存獲取
+            if session_id in self.session_conversations:
+                conversation_history = self.session_conversations[session_id]
+            else:
+                # 從數據庫獲取
+                db_history = await DatabaseManager.get_qa_history(session_id, limit=20)
+                conversation_history = db_history
+                # 緩存到內存
+                self.session_conversations[session_id] = conversation_history
+
+        # 解析問題，確定需要引用的專利
+        referenced_patents = self._extract_patent_references(question, context_patents)
+
+        # 🆕 構建多重搜尋上下文
+        context = self._build_multi_search_context(
+            question, context_patents, referenced_patents, target_search_type
+        )
+
+        # 🆕 增強問題，加入搜尋類型信息
+        enhanced_question = self._enhance_question_with_search_info(
+            question, available_types, target_search_type, len(context_patents)
+        )
+
+        # 本會話專利清單：只隨檢索結果改變，放在系統訊息中作為各輪共用的前綴
+        session_digest = self._build_session_digest(session_patents)
+
+        return {
+            'available_types': available_types,
+            'target_search_type': target_search_type,
+            'context_patents': context_patents,
+            'conversation_history': conversation_history,
+            'referenced_patents': referenced_patents,
+            'context': context,
+            'session_digest': session_digest,
+            'enhanced_question': enhanced_question
+        }
+
+    async def _finalize_answer(
+        self,
+        session_id: str,
+        question: str,
+        answer: str,
+        prepared: Dict,
+        use_memory: bool,
+        start_time: float
+    ):
+        """加入搜尋來源說明、保存問答歷史並更新內存緩存，回傳（完整回答, 耗時）"""
+        # 🆕 在回答後加入搜尋來源說明
+        answer_with_source = self._add_source_info_to_answer(
+            answer, prepared['available_types'], prepared['target_search_type'], len(prepared['context_patents'])
+        )
+
+        execution_time = time.time() - start_time
+
+        # 保存問答歷史到數據庫
+        await DatabaseManager.save_qa_history(
+            session_id=session_id,
+            question=question,
+            answer=answer_with_source,
+            referenced_patents=prepared['referenced_patents'],
+            execution_time=execution_time
+        )
+
+        # 更新內存緩存
+        if use_memory:
+            if session_id not in self.session_conversations:
+                self.session_conversations[session_id] = []
+
+            self.session_conversations[session_id].append({
+                'question': question,
+                'answer': answer_with_source,
+                'referenced_patents': prepared['referenced_patents'],
+                'created_at': datetime.now().isoformat()
+            })
+
+            # 限制內存緩存大小
+            if len(self.session_conversations[session_id]) > 50:
+                self.session_conversations[session_id] = self.session_conversations[session_id][-30:]
+
+        return answer_with_source, execution_time
+
+    def _build_qa_payload(
+        self,
+        question: str,
+        context: str,
+        conversation_history: List[Dict],
+        stream: bool = False,
+        session_digest: str = "",
+        session_id: Optional[str] = None
+    ) -> Dict:
+        """構建問答請求的payload（一般與串流問答共用）"""
+        # 使用對話管理器構建包含歷史的messages（固定前綴在前，本輪參考資料與問題在最後）
+        messages = self.conversation_manager.build_messages_with_history(
+            system_prompt=self.QA_SYSTEM_PROMPT,
+            context=context,
+            current_question=question,
+            history=conversation_history,
+            session_digest=session_digest
+        )
+        
+        # 輸入token數用於日誌
+        prompt_tokens = token_budget.count_messages(messages)
+        reusable_tokens = self._record_prefix_reuse(session_id, messages, prompt_tokens)
+        logger.info(f"📊 輸入token數: {prompt_tokens}/{self.conversation_manager.max_tokens}（可沿用前綴 {reusable_tokens}）")
+        
+        payload = {
+            "model": self.qwen_model,
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": token_budget.fit_max_tokens(messages, self.conversation_manager.response_tokens),
+            "stream": stream
+        }
+        return payload
+
+    def _record_prefix_reuse(self, session_id: Optional[str], messages: List[Dict], prompt_tokens: int) -> int:
+        """
+        與同一會話上一個請求比較，回傳開頭相同訊息的token數（模型伺服器前綴快取可沿用的部分）
+        """
+        hashes = [
+            hashlib.sha1(f"{message['role']}\0{message['content']}".encode('utf-8')).hexdigest()
+            for message in messages
+        ]
+        self.prefix_stats['requests'] += 1
+        self.prefix_stats['prompt_tokens'] += prompt_tokens
+        if not session_id:
+            return 0
+
+        reusable_tokens = 0
+        previous = self._previous_message_hashes.pop(session_id, None)
+        if previous is not None:
+            for message, current_hash, previous_hash in zip(messages, hashes, previous):
+                if current_hash != previous_hash:
+                    break
+                reusable_tokens += token_budget.count(message['content']) + token_budget.MESSAGE_OVERHEAD
+            self.prefix_stats['follow_up_requests'] += 1
+            self.prefix_stats['follow_up_prompt_tokens'] += prompt_tokens
+            self.prefix_stats['reusable_prefix_tokens'] += reusable_tokens
+
+        self._previous_message_hashes[session_id] = hashes
+        while len(self._previous_message_hashes) > settings.QA_PREFIX_STATS_SESSIONS:
+            self._previous_message_hashes.popitem(last=False)
+        return reusable_tokens
+
     async def _call_qwen_api_with_memory(
         self, 
         question: str, 
         context: str,
-        conversation_history: List[Dict]
+        conversation_history: List[Dict],
+        session_id: Optional[str] = None,
+        session_digest: str = ""
     ) -> str:
-        """調用QWEN API並包含對話歷史"""
+        """調用QWEN API並包含對話歷史（session_id用於排程的會話公平排隊）"""
         try:
-            # 構建系統提示詞
-            system_prompt = """你是一個專業的專利檢索助手。你能夠記住我們之前的對話內容，並基於檢索結果和對話歷史來回答問題。
-
-回答要求：
-1. 用繁體中文回答
-2. 基於提供的專利檢索結果回答問題
-3. 如果用戶問到特定專利（如"第3筆專利"），請根據序號找到對應的專利資料
-4. 如果涉及翻譯，請提供準確的中英文對照
-5. 如果是技術分析，請聚焦於技術特徵和功效
-6. 記住我們之前討論的內容，可以參考前面的對話
-7. 回答要簡潔明確，避免冗長
-8. 如果用戶問題超出檢索結果範圍，請說明無法回答的原因"""
-
-            # 使用對話管理器構建包含歷史的messages
-            messages = self.conversation_manager.build_messages_with_history(
-                system_prompt=system_prompt,
-                context=context,
-                current_question=question,
-                history=conversation_history
-            )
-            
-            # 估算總token數用於日誌
-            total_estimated_tokens = sum(
-                self.conversation_manager.estimate_tokens(str(msg)) 
-                for msg in messages
+            payload = self._build_qa_payload(
+                question, context, conversation_history,
+                session_digest=session_digest, session_id=session_id
             )
-            logger.info(f"📊 預估總token數: {total_estimated_tokens}/128000")
-            
-            payload = {
-                "model": self.qwen_model,
-                "messages": messages,
-                "temperature": 0.3,
-                "max_tokens": 1500,  # 增加最大回應長度
-                "stream": False
-            }
             
-            async with self.session.post(
-                f"{self.qwen_api_url}/v1/chat/completions",
-                json=payload,
-                headers={'Content-Type': 'application/json'}
-            ) as response:
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if 'choices' in data and len(data['choices']) > 0:
-                        answer = data['choices'][0]['message']['content']
-                        
-                        # 記錄實際使用的token數
-                        usage = data.get('usage', {})
-                        actual_tokens = usage.get('total_tokens', 0)
-                        logger.info(f"📊 實際使用token數: {actual_tokens}")
-                        
-                        return answer
-                    else:
-                        return "抱歉，AI回應格式異常，請稍後再試。"
-                else:
-                    error_text = await response.text()
-                    logger.error(f"QWEN API錯誤: {response.status} - {error_text}")
-                    return "抱歉，AI服務暫時不可用，請稍後再試。"
+            # 與技術特徵、關鍵字生成共用同一個排程器（問答為互動優先權，不排在批量工作之後）
+            # 端點由端點池依最少進行中請求選定（與QwenAPIService共用）
+            async with llm_scheduler.slot(PRIORITY_INTERACTIVE, session_id) as ticket, \
+                    self.endpoint_pool.lease() as lease:
+                try:
+                    async with self.session.post(
+                        f"{lease.url}/v1/chat/completions",
+                        json=payload,
+                        headers={'Content-Type': 'application/json'}
+                    ) as response:
+
+                        if response.status == 200:
+                            data = await response.json()
+                            lease.succeeded()
+                            if 'choices' in data and len(data['choices']) > 0:
+                                answer = data['choices'][0]['message']['content']
+
+                                # 記錄實際使用的token數
+                                usage = data.get('usage', {})
+                                ticket.succeeded(usage.get('completion_tokens'))
+                                actual_tokens = usage.get('total_tokens', 0)
+                                logger.info(f"📊 實際使用token數: {actual_tokens}")
+
+                                return answer
+                            else:
+                                return "抱歉，AI回應格式異常，請稍後再試。"
+                        else:
+                            if response.status == 429 or response.status >= 500:
+                                ticket.overloaded('429' if response.status == 429 else '5xx')
+                                lease.failed('429' if response.status == 429 else '5xx')
+                            error_text = await response.text()
+                            logger.error(f"QWEN API錯誤: {response.status} - {error_text}（{lease.url}）")
+                            return "抱歉，AI服務暫時不可用，請稍後再試。"
+
+                except asyncio.TimeoutError:
+                    ticket.overloaded('timeout')
+                    raise
+                except aiohttp.ClientError:
+                    ticket.overloaded('connection')
+                    raise
                     
         except Exception as e:
             logger.error(f"調用QWEN API失敗: {e}")
             return "抱歉，處理您的問題時發生錯誤，請稍後再試。"
     
+    async def _stream_qwen_api_with_memory(
+        self,
+        question: str,
+        context: str,
+        conversation_history: List[Dict],
+        session_id: Optional[str] = None,
+        session_digest: str = ""
+    ) -> AsyncIterator[str]:
+        """以OpenAI相容的SSE串流調用QWEN API，逐段產生回答文字；失敗時拋出Exception"""
+        payload = self._build_qa_payload(
+            question, context, conversation_history, stream=True,
+            session_digest=session_digest, session_id=session_id
+        )
+
+        async with llm_scheduler.slot(PRIORITY_INTERACTIVE, session_id) as ticket, \
+                self.endpoint_pool.lease() as lease:
+            try:
+                async with self.session.post(
+                    f"{lease.url}/v1/chat/completions",
+                    json=payload,
+                    headers={'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+                ) as response:
+
+                    if response.status != 200:
+                        if response.status == 429 or response.status >= 500:
+                            ticket.overloaded('429' if response.status == 429 else '5xx')
+                            lease.failed('429' if response.status == 429 else '5xx')
+                        else:
+                            lease.ignored()
+                        error_text = await response.text()
+                        logger.error(f"QWEN API錯誤: {response.status} - {error_text}（{lease.url}）")
+                        raise Exception(f"AI服務暫時不可用（HTTP {response.status}）")
+
+                    chunks = 0
+                    usage = {}
+                    # 每個事件為一行 "data: {...}"，以 "data: [DONE]" 結束
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line.startswith(b'data:'):
+                            continue
+                        data = line[5:].strip()
+                        if data == b'[DONE]':
+                            break
+                        try:
+                            event = json.loads(data)
+                        except ValueError:
+                            logger.warning(f"無法解析的串流事件: {data[:100]!r}")
+                            continue
+
+                        usage = event.get('usage') or usage
+                        for choice in event.get('choices') or []:
+                            content = (choice.get('delta') or {}).get('content')
+                            if content:
+                                chunks += 1
+                                yield content
+
+                    # 伺服器未回傳usage時以片段數估算輸出token數
+                    ticket.succeeded(usage.get('completion_tokens') or chunks)
+                    lease.succeeded()
+                    logger.info(f"📊 串流回答完成，輸出片段: {chunks}，使用token數: {usage.get('total_tokens', 'N/A')}")
+
+            except asyncio.TimeoutError:
+                ticket.overloaded('timeout')
+                raise
+            except aiohttp.ClientError:
+                ticket.overloaded('connection')
+                raise
+
     def _extract_patent_references(self, question: str, patents: List[Dict]) -> List[int]:
         """從問題中提取專利引用"""
         referenced_patents = []
@@ -397,7 +723,9 @@ class EnhancedPatentQAService:
         # 截取摘要
         abstract = patent.get('摘要', '')
         if abstract and abstract != 'N/A':
-            abstract_short = abstract[:800] + "..." if len(abstract) > 800 else abstract
+            abstract_short = token_budget.truncate(abstract, settings.QA_CONTEXT_ABSTRACT_TOKENS)
+            if len(abstract_short) < len(abstract):
+                abstract_short += "..."
             formatted += f"- 摘要：{abstract_short}\n"
         
         # 技術特徵
@@ -412,6 +740,42 @@ class EnhancedPatentQAService:
         
         return formatted
     
+    def _build_session_digest(self, patents: List[Dict]) -> str:
+        """
+        本會話專利清單（依搜尋類型分組，序號為類型內序號），每筆一行：名稱、公開公告號、申請人、國家與前幾項技術特徵
+        內容只由檢索結果決定，同一批結果每輪產生相同字串；超過 QA_SESSION_DIGEST_TOKENS 時截斷
+        """
+        if not patents:
+            return ""
+
+        max_features = settings.QA_SESSION_DIGEST_FEATURES
+        lines = []
+        current_type = None
+        sequence = 0
+        for patent in patents:
+            search_type = patent.get('_search_type', 'unknown')
+            if search_type != current_type:
+                current_type = search_type
+                sequence = 0
+                type_count = sum(1 for item in patents if item.get('_search_type', 'unknown') == search_type)
+                lines.append(f"=== {self._get_search_type_display_name(search_type)}結果 ({type_count}筆) ===")
+            sequence += 1
+
+            line = (f"{sequence}. {patent.get('專利名稱', 'N/A')}（{patent.get('公開公告號', 'N/A')}）"
+                    f"；申請人：{patent.get('申請人', 'N/A')}；國家：{patent.get('國家', 'N/A')}")
+            features = patent.get('技術特徵') or []
+            if features and max_features > 0:
+                line += f"；技術特徵：{'; '.join(features[:max_features])}"
+            lines.append(line)
+
+        digest = '\n'.join(lines)
+        truncated = token_budget.truncate(digest, settings.QA_SESSION_DIGEST_TOKENS)
+        if len(truncated) < len(digest):
+            # 只保留完整的行
+            truncated = truncated[:max(truncated.rfind('\n'), 0)]
+            truncated += "\n...（清單過長已截斷，其餘專利請以序號詢問）"
+        return truncated
+
     def _format_patent_brief(self, patent: Dict, sequence: int) -> str:
         """格式化專利簡要信息"""
         title = patent.get('專利名稱', 'N/A')
@@ -475,6 +839,7 @@ class EnhancedPatentQAService:
             # 清除內存緩存
             if session_id in self.session_conversations:
                 del self.session_conversations[session_id]
+            self._previous_message_hashes.pop(session_id, None)
             
             logger.info(f"已清除會話 {session_id} 的對話記憶")
             return True
@@ -483,6 +848,27 @@ class EnhancedPatentQAService:
             logger.error(f"清除對話記憶失敗: {e}")
             return False
 
+    def get_service_stats(self) -> Dict:
+        """問答服務統計（含提示詞前綴重用情況）"""
+        stats = self.prefix_stats
+        follow_up_tokens = stats['follow_up_prompt_tokens']
+        reuse_rate = (stats['reusable_prefix_tokens'] / follow_up_tokens * 100) if follow_up_tokens else 0
+        return {
+            'model': self.qwen_model,
+            'active_sessions': len(self.session_conversations),
+            'context_window': self.conversation_manager.max_tokens,
+            'response_tokens': self.conversation_manager.response_tokens,
+            'history_drop_block': self.conversation_manager.history_drop_block,
+            'endpoints': self.endpoint_pool.urls,
+            'session_digest_tokens': settings.QA_SESSION_DIGEST_TOKENS,
+            'requests': stats['requests'],
+            'follow_up_requests': stats['follow_up_requests'],
+            'avg_prompt_tokens': round(stats['prompt_tokens'] / stats['requests']) if stats['requests'] else 0,
+            'reusable_prefix_tokens': stats['reusable_prefix_tokens'],
+            'prefix_reuse_rate': f"{reuse_rate:.1f}%",
+            'token_budget': token_budget.get_stats()
+        }
+
     # 🆕 =============== 多重搜尋結果支援方法 ===============
 
     def _determine_target_search_type(self, question: str, available_types: List[str]) -> str:
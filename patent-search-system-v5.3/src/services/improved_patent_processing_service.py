@@ -4,11 +4,21 @@ import asyncio
 import logging
 import json
 import time
-from typing import List, Dict, Optional, Any
+from contextlib import aclosing
+from typing import Awaitable, Callable, List, Dict, Optional, Any
 from datetime import datetime
 from dataclasses import dataclass
 from src.ai_services.qwen_service import QwenAPIService
 from src.ai_services.gpss_service import GPSSAPIService
+from src.ai_services.patent_record import PatentRecord, build_patent_link
+from src.ai_services.api_key_cache import KeyVerificationUnavailable, verified_key_cache
+from src.ai_services.patent_dedup import (
+    application_key, cluster_duplicate_patents, content_key, copy_features_to_members, mark_clusters
+)
+from src.ai_services.tech_feature_cache import TechFeatureCache
+from src.ai_services.keyword_cache import KeywordGenerationCache
+from src.ai_services.llm_scheduler import PRIORITY_BULK, PRIORITY_STANDARD, llm_request_context
+from src.services.search_prefetch import SearchPrefetcher
 from src.config import settings
 import pandas as pd
 from io import BytesIO
@@ -17,6 +27,9 @@ from typing import BinaryIO
 
 logger = logging.getLogger(__name__)
 
+# process_chunk(patents, start_index, priority)：處理一批專利並回傳結果
+ChunkProcessor = Callable[[List[PatentRecord], int, Optional[str]], Awaitable[List[PatentRecord]]]
+
 @dataclass
 class PatentProcessingResult:
     success: bool
@@ -27,19 +40,19 @@ class PatentProcessingResult:
     error: str = ""
 
 class ImprovedPatentProcessingService:
-    BATCH_SIZE = 30
-    BATCH_DELAY = 0.1
-    MAX_CONCURRENT_REQUESTS = 16
-    REQUEST_DELAY = 0.2
+    MAX_CONCURRENT_REQUESTS = 16  # 單一工作同時處理中的專利數；Qwen實際並行數與先後由排程器決定
     MAX_RETRIES = 3
     RETRY_DELAY = 1.0
     
     def __init__(self):
         self.qwen_service = None
         self.gpss_service = None
+        self.feature_cache = None
+        self.keyword_cache = None
         self.initialized = False
-        self.verified_api_keys = set()
-        self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        self.api_key_cache = verified_key_cache
+        self.search_prefetcher = SearchPrefetcher()
+        self.dedup_stats = {'patents': 0, 'clusters': 0, 'llm_calls_saved': 0}
         
     async def initialize(self):
         """初始化所有AI服務"""
@@ -50,9 +63,27 @@ class ImprovedPatentProcessingService:
             logger.info("🚀 開始初始化專利處理服務（修復申請人和國家版本）...")
             
             # 初始化Qwen服務
-            self.qwen_service = QwenAPIService(settings.QWEN_API_URL)
+            self.qwen_service = QwenAPIService()
             await self.qwen_service.initialize()
             logger.info("✅ Qwen初始化成功")
+
+            # 技術特徵快取（提示詞版本變更時清除舊版資料）
+            if settings.TECH_FEATURE_CACHE_ENABLED:
+                self.feature_cache = TechFeatureCache(
+                    model_name=self.qwen_service.model_name,
+                    prompt_version=self.qwen_service.tech_features_prompt_version()
+                )
+                await self.feature_cache.purge_stale_versions()
+                logger.info(f"✅ 技術特徵快取已啟用（提示詞版本 {self.feature_cache.prompt_version}）")
+
+            # 關鍵字/同義詞生成快取（載入近期資料重建近似比對索引）
+            if settings.KEYWORD_CACHE_ENABLED:
+                self.keyword_cache = KeywordGenerationCache(
+                    model_name=self.qwen_service.model_name,
+                    prompt_version=self.qwen_service.keyword_prompt_version()
+                )
+                await self.keyword_cache.warm()
+                logger.info(f"✅ 關鍵字快取已啟用（提示詞版本 {self.keyword_cache.prompt_version}）")
             
             # 初始化真實GPSS服務
             self.gpss_service = GPSSAPIService()
@@ -68,6 +99,7 @@ class ImprovedPatentProcessingService:
     
     async def close(self):
         """關閉所有服務"""
+        self.search_prefetcher.close()
         if self.qwen_service:
             await self.qwen_service.close()
         if self.gpss_service:
@@ -75,27 +107,24 @@ class ImprovedPatentProcessingService:
         logger.info("所有服務已關閉")
 
     async def verify_api_key(self, user_code: str) -> bool:
-        """驗證GPSS API密鑰"""
+        """
+        驗證GPSS API密鑰
+        GPSS暫時無法驗證（熔斷、限流等）時拋出KeyVerificationUnavailable，由呼叫端回應503
+        """
         try:
-            if user_code in self.verified_api_keys:
-                return True
-            
             # 基本格式驗證
             if not user_code or len(user_code) < 16:
                 logger.warning("API密鑰格式不正確")
                 return False
             
-            # 使用真實GPSS API測試連接
-            test_result = await self.gpss_service.test_api_connection(user_code)
-            
-            if test_result.get('success', False):
-                self.verified_api_keys.add(user_code)
-                logger.info(f"API密鑰驗證成功: {user_code[:8]}...")
-                return True
-            else:
-                logger.warning(f"API密鑰驗證失敗: {test_result.get('message', 'Unknown error')}")
-                return False
+            # 先查詢跨worker共用的驗證快取，未命中時才以真實GPSS API測試連接
+            return await self.api_key_cache.verify(
+                user_code,
+                lambda: self.gpss_service.test_api_connection(user_code)
+            )
             
+        except KeyVerificationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"API密鑰驗證異常: {e}")
             return False
@@ -120,10 +149,12 @@ class ImprovedPatentProcessingService:
                     error="GPSS API密鑰驗證失敗，請檢查密鑰是否正確"
                 )
             
-            # 步驟2：使用提供的關鍵字搜索專利
-            raw_patents = await self._search_patents_with_keywords(keywords, user_code, max_results)
+            # 步驟2+3：使用提供的關鍵字搜索專利並批次處理（只生成技術特徵，串流解析時邊下載邊處理）
+            processed_patents = await self._search_patents_with_keywords(
+                keywords, user_code, max_results, self._batching_processor(user_code)
+            )
             
-            if not raw_patents:
+            if not processed_patents:
                 return PatentProcessingResult(
                     success=True,
                     results=[],
@@ -136,11 +167,6 @@ class ImprovedPatentProcessingService:
                     }
                 )
             
-            logger.info(f"搜索到 {len(raw_patents)} 筆原始專利")
-            
-            # 步驟3：批次處理專利（只生成技術特徵）
-            processed_patents = await self._process_patents_with_batching(raw_patents)
-            
             # 步驟4：格式化結果（修復版本）
             formatted_results = self._format_search_results_fixed(processed_patents)
             
@@ -160,6 +186,8 @@ class ImprovedPatentProcessingService:
                 }
             )
             
+        except KeyVerificationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"使用關鍵字查詢失敗: {e}")
             return PatentProcessingResult(
@@ -190,12 +218,12 @@ class ImprovedPatentProcessingService:
                     error="GPSS API密鑰驗證失敗，請檢查密鑰是否正確"
                 )
             
-            # 步驟2：使用AND/OR邏輯搜索專利
-            raw_patents = await self._search_patents_with_and_or_logic(
-                user_keywords, ai_keywords, user_code, max_results
+            # 步驟2+3：使用AND/OR邏輯搜索專利並批次處理（串流解析時邊下載邊處理）
+            processed_patents = await self._search_patents_with_and_or_logic(
+                user_keywords, ai_keywords, user_code, max_results, self._batching_processor(user_code)
             )
             
-            if not raw_patents:
+            if not processed_patents:
                 return PatentProcessingResult(
                     success=True,
                     results=[],
@@ -210,11 +238,6 @@ class ImprovedPatentProcessingService:
                     }
                 )
             
-            logger.info(f"✅ AND/OR邏輯搜索到 {len(raw_patents)} 筆原始專利")
-            
-            # 步驟3：批次處理專利
-            processed_patents = await self._process_patents_with_batching(raw_patents)
-            
             # 步驟4：格式化結果（修復版本）
             formatted_results = self._format_search_results_fixed(processed_patents)
             
@@ -236,6 +259,8 @@ class ImprovedPatentProcessingService:
                 }
             )
             
+        except KeyVerificationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"❌ AND/OR邏輯查詢失敗: {e}")
             return PatentProcessingResult(
@@ -262,10 +287,12 @@ class ImprovedPatentProcessingService:
                     error="GPSS API密鑰驗證失敗，請檢查密鑰是否正確"
                 )
             
-            # 步驟2：根據條件搜索專利
-            raw_patents = await self._search_patents_with_conditions(search_params, user_code, max_results)
+            # 步驟2+3：根據條件搜索專利並批次處理（串流解析時邊下載邊處理）
+            processed_patents = await self._search_patents_with_conditions(
+                search_params, user_code, max_results, self._batching_processor(user_code)
+            )
             
-            if not raw_patents:
+            if not processed_patents:
                 return PatentProcessingResult(
                     success=True,
                     results=[],
@@ -277,11 +304,6 @@ class ImprovedPatentProcessingService:
                     }
                 )
             
-            logger.info(f"搜索到 {len(raw_patents)} 筆原始專利")
-            
-            # 步驟3：批次處理專利
-            processed_patents = await self._process_patents_with_batching(raw_patents)
-            
             # 步驟4：格式化結果（修復版本）
             formatted_results = self._format_search_results_fixed(processed_patents)
             
@@ -300,6 +322,8 @@ class ImprovedPatentProcessingService:
                 }
             )
             
+        except KeyVerificationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"條件查詢失敗: {e}")
             return PatentProcessingResult(
@@ -307,61 +331,285 @@ class ImprovedPatentProcessingService:
                 error=f"條件查詢失敗: {str(e)}"
             )
 
+    async def get_patent_details(self, user_code: str, publication_numbers: List[str]) -> PatentProcessingResult:
+        """依公開公告號取得摘要與專利範圍（供列表頁按需載入）"""
+        try:
+            if not await self.verify_api_key(user_code):
+                return PatentProcessingResult(
+                    success=False,
+                    error="GPSS API驗證失敗，請檢查驗證碼是否正確"
+                )
+
+            patents = [
+                PatentRecord(publication_number=number.strip())
+                for number in publication_numbers if number and number.strip()
+            ]
+            await self.gpss_service.hydrate_patent_details(user_code, patents)
+
+            details = [
+                {
+                    "公開公告號": patent.publication_number,
+                    "摘要": patent.abstract if patent.hydrated else 'N/A',
+                    "專利範圍": patent.claims if patent.hydrated else 'N/A',
+                    "found": patent.hydrated
+                }
+                for patent in patents
+            ]
+            found_count = sum(1 for detail in details if detail['found'])
+
+            return PatentProcessingResult(
+                success=True,
+                results=details,
+                total_found=found_count,
+                message=f"已取得 {found_count}/{len(details)} 筆專利詳細內容"
+            )
+
+        except KeyVerificationUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"取得專利詳細內容失敗: {e}")
+            return PatentProcessingResult(
+                success=False,
+                error=f"取得專利詳細內容失敗: {str(e)}"
+            )
+
+    async def _run_gpss_search(self, search_method: str, user_code: str, max_results: int, **search_kwargs) -> Dict:
+        """
+        執行GPSS搜索，超過單次上限時自動改用日期分段檢索
+        search_method: raw / and_or / complex
+        """
+        if max_results > self.gpss_service.MAX_RESULTS_PER_REQUEST:
+            # 條件搜索若有指定日期範圍，優先對該欄位分段
+            date_field = 'AD' if search_kwargs.get('gpss_AD') and not search_kwargs.get('gpss_ID') else 'ID'
+            logger.info(f"🧩 要求 {max_results} 筆超過單次上限，改用 {date_field} 分段檢索")
+            return await self.gpss_service.search_patents_sharded(
+                search_method=search_method,
+                user_code=user_code,
+                max_results=max_results,
+                date_field=date_field,
+                **search_kwargs
+            )
+
+        search_func = self.gpss_service._get_search_method(search_method)
+        return await search_func(user_code=user_code, max_results=max_results, **search_kwargs)
+
+    async def _search_and_parse(self, search_method: str, user_code: str, max_results: int, **search_kwargs) -> List[PatentRecord]:
+        """
+        執行GPSS搜索並回傳解析後的專利列表
+        啟用串流解析時邊下載邊解析，不保留完整原始回應
+        啟用延遲補齊時只檢索列表欄位，摘要與權利要求於處理前再補齊
+        """
+        if settings.GPSS_LAZY_HYDRATION:
+            search_kwargs.setdefault('field_profile', 'list')
+
+        if settings.GPSS_STREAMING_PARSE and max_results <= self.gpss_service.MAX_RESULTS_PER_REQUEST:
+            return [
+                patent async for patent in self.gpss_service.search_patents_streaming(
+                    search_method,
+                    user_code=user_code,
+                    max_results=max_results,
+                    **search_kwargs
+                )
+            ]
+
+        raw_result = await self._run_gpss_search(search_method, user_code, max_results, **search_kwargs)
+        return await self.gpss_service.parse_gpss_response_async(raw_result)
+
+    async def _search_and_process(
+        self,
+        search_method: str,
+        user_code: str,
+        max_results: int,
+        process_chunk: ChunkProcessor,
+        **search_kwargs
+    ) -> List[PatentRecord]:
+        """
+        執行GPSS搜索並處理結果，回傳處理後的專利列表（未找到時為空列表）
+        process_chunk(patents, start_index, priority) 處理一批已補齊的專利
+        啟用串流解析時，每累積 GPSS_STREAMING_PROCESS_CHUNK 筆即開始補齊與Qwen處理，
+        不需等待完整回應下載完成；否則檢索完成後一次處理
+        """
+        if not settings.GPSS_STREAMING_PARSE or max_results > self.gpss_service.MAX_RESULTS_PER_REQUEST:
+            patents = await self._search_and_parse(search_method, user_code, max_results, **search_kwargs)
+            if not patents:
+                return []
+            logger.info(f"搜索到 {len(patents)} 筆原始專利")
+            patents = await self._hydrate_for_processing(user_code, patents[:max_results])
+            return await process_chunk(patents, 0, None)
+
+        if settings.GPSS_LAZY_HYDRATION:
+            search_kwargs.setdefault('field_profile', 'list')
+
+        # 排程優先權依整體工作規模決定，而非每批筆數
+        priority = self._feature_priority(max_results)
+
+        async def hydrate_and_process(chunk: List[PatentRecord], start_index: int) -> List[PatentRecord]:
+            chunk = await self._hydrate_for_processing(user_code, chunk)
+            return await process_chunk(chunk, start_index, priority)
+
+        processing_tasks = []
+        chunk = []
+        collected = 0
+        # 跨批次去重：已出現的申請號/內容鍵 → 代表專利；重複者不送處理，完成後複製代表專利結果
+        representative_by_key: Dict[str, PatentRecord] = {}
+        duplicates: Dict[int, List[PatentRecord]] = {}
+
+        def start_chunk():
+            nonlocal chunk, collected
+            logger.info(f"🚀 串流已解析 {collected + len(chunk)} 筆，第 {collected + 1} 筆起開始特徵生成")
+            processing_tasks.append(asyncio.create_task(hydrate_and_process(chunk, collected)))
+            collected += len(chunk)
+            chunk = []
+
+        def is_duplicate(patent: PatentRecord) -> bool:
+            keys = [key for key in (application_key(patent), content_key(patent)) if key]
+            representative = next((representative_by_key[key] for key in keys if key in representative_by_key), None)
+            for key in keys:
+                representative_by_key.setdefault(key, representative or patent)
+            if representative is None:
+                return False
+            duplicates.setdefault(id(representative), []).append(patent)
+            return True
+
+        patent_stream = self.gpss_service.search_patents_streaming(
+            search_method,
+            user_code=user_code,
+            max_results=max_results,
+            **search_kwargs
+        )
+        try:
+            with llm_request_context(priority, user_code):
+                async with aclosing(patent_stream):
+                    async for patent in patent_stream:
+                        if settings.PATENT_DEDUP_ENABLED and is_duplicate(patent):
+                            continue
+                        chunk.append(patent)
+                        if len(chunk) >= settings.GPSS_STREAMING_PROCESS_CHUNK:
+                            start_chunk()
+                if chunk:
+                    start_chunk()
+
+            chunk_results = await asyncio.gather(*processing_tasks)
+        except BaseException:
+            # 下載或任一批處理失敗時取消其餘批次，避免在背景繼續呼叫Qwen
+            for task in processing_tasks:
+                task.cancel()
+            raise
+
+        processed_patents = []
+        for chunk_result in chunk_results:
+            for patent in chunk_result:
+                processed_patents.append(patent)
+                members = duplicates.get(id(patent))
+                if members:
+                    cluster = [patent] + members
+                    mark_clusters([cluster])
+                    copy_features_to_members(cluster)
+                    processed_patents.extend(members)
+
+        saved = sum(len(members) for members in duplicates.values())
+        if saved:
+            self.dedup_stats['patents'] += saved
+            self.dedup_stats['llm_calls_saved'] += saved
+            logger.info(f"🧬 串流跨批次重複專利 {saved} 筆，沿用代表專利結果")
+
+        for index, patent in enumerate(processed_patents):
+            patent.sequence = index + 1
+
+        logger.info(f"✅ 串流檢索共處理 {len(processed_patents)} 筆專利")
+        return processed_patents
+
+    def _batching_processor(self, user_code: str) -> ChunkProcessor:
+        """流程A/B的批次處理（供 _search_and_process 分批呼叫）"""
+        async def process_chunk(patents: List[PatentRecord], start_index: int, priority: Optional[str]) -> List[PatentRecord]:
+            return await self._process_patents_with_batching(patents, session_key=user_code, priority=priority)
+        return process_chunk
+
+    def _feature_processor(self, user_code: str) -> ChunkProcessor:
+        """同義詞檢索的技術特徵生成（供 _search_and_process 分批呼叫，序號接續編號）"""
+        async def process_chunk(patents: List[PatentRecord], start_index: int, priority: Optional[str]) -> List[PatentRecord]:
+            return await self._process_patents_with_qwen_features(
+                patents, start_index=start_index, session_key=user_code, priority=priority
+            )
+        return process_chunk
+
+    async def _hydrate_for_processing(self, user_code: str, patents: List[PatentRecord]) -> List[PatentRecord]:
+        """延遲補齊模式下，於Qwen處理前補齊摘要與權利要求"""
+        if not settings.GPSS_LAZY_HYDRATION or not patents:
+            return patents
+        return await self.gpss_service.hydrate_patent_details(user_code, patents)
+
+    async def _hydrate_and_process_with_qwen(self, user_code: str, patents: List[PatentRecord], start_index: int = 0) -> List[PatentRecord]:
+        """補齊詳細內容後生成技術特徵（分流模式下各分組獨立進行）"""
+        patents = await self._hydrate_for_processing(user_code, patents)
+        return await self._process_patents_with_qwen_features(patents, start_index=start_index, session_key=user_code)
+
     async def _search_patents_with_and_or_logic(
         self, 
         user_keywords: List[str], 
         ai_keywords: List[str], 
         user_code: str, 
-        max_results: int
-    ) -> List[Dict]:
-        """使用AND/OR關鍵字邏輯搜索專利"""
+        max_results: int,
+        process_chunk: ChunkProcessor
+    ) -> List[PatentRecord]:
+        """使用AND/OR關鍵字邏輯搜索專利，並以process_chunk處理檢索結果"""
         try:
             logger.info(f"🔍 執行AND/OR邏輯搜索")
             logger.info(f"📝 用戶關鍵字(OR): {user_keywords}")
             logger.info(f"🤖 AI關鍵字(OR): {ai_keywords}")
             
             # 使用GPSS服務的AND/OR搜索方法
-            raw_result = await self.gpss_service.search_patents_with_and_or_logic(
+            patents = await self._search_and_process(
+                'and_or',
                 user_code=user_code,
+                max_results=max_results,
+                process_chunk=process_chunk,
                 user_keywords=user_keywords if user_keywords else None,
                 ai_keywords=ai_keywords if ai_keywords else None,
                 databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
-                max_results=max_results
             )
-            
-            # 解析GPSS回應
-            patents = self.gpss_service.parse_gpss_response(raw_result)
-            logger.info(f"✅ AND/OR邏輯成功解析 {len(patents)} 筆專利")
+            logger.info(f"✅ AND/OR邏輯成功處理 {len(patents)} 筆專利")
             return patents
                 
         except Exception as e:
             logger.error(f"❌ AND/OR專利搜索失敗: {e}")
             raise Exception(f"AND/OR專利搜索失敗: {str(e)}")
 
-    async def _search_patents_with_keywords(self, keywords: List[str], user_code: str, max_results: int) -> List[Dict]:
-        """使用關鍵字搜索專利（傳統方式）"""
+    async def _search_patents_with_keywords(
+        self,
+        keywords: List[str],
+        user_code: str,
+        max_results: int,
+        process_chunk: ChunkProcessor
+    ) -> List[PatentRecord]:
+        """使用關鍵字搜索專利（傳統方式），並以process_chunk處理檢索結果"""
         try:
             logger.info(f"使用GPSS API搜索專利，關鍵字: {keywords}")
             
             # 使用真實GPSS API
-            raw_result = await self.gpss_service.search_patents_raw(
+            patents = await self._search_and_process(
+                'raw',
                 user_code=user_code,
+                max_results=max_results,
+                process_chunk=process_chunk,
                 keywords=keywords,
                 databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
-                max_results=max_results
             )
-            
-            # 解析GPSS回應
-            patents = self.gpss_service.parse_gpss_response(raw_result)
-            logger.info(f"成功解析 {len(patents)} 筆專利")
+            logger.info(f"成功處理 {len(patents)} 筆專利")
             return patents
                 
         except Exception as e:
             logger.error(f"專利搜索失敗: {e}")
             raise Exception(f"專利搜索失敗: {str(e)}")
 
-    async def _search_patents_with_conditions(self, conditions: Dict[str, Any], user_code: str, max_results: int) -> List[Dict]:
-        """根據條件搜索專利"""
+    async def _search_patents_with_conditions(
+        self,
+        conditions: Dict[str, Any],
+        user_code: str,
+        max_results: int,
+        process_chunk: ChunkProcessor
+    ) -> List[PatentRecord]:
+        """根據條件搜索專利，並以process_chunk處理檢索結果"""
         try:
             logger.info(f"使用真實GPSS API條件搜索，條件: {conditions}")
             
@@ -419,17 +667,16 @@ class ImprovedPatentProcessingService:
                     date_params['gpss_ID'] = f"{date_range[0]}:"
             
             # 使用真實GPSS API
-            raw_result = await self.gpss_service.search_patents_raw(
+            patents = await self._search_and_process(
+                'raw',
                 user_code=user_code,
+                max_results=max_results,
+                process_chunk=process_chunk,
                 search_conditions=search_conditions,
                 databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
-                max_results=max_results,
                 **date_params
             )
-            
-            # 解析GPSS回應
-            patents = self.gpss_service.parse_gpss_response(raw_result)
-            logger.info(f"成功解析 {len(patents)} 筆專利")
+            logger.info(f"成功處理 {len(patents)} 筆專利")
             return patents
                 
         except Exception as e:
@@ -442,7 +689,15 @@ class ImprovedPatentProcessingService:
             if not self.qwen_service:
                 return {"keywords": self._extract_fallback_keywords(description)}
         
+            kind = 'keywords:5'
+            if self.keyword_cache is not None:
+                cached = await self.keyword_cache.get(kind, description)
+                if cached is not None:
+                    return cached
+
             result = await self.qwen_service.generate_keywords_from_description(description, num_keywords=5)
+            if self.keyword_cache is not None:
+                await self.keyword_cache.set(kind, description, result)
             return result
         
         except Exception as e:
@@ -457,7 +712,15 @@ class ImprovedPatentProcessingService:
             if not self.qwen_service:
                 raise Exception("Qwen服務未初始化")
 
+            kind = 'synonyms:3x5'
+            if self.keyword_cache is not None:
+                cached = await self.keyword_cache.get(kind, description)
+                if cached is not None:
+                    return cached
+
             result = await self.qwen_service.generate_keywords_with_synonyms(description, num_keywords=3, num_synonyms=5)
+            if self.keyword_cache is not None:
+                await self.keyword_cache.set(kind, description, result)
             return result
 
         except Exception as e:
@@ -465,6 +728,74 @@ class ImprovedPatentProcessingService:
             # 使用fallback方法
             return self._generate_keywords_synonyms_fallback(description, 3, 5)
 
+    def start_speculative_prefetch(
+        self,
+        session_id: str,
+        user_code: str,
+        keywords_with_synonyms: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        關鍵字生成後，在使用者確認期間以預設選擇（全部關鍵字與同義詞）預先檢索GPSS
+        需啟用 GPSS_SPECULATIVE_PREFETCH；回傳是否已啟動
+        """
+        if not settings.GPSS_SPECULATIVE_PREFETCH or not user_code or not keywords_with_synonyms:
+            return False
+
+        default_groups = [
+            {
+                'keyword': item.get('keyword', ''),
+                'keyword_selected': True,
+                'selected_synonyms': item.get('synonyms', [])
+            }
+            for item in keywords_with_synonyms
+        ]
+        gpss_query = self._build_gpss_and_or_query(default_groups, [])
+        if not gpss_query:
+            return False
+
+        max_results = min(settings.GPSS_PREFETCH_MAX_RESULTS, self.gpss_service.MAX_RESULTS_PER_REQUEST)
+
+        async def fetch() -> List[PatentRecord]:
+            if settings.REQUIRE_API_VALIDATION and not await self.verify_api_key(user_code):
+                raise Exception("GPSS API驗證失敗")
+            # 取完整欄位，命中時不需再補齊摘要與權利要求
+            patents = await self._search_and_parse(
+                'complex',
+                user_code=user_code,
+                max_results=max_results,
+                complex_query=gpss_query,
+                databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
+                field_profile='full'
+            )
+            for patent in patents:
+                patent.hydrated = True
+            return patents
+
+        self.search_prefetcher.start(
+            session_id,
+            user_code,
+            self._keyword_term_groups(default_groups, []),
+            max_results,
+            fetch
+        )
+        return True
+
+    def _keyword_term_groups(
+        self,
+        selected_keyword_groups: List[Dict[str, Any]],
+        custom_keywords: List[str]
+    ) -> List[List[str]]:
+        """與 _build_gpss_and_or_query 相同的分組方式，回傳未轉義的詞彙（供預先檢索比對）"""
+        term_groups = []
+        for group in selected_keyword_groups:
+            terms = []
+            if group.get('keyword_selected', False) and group.get('keyword'):
+                terms.append(group['keyword'])
+            terms.extend(group.get('selected_synonyms', []))
+            term_groups.append([term for term in terms if term and term.strip()])
+        term_groups.append([term for term in custom_keywords or [] if term and term.strip()])
+        return [terms for terms in term_groups if terms]
+
     def _generate_keywords_synonyms_fallback(self, description: str, num_keywords: int, num_synonyms: int) -> Dict:
         """
         Fallback方法：當Qwen失敗時使用的關鍵字和同義詞生成
@@ -521,11 +852,13 @@ class ImprovedPatentProcessingService:
         selected_keyword_groups: List[Dict[str, Any]],
         custom_keywords: List[str],
         user_code: str,
-        max_results: int = 200
+        max_results: int = 200,
+        session_id: Optional[str] = None
     ) -> PatentProcessingResult:
         """
         處理帶同義詞的技術描述搜索
         構建GPSS API可理解的AND/OR查詢語法，直接發送給GPSS資料庫執行
+        有session_id時先嘗試使用該會話的預先檢索結果
         """
         try:
             start_time = time.time()
@@ -543,18 +876,55 @@ class ImprovedPatentProcessingService:
 
             logger.info(f"🔍 構建的GPSS查詢語法: {gpss_query}")
 
-            # 🚀 直接使用GPSS API執行複雜AND/OR邏輯查詢
-            raw_result = await self.gpss_service.search_patents_with_complex_and_or_logic(
-                user_code=user_code,
-                complex_query=gpss_query,
-                databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
-                max_results=max_results
-            )
+            # 🔮 確認的選擇與預先檢索相同時，不再重新檢索
+            prefetched = None
+            if session_id:
+                prefetched = await self.search_prefetcher.take(
+                    session_id,
+                    user_code,
+                    self._keyword_term_groups(selected_keyword_groups, custom_keywords),
+                    max_results
+                )
 
-            # 解析GPSS回應
-            patents = self.gpss_service.parse_gpss_response(raw_result)
+            # 🔀 分流模式：各資料庫分組到達後即開始Qwen處理
+            if prefetched is None and settings.GPSS_FANOUT_ENABLED and max_results <= self.gpss_service.MAX_RESULTS_PER_REQUEST:
+                processed_patents = await self._search_and_process_with_fanout(
+                    user_code=user_code,
+                    max_results=max_results,
+                    complex_query=gpss_query
+                )
+                execution_time = time.time() - start_time
 
-            if not patents:
+                return PatentProcessingResult(
+                    success=True,
+                    results=[patent.to_feature_result_dict() for patent in processed_patents],
+                    total_found=len(processed_patents),
+                    message=f"成功檢索並處理了 {len(processed_patents)} 筆專利" if processed_patents else "未找到符合條件的專利",
+                    query_info={
+                        "gpss_query": gpss_query,
+                        "keyword_groups": selected_keyword_groups,
+                        "custom_keywords": custom_keywords,
+                        "execution_time": execution_time,
+                        "search_logic": "GPSS資料庫執行AND/OR邏輯（分流檢索）"
+                    }
+                )
+
+            # 🚀 直接使用GPSS API執行複雜AND/OR邏輯查詢，並使用Qwen為每個專利生成技術特徵和功效
+            if prefetched is not None:
+                logger.info(f"📋 預先檢索返回 {len(prefetched)} 筆專利")
+                patents = await self._hydrate_for_processing(user_code, prefetched[:max_results])
+                processed_patents = await self._process_patents_with_qwen_features(patents, session_key=user_code)
+            else:
+                processed_patents = await self._search_and_process(
+                    'complex',
+                    user_code=user_code,
+                    max_results=max_results,
+                    process_chunk=self._feature_processor(user_code),
+                    complex_query=gpss_query,
+                    databases=['TWA','TWB','USA','USB','JPA','JPB','EPA','EPB','KPA','KPB','CNA','CNB','WO','SEAA','SEAB','OTA','OTB'],
+                )
+
+            if not processed_patents:
                 return PatentProcessingResult(
                     success=True,
                     results=[],
@@ -568,16 +938,11 @@ class ImprovedPatentProcessingService:
                     }
                 )
 
-            logger.info(f"📋 GPSS搜索返回 {len(patents)} 筆專利")
-
-            # 使用Qwen為每個專利生成技術特徵和功效
-            processed_patents = await self._process_patents_with_qwen_features(patents[:max_results])
-
             execution_time = time.time() - start_time
 
             return PatentProcessingResult(
                 success=True,
-                results=processed_patents,
+                results=[patent.to_feature_result_dict() for patent in processed_patents],
                 total_found=len(processed_patents),
                 message=f"成功檢索並處理了 {len(processed_patents)} 筆專利",
                 query_info={
@@ -585,10 +950,13 @@ class ImprovedPatentProcessingService:
                     "keyword_groups": selected_keyword_groups,
                     "custom_keywords": custom_keywords,
                     "execution_time": execution_time,
-                    "search_logic": "GPSS資料庫執行AND/OR邏輯"
+                    "search_logic": "GPSS資料庫執行AND/OR邏輯",
+                    "prefetched": prefetched is not None
                 }
             )
 
+        except KeyVerificationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"❌ 帶同義詞的技術描述搜索失敗: {e}")
             return PatentProcessingResult(
@@ -596,6 +964,51 @@ class ImprovedPatentProcessingService:
                 error=f"搜索失敗: {str(e)}"
             )
 
+    async def _search_and_process_with_fanout(
+        self,
+        user_code: str,
+        max_results: int,
+        **search_kwargs
+    ) -> List[PatentRecord]:
+        """
+        分流複雜查詢：每個資料庫分組的結果到達後立即啟動Qwen特徵生成，
+        不需等待最慢的分組；總筆數達到max_results後取消其餘分組
+        """
+        processing_tasks = []
+        collected = 0
+
+        if settings.GPSS_LAZY_HYDRATION:
+            search_kwargs.setdefault('field_profile', 'list')
+
+        group_results = self.gpss_service.iter_search_fanout(
+            'complex',
+            user_code=user_code,
+            max_results=max_results,
+            **search_kwargs
+        )
+        # aclosing確保提前結束時立即取消其餘分組請求
+        async with aclosing(group_results):
+            async for group_name, group_patents in group_results:
+                group_patents = group_patents[:max_results - collected]
+                if not group_patents:
+                    continue
+
+                logger.info(f"🚀 分組 {group_name} 的 {len(group_patents)} 筆專利開始特徵生成")
+                processing_tasks.append(asyncio.create_task(
+                    self._hydrate_and_process_with_qwen(user_code, group_patents, start_index=collected)
+                ))
+                collected += len(group_patents)
+
+                if collected >= max_results:
+                    break
+
+        processed_patents = []
+        for group_result in await asyncio.gather(*processing_tasks):
+            processed_patents.extend(group_result)
+
+        logger.info(f"✅ 分流檢索共處理 {len(processed_patents)} 筆專利")
+        return processed_patents
+
     def _build_gpss_and_or_query(
         self, 
         selected_keyword_groups: List[Dict[str, Any]], 
@@ -689,90 +1102,155 @@ class ImprovedPatentProcessingService:
         
         return term
 
-    async def _process_patents_with_qwen_features(self, patents: List[Dict]) -> List[Dict]:
+    async def _process_patents_with_qwen_features(
+        self,
+        patents: List[PatentRecord],
+        start_index: int = 0,
+        session_key: Optional[str] = None,
+        priority: Optional[str] = None
+    ) -> List[PatentRecord]:
         """
-        使用Qwen為專利列表生成技術特徵和功效
+        使用Qwen為專利列表生成技術特徵和功效（直接寫入PatentRecord，不另建dict）
+        start_index: 序號起始偏移（分批到達的結果接續編號）
+        session_key: LLM排程的會話公平排隊鍵（通常為使用者驗證碼）
+        priority: LLM排程優先權（分批處理時由整體工作決定，未指定時依本批筆數判定）
+        重複的專利只處理代表專利，結果複製到同群組的其他專利
         """
         processed_patents = []
-
-        # 使用信號量控制並發
-        async def process_single_patent(patent, index):
-            async with self.semaphore:
+        clusters = self._cluster_for_processing(patents)
+        representatives = [members[0] for members in clusters]
+        cached_patents = await self._apply_cached_features(representatives)
+        cached_ids = {id(patent) for patent in cached_patents}
+        pending = [patent for patent in representatives if id(patent) not in cached_ids]
+
+        # 使用信號量限制本次工作同時進行的專利數，實際Qwen並行數與先後由排程器決定
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+
+        async def process_single_patent(patent: PatentRecord, index: int) -> PatentRecord:
+            async with semaphore:
+                patent.sequence = index + 1
                 try:
-                    logger.info(f"📝 處理專利 {index + 1}/{len(patents)}: {patent.get('title', 'N/A')[:50]}...")
-
-                    # 準備專利數據
-                    patent_data = {
-                        'title': patent.get('title', ''),
-                        'abstract': patent.get('abstract', ''),
-                        'claims': patent.get('claims', ''),
-                        'main_claim': patent.get('claims', '')[:500] if patent.get('claims') else ''
-                    }
+                    logger.info(f"📝 處理專利 {index + 1}/{start_index + len(pending)}: {patent.title[:50]}...")
 
-                    # 使用Qwen生成技術特徵和功效
-                    features_result = await self.qwen_service.generate_technical_features_and_effects(patent_data)
-
-                    # 組裝最終結果
-                    processed_patent = {
-                        "序號": index + 1,
-                        "專利名稱": patent.get('title', 'N/A'),
-                        "公開公告號": patent.get('publication_number', patent.get('id', 'N/A')),
-                        "摘要": patent.get('abstract', 'N/A'),
-                        "專利範圍": patent.get('claims', 'N/A'),
-                        "技術特徵": features_result.get('technical_features', ['技術特徵生成中...']),
-                        "技術功效": features_result.get('technical_effects', ['技術功效生成中...']),
-
-                        # 保留原始資料供其他用途
-                        "申請人": patent.get('applicants', 'N/A'),
-                        "發明人": patent.get('inventors', 'N/A'),
-                        "國家": patent.get('country', 'TW'),
-                        "申請日": patent.get('application_date', 'N/A'),
-                        "公開日": patent.get('publication_date', 'N/A'),
-                        "IPC分類": patent.get('ipc_classes', 'N/A')
-                    }
+                    # 使用Qwen生成技術特徵和功效（結果寫入技術特徵快取）
+                    features_result = await self._generate_tech_features_and_effects(patent.feature_input())
 
-                    return processed_patent
+                    patent.technical_features = features_result.get('technical_features', ['技術特徵生成中...'])
+                    patent.technical_effects = features_result.get('technical_effects', ['技術功效生成中...'])
+                    return patent
 
                 except Exception as e:
                     logger.error(f"❌ 處理專利 {index + 1} 失敗: {e}")
-                    # 返回基本信息，標記處理失敗
-                    return {
-                        "序號": index + 1,
-                        "專利名稱": patent.get('title', 'N/A'),
-                        "公開公告號": patent.get('publication_number', patent.get('id', 'N/A')),
-                        "摘要": patent.get('abstract', 'N/A'),
-                        "專利範圍": patent.get('claims', 'N/A'),
-                        "技術特徵": ['技術特徵生成失敗'],
-                        "技術功效": ['技術功效生成失敗'],
-                        "申請人": patent.get('applicants', 'N/A'),
-                        "發明人": patent.get('inventors', 'N/A'),
-                        "國家": patent.get('country', 'TW'),
-                        "申請日": patent.get('application_date', 'N/A'),
-                        "公開日": patent.get('publication_date', 'N/A'),
-                        "IPC分類": patent.get('ipc_classes', 'N/A')
-                    }
+                    # 保留基本信息，標記處理失敗
+                    patent.processing_error = str(e)
+                    return patent
+
+        # 並行處理所有專利（啟用合併提示詞時改為多筆一次呼叫）
+        with llm_request_context(priority or self._feature_priority(len(patents)), session_key):
+            if self._use_prompt_batching(pending):
+                processed_patents = await self._process_patents_in_prompt_batches(pending)
+                tasks = []
+            else:
+                tasks = [process_single_patent(patent, start_index + i) for i, patent in enumerate(pending)]
 
-        # 並行處理所有專利
-        tasks = [process_single_patent(patent, i) for i, patent in enumerate(patents)]
-    
-        # 分批處理以避免過載
-        for i in range(0, len(tasks), self.BATCH_SIZE):
-            batch = tasks[i:i + self.BATCH_SIZE]
-            batch_results = await asyncio.gather(*batch, return_exceptions=True)
-        
-            for result in batch_results:
+            # 不再分批等待與批次間延遲：負載由Qwen自適應並行上限與排程器調節
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
                 if isinstance(result, Exception):
                     logger.error(f"❌ 批次處理失敗: {result}")
                 else:
                     processed_patents.append(result)
 
-            # 批次間延遲
-            if i + self.BATCH_SIZE < len(tasks):
-                await asyncio.sleep(self.BATCH_DELAY)
+        processed_patents = self._expand_clusters(patents, clusters, cached_patents + processed_patents)
+        for i, patent in enumerate(processed_patents):
+            patent.sequence = start_index + i + 1
 
         logger.info(f"✅ 成功處理 {len(processed_patents)} 筆專利")
         return processed_patents
 
+    def _cluster_for_processing(self, patents: List[PatentRecord]) -> List[List[PatentRecord]]:
+        """
+        LLM處理前將重複專利分群（同申請號，或正規化標題+摘要相同）
+        回傳群組列表，每群第一筆為代表專利；未啟用時每筆自成一群
+        """
+        if not settings.PATENT_DEDUP_ENABLED or len(patents) < 2:
+            return [[patent] for patent in patents]
+
+        clusters = cluster_duplicate_patents(patents)
+        mark_clusters(clusters)
+
+        saved = len(patents) - len(clusters)
+        self.dedup_stats['patents'] += len(patents)
+        self.dedup_stats['clusters'] += len(clusters)
+        self.dedup_stats['llm_calls_saved'] += saved
+        if saved:
+            logger.info(f"🧬 重複專利分群: {len(patents)} 筆 → {len(clusters)} 群，省下 {saved} 次Qwen呼叫")
+        return clusters
+
+    @staticmethod
+    def _feature_priority(patent_count: int) -> str:
+        """技術特徵生成的排程優先權：大量專利視為批量工作，排在一般檢索之後"""
+        return PRIORITY_BULK if patent_count > settings.LLM_BULK_PATENT_THRESHOLD else PRIORITY_STANDARD
+
+    def _use_prompt_batching(self, patents: List[PatentRecord]) -> bool:
+        return settings.QWEN_BATCH_FEATURES_ENABLED and self.qwen_service is not None and len(patents) > 1
+
+    async def _process_patents_in_prompt_batches(self, patents: List[PatentRecord]) -> List[PatentRecord]:
+        """
+        多筆專利合併為一個Qwen提示詞生成技術特徵（依token預算分組）
+        各組以信號量限制並行，不需逐筆的請求間延遲；回傳與輸入順序相同的專利列表
+        """
+        inputs = [patent.feature_input() for patent in patents]
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        batches = self.qwen_service.plan_feature_batches(inputs)
+        logger.info(f"📦 合併提示詞: {len(patents)} 筆專利分為 {len(batches)} 次Qwen呼叫")
+
+        async def process_batch(indexes: List[int]):
+            async with semaphore:
+                results = await self.qwen_service.generate_technical_features_batch([inputs[i] for i in indexes])
+            for index, result in zip(indexes, results):
+                patents[index].technical_features = result.get('technical_features', [])
+                patents[index].technical_effects = result.get('technical_effects', [])
+                if self.feature_cache is not None:
+                    await self.feature_cache.set(inputs[index], result)
+
+        batch_results = await asyncio.gather(*(process_batch(indexes) for indexes in batches), return_exceptions=True)
+        for indexes, result in zip(batches, batch_results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ 合併提示詞批次失敗（{len(indexes)} 筆）: {result}")
+                for index in indexes:
+                    patents[index].processing_error = str(result)
+        return patents
+
+    async def _apply_cached_features(self, patents: List[PatentRecord]) -> List[PatentRecord]:
+        """以一次批次查詢套用技術特徵快取，回傳已由快取補上特徵的專利"""
+        if self.feature_cache is None or not patents:
+            return []
+
+        cached = await self.feature_cache.get_many([patent.feature_input() for patent in patents])
+        for index, result in cached.items():
+            patents[index].technical_features = result['technical_features']
+            patents[index].technical_effects = result['technical_effects']
+
+        if cached:
+            logger.info(f"💾 技術特徵快取命中 {len(cached)}/{len(patents)} 筆，略過Qwen呼叫")
+        return [patents[index] for index in sorted(cached)]
+
+    def _expand_clusters(
+        self,
+        patents: List[PatentRecord],
+        clusters: List[List[PatentRecord]],
+        processed: List[PatentRecord]
+    ) -> List[PatentRecord]:
+        """將代表專利的處理結果複製到群組成員，依原始順序回傳已處理的專利"""
+        processed_ids = {id(patent) for patent in processed}
+        included = set()
+        for members in clusters:
+            if id(members[0]) not in processed_ids:
+                continue
+            copy_features_to_members(members)
+            included.update(id(patent) for patent in members)
+        return [patent for patent in patents if id(patent) in included]
+
     def _build_synonym_search_query(
         self, 
         selected_keyword_groups: List[Dict[str, Any]], 
@@ -815,73 +1293,52 @@ class ImprovedPatentProcessingService:
 
         return final_query
 
-    async def _process_patents_with_batching(self, patents: List[Dict]) -> List[Dict]:
-        """批次處理專利"""
+    async def _process_patents_with_batching(
+        self,
+        patents: List[PatentRecord],
+        session_key: Optional[str] = None,
+        priority: Optional[str] = None
+    ) -> List[PatentRecord]:
+        """
+        批次處理專利（重複的專利只處理代表專利）
+        session_key: LLM排程的會話公平排隊鍵（通常為使用者驗證碼）
+        priority: LLM排程優先權（分批處理時由整體工作決定，未指定時依筆數判定）
+        """
         if not patents:
             return []
+
+        all_patents = patents
+        clusters = self._cluster_for_processing(all_patents)
+        representatives = [members[0] for members in clusters]
+        cached_patents = await self._apply_cached_features(representatives)
+        cached_ids = {id(patent) for patent in cached_patents}
+        patents = [patent for patent in representatives if id(patent) not in cached_ids]
         
+        priority = priority or self._feature_priority(len(all_patents))
+        if self._use_prompt_batching(patents):
+            with llm_request_context(priority, session_key):
+                processed_patents = await self._process_patents_in_prompt_batches(patents)
+            return self._expand_clusters(all_patents, clusters, cached_patents + processed_patents)
+
         total_patents = len(patents)
-        processed_patents = []
-        failed_count = 0
-        
-        logger.info(f"🔧 開始批次處理 {total_patents} 筆專利，批次大小: {self.BATCH_SIZE}")
-        
-        batch_size = self._get_optimal_batch_size(total_patents)
-        
-        for batch_idx in range(0, total_patents, batch_size):
-            batch_end = min(batch_idx + batch_size, total_patents)
-            batch_patents = patents[batch_idx:batch_end]
-            batch_num = (batch_idx // batch_size) + 1
-            total_batches = (total_patents + batch_size - 1) // batch_size
-            
-            logger.info(f"📦 處理第 {batch_num}/{total_batches} 批，專利 {batch_idx+1}-{batch_end}")
-            
-            batch_results = await self._process_batch_with_concurrency_control(batch_patents)
-            
-            successful_in_batch = sum(1 for result in batch_results if not result.get('_processing_error'))
-            failed_in_batch = len(batch_results) - successful_in_batch
-            failed_count += failed_in_batch
-            
-            processed_patents.extend(batch_results)
-            
-            logger.info(f"✅ 批次 {batch_num} 完成，成功: {successful_in_batch}, 失敗: {failed_in_batch}")
-            
-            if batch_end < total_patents:
-                delay_time = self._get_dynamic_delay(failed_in_batch, len(batch_results))
-                logger.info(f"⏳ 批次間休息 {delay_time:.1f} 秒...")
-                await asyncio.sleep(delay_time)
+        logger.info(f"🔧 開始處理 {total_patents} 筆專利（排程優先權 {priority}，Qwen並行上限 {self.qwen_service.concurrency_limiter.limit if self.qwen_service else '-'}，自適應調整）")
+
+        # 全部專利一次送入，由排程器與自適應並行上限控制Qwen負載，取代固定批次大小與批次間延遲
+        with llm_request_context(priority, session_key):
+            processed_patents = await self._process_batch_with_concurrency_control(patents)
+        failed_count = sum(1 for result in processed_patents if result.processing_error)
         
         success_rate = ((total_patents - failed_count) / total_patents * 100) if total_patents > 0 else 0
         logger.info(f"🎯 批次處理完成，總計: {total_patents}, 成功: {total_patents - failed_count}, 失敗: {failed_count}, 成功率: {success_rate:.1f}%")
         
-        return processed_patents
+        return self._expand_clusters(all_patents, clusters, cached_patents + processed_patents)
 
-    def _get_optimal_batch_size(self, total_count: int) -> int:
-        """根據專利總數動態調整批次大小"""
-        if total_count <= 50:
-            return 10
-        elif total_count <= 200:
-            return 15
-        else:
-            return 20
-
-    def _get_dynamic_delay(self, failed_count: int, total_count: int) -> float:
-        """根據失敗率動態調整延遲時間"""
-        failure_rate = failed_count / total_count if total_count > 0 else 0
-        
-        if failure_rate > 0.3:
-            return self.BATCH_DELAY * 2.0
-        elif failure_rate > 0.1:
-            return self.BATCH_DELAY * 1.5
-        else:
-            return self.BATCH_DELAY
-
-    async def _process_batch_with_concurrency_control(self, batch_patents: List[Dict]) -> List[Dict]:
+    async def _process_batch_with_concurrency_control(self, batch_patents: List[PatentRecord]) -> List[PatentRecord]:
         """使用並發控制處理單個批次"""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
         
         async def process_with_semaphore(patent):
-            async with self.semaphore:
-                await asyncio.sleep(self.REQUEST_DELAY)
+            async with semaphore:
                 return await self._process_single_patent_with_retry(patent)
         
         tasks = [process_with_semaphore(patent) for patent in batch_patents]
@@ -891,15 +1348,14 @@ class ImprovedPatentProcessingService:
         for i, result in enumerate(results):
             if isinstance(result, Exception):
                 logger.warning(f"處理專利失敗 (批次內索引 {i}): {result}")
-                patent_with_error = batch_patents[i].copy()
-                patent_with_error['_processing_error'] = str(result)
-                processed_results.append(patent_with_error)
+                batch_patents[i].processing_error = str(result)
+                processed_results.append(batch_patents[i])
             else:
                 processed_results.append(result)
         
         return processed_results
 
-    async def _process_single_patent_with_retry(self, patent: Dict) -> Dict:
+    async def _process_single_patent_with_retry(self, patent: PatentRecord) -> PatentRecord:
         """處理單一專利並支持重試機制"""
         for attempt in range(self.MAX_RETRIES + 1):
             try:
@@ -913,37 +1369,35 @@ class ImprovedPatentProcessingService:
                     logger.error(f"處理專利最終失敗，已達最大重試次數: {e}")
                     raise
 
-    async def _process_single_patent_simple(self, patent: Dict) -> Dict:
-        """處理單一專利：只生成技術特徵和功效"""
+    async def _process_single_patent_simple(self, patent: PatentRecord) -> PatentRecord:
+        """處理單一專利：只生成技術特徵和功效（直接寫入PatentRecord）"""
         try:
-            enhanced_patent = patent.copy()
-            
             # 生成技術特徵和功效
             try:
                 features_result = await asyncio.wait_for(
-                    self._generate_tech_features_and_effects(patent),
+                    self._generate_tech_features_and_effects(patent.feature_input()),
                     timeout=60.0
                 )
                 
                 if isinstance(features_result, Exception):
                     logger.warning(f"技術特徵生成失敗: {features_result}")
-                    enhanced_patent['technical_features'] = ["技術特徵提取失敗"]
-                    enhanced_patent['technical_effects'] = ["技術功效提取失敗"]
+                    patent.technical_features = ["技術特徵提取失敗"]
+                    patent.technical_effects = ["技術功效提取失敗"]
                 else:
-                    enhanced_patent['technical_features'] = features_result.get('technical_features', [])
-                    enhanced_patent['technical_effects'] = features_result.get('technical_effects', [])
+                    patent.technical_features = features_result.get('technical_features', [])
+                    patent.technical_effects = features_result.get('technical_effects', [])
                     
             except asyncio.TimeoutError:
-                logger.warning(f"技術特徵生成超時，使用fallback: {patent.get('title', 'Unknown')[:50]}...")
-                fallback_result = self._generate_fallback_features(patent)
-                enhanced_patent['technical_features'] = fallback_result.get('technical_features', [])
-                enhanced_patent['technical_effects'] = fallback_result.get('technical_effects', [])
+                logger.warning(f"技術特徵生成超時，使用fallback: {patent.title[:50]}...")
+                fallback_result = self._generate_fallback_features(patent.feature_input())
+                patent.technical_features = fallback_result.get('technical_features', [])
+                patent.technical_effects = fallback_result.get('technical_effects', [])
             
-            return enhanced_patent
+            return patent
             
         except Exception as e:
             logger.error(f"處理單一專利失敗: {e}")
-            patent['_processing_error'] = str(e)
+            patent.processing_error = str(e)
             return patent
 
     async def _generate_tech_features_and_effects(self, patent: Dict) -> Dict:
@@ -951,86 +1405,31 @@ class ImprovedPatentProcessingService:
         try:
             if not self.qwen_service:
                 return self._generate_fallback_features(patent)
+
+            if self.feature_cache is not None:
+                cached = await self.feature_cache.get(patent)
+                if cached is not None:
+                    return cached
             
             result = await self.qwen_service.generate_technical_features_and_effects(patent)
+            if self.feature_cache is not None:
+                await self.feature_cache.set(patent, result)
             return result
             
         except Exception as e:
             logger.warning(f"技術特徵生成失敗: {e}")
             return self._generate_fallback_features(patent)
 
-    def _format_search_results_fixed(self, patents: List[Dict]) -> List[Dict]:
+    def _format_search_results_fixed(self, patents: List[PatentRecord]) -> List[Dict]:
         """🔧 修復版：格式化搜索結果為前端所需格式（修復申請人和國家顯示）"""
-        formatted_results = []
-    
-        for i, patent in enumerate(patents):
-            # 🔧 修復：處理申請人信息
-            applicants_raw = patent.get('applicants', 'N/A')
-            if isinstance(applicants_raw, list):
-                applicants_str = '; '.join(applicants_raw) if applicants_raw else 'N/A'
-            else:
-                applicants_str = str(applicants_raw) if applicants_raw and applicants_raw != 'N/A' else 'N/A'
-            
-            # 🔧 修復：處理國家信息
-            country_code = patent.get('country', 'TW')
-            
-            # 國家代碼到顯示名稱的映射
-            country_display_mapping = {
-                'TW': 'TW',
-                'US': 'US',
-                'JP': 'JP',
-                'EP': 'EP',
-                'KR': 'KR',
-                'CN': 'CN',
-                'WO': 'WO',
-                'SEA': 'SEA',
-                'OTHER': '其他'
-            }
-            
-            country_display = country_display_mapping.get(country_code, country_code)
-            
-            formatted_patent = {
-                "序號": i + 1,
-                "專利名稱": patent.get('title', 'N/A'),
-                "申請人": applicants_str,  # 🔧 修復後的申請人
-                "國家": country_display,   # 🔧 修復後的國家顯示
-                "申請號": patent.get('application_number', 'N/A'),
-                "公開公告號": patent.get('publication_number', 'N/A'),
-                "摘要": patent.get('abstract', 'N/A'),
-                "專利範圍": patent.get('claims', 'N/A'),
-                "技術特徵": patent.get('technical_features', []),
-                "技術功效": patent.get('technical_effects', []),
-                
-                # 🔧 新增：專利連結（根據公開公告號生成）
-                "專利連結": self._generate_patent_link(patent.get('publication_number', '')),
-                
-                # 🔧 新增：調試信息（開發階段使用）
-                "_debug_info": {
-                    "raw_applicants": patent.get('applicants'),
-                    "raw_country": patent.get('country'),
-                    "database": patent.get('database', 'Unknown')
-                }
-            }
-        
-            if patent.get('_processing_error'):
-                formatted_patent["處理狀態"] = f"部分失敗: {patent['_processing_error']}"
-            
-            # 🔧 記錄修復結果
-            logger.debug(f"格式化專利 {i+1}: 申請人={applicants_str}, 國家={country_display}")
-            
-            formatted_results.append(formatted_patent)
+        formatted_results = [patent.to_result_dict(i + 1) for i, patent in enumerate(patents)]
     
         logger.info(f"✅ 完成格式化 {len(formatted_results)} 筆專利結果（申請人和國家已修復）")
         return formatted_results
 
     def _generate_patent_link(self, publication_number: str) -> str:
         """🔧 新增：根據公開公告號生成GPSS專利連結"""
-        if not publication_number or publication_number == 'N/A':
-            return ''
-        
-        # GPSS專利詳細頁面連結格式
-        base_url = "https://tiponet.tipo.gov.tw/gpss4/gpsskmc/gpssbkm"
-        return f"{base_url}?!!FRURL{publication_number}"
+        return build_patent_link(publication_number)
 
     def _extract_fallback_keywords(self, description: str) -> List[str]:
         """fallback關鍵字提取"""
@@ -1082,14 +1481,18 @@ class ImprovedPatentProcessingService:
     def get_processing_stats(self) -> Dict:
         """獲取處理統計信息"""
         return {
-            "batch_size": self.BATCH_SIZE,
-            "batch_delay": self.BATCH_DELAY,
             "max_concurrent_requests": self.MAX_CONCURRENT_REQUESTS,
-            "request_delay": self.REQUEST_DELAY,
+            "qwen_concurrency": self.qwen_service.concurrency_limiter.get_stats() if self.qwen_service else {"initialized": False},
+            "llm_scheduler": self.qwen_service.scheduler.get_stats() if self.qwen_service else {"initialized": False},
             "max_retries": self.MAX_RETRIES,
             "retry_delay": self.RETRY_DELAY,
             "initialized": self.initialized,
-            "verified_api_keys": len(self.verified_api_keys),
+            "verified_api_keys": self.api_key_cache.valid_count(),
+            "api_key_cache": self.api_key_cache.get_stats(),
+            "speculative_prefetch": self.search_prefetcher.get_stats(),
+            "deduplication": {"enabled": settings.PATENT_DEDUP_ENABLED, **self.dedup_stats},
+            "tech_feature_cache": self.feature_cache.get_stats() if self.feature_cache else {"enabled": False},
+            "keyword_cache": self.keyword_cache.get_stats() if self.keyword_cache else {"enabled": False},
             "classification_enabled": False,
             "confidence_tracking": False,
             "applicant_country_fixed": True,  # 🔧 標記已修復申請人和國家問題
@@ -1135,9 +1538,11 @@ class ImprovedPatentProcessingService:
                 logger.warning(f"⚠️ Excel資料超過{max_records}筆，只處理前{max_records}筆")
             
             # 步驟5: 批量處理專利分析
-            analysis_results = await self._process_excel_patents_batch(
-                df_cleaned, session_id
-            )
+            # Excel批量分析為批量優先權，不排在關鍵字生成與問答之前
+            with llm_request_context(PRIORITY_BULK, session_id):
+                analysis_results = await self._process_excel_patents_batch(
+                    df_cleaned, session_id
+                )
             
             # 步驟6: 統計分析結果
             stats = self._calculate_excel_analysis_stats(analysis_results)
@@ -1246,30 +1651,16 @@ class ImprovedPatentProcessingService:
         success_results = []
         error_messages = []
         
-        batch_size = 20
-        total_batches = (len(df) + batch_size - 1) // batch_size
+        logger.info(f"🔧 開始批量處理 {len(df)} 筆專利（Qwen並行上限自適應調整）")
         
-        logger.info(f"🔧 開始批量處理 {len(df)} 筆專利，分為 {total_batches} 批")
+        # 全部資料列一次送入，由信號量與Qwen自適應並行上限控制負載，不再分批休息
+        batch_results = await self._process_single_excel_batch(df, session_id, 0)
         
-        for batch_idx in range(0, len(df), batch_size):
-            batch_end = min(batch_idx + batch_size, len(df))
-            batch_df = df.iloc[batch_idx:batch_end]
-            batch_num = (batch_idx // batch_size) + 1
-            
-            logger.info(f"📦 處理第 {batch_num}/{total_batches} 批，專利 {batch_idx+1}-{batch_end}")
-            
-            batch_results = await self._process_single_excel_batch(
-                batch_df, session_id, batch_idx
-            )
-            
-            for result in batch_results:
-                if result.get('error'):
-                    error_messages.append(result['error'])
-                else:
-                    success_results.append(result)
-            
-            if batch_end < len(df):
-                await asyncio.sleep(0.3)
+        for result in batch_results:
+            if result.get('error'):
+                error_messages.append(result['error'])
+            else:
+                success_results.append(result)
         
         return {
             "success_results": success_results,
@@ -1284,6 +1675,7 @@ class ImprovedPatentProcessingService:
     ) -> List[Dict]:
         """處理單個Excel批次"""
         tasks = []
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
         
         for idx, row in batch_df.iterrows():
             patent_data = {
@@ -1295,7 +1687,7 @@ class ImprovedPatentProcessingService:
                 'sequence_number': start_index + idx + 1
             }
             
-            task = self._process_single_excel_patent_with_semaphore(patent_data, session_id)
+            task = self._process_single_excel_patent_with_semaphore(patent_data, session_id, semaphore)
             tasks.append(task)
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -1315,11 +1707,11 @@ class ImprovedPatentProcessingService:
     async def _process_single_excel_patent_with_semaphore(
         self, 
         patent_data: Dict, 
-        session_id: str
+        session_id: str,
+        semaphore: asyncio.Semaphore
     ) -> Dict:
         """使用信號量控制並發的單專利處理"""
-        async with self.semaphore:
-            await asyncio.sleep(self.REQUEST_DELAY)
+        async with semaphore:
             return await self._process_single_excel_patent(patent_data, session_id)
     
     async def _process_single_excel_patent(self, patent_data: Dict, session_id: str) -> Dict:
@@ -1408,7 +1800,6 @@ class ImprovedPatentProcessingService:
             "max_records": 500,
             "supported_formats": [".xlsx", ".xls"],
             "required_columns": ["公開公告號", "專利名稱", "摘要", "專利範圍"],
-            "batch_size": self.BATCH_SIZE,
             "processing_stats": self.get_processing_stats(),
             "classification_enabled": False,
             "applicant_country_fixed": True  # 🔧 標記已修復
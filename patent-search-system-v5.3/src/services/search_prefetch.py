@@ -0,0 +1,184 @@
+# src/services/search_prefetch.py - 使用者確認關鍵字期間的預先檢索
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional
+
+from src.config import settings
+from src.ai_services.patent_record import PatentRecord
+
+logger = logging.getLogger(__name__)
+
+# 每組詞彙以OR連接，組與組之間以AND連接
+TermGroups = List[FrozenSet[str]]
+
+
+@dataclass
+class PrefetchEntry:
+    """單一會話的預先檢索"""
+    task: asyncio.Task
+    groups: TermGroups
+    user_hash: str
+    max_results: int
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SearchPrefetcher:
+    """
+    推測式預先檢索（以session_id為鍵）
+
+    關鍵字生成後立即以預設選擇（全部關鍵字與同義詞）在背景檢索GPSS。
+    使用者確認的選擇與預設完全相同時，直接使用預先檢索的結果；
+    其他情況放棄預先檢索結果，回到一般檢索流程。
+    收窄的選擇不在本機篩選：GPSS比對完整的CL欄位且斷詞方式不同，
+    以截斷後的權利要求做子字串比對會漏掉或誤收專利。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[int] = None,
+        max_sessions: Optional[int] = None
+    ):
+        self.ttl_seconds = ttl_seconds or settings.GPSS_PREFETCH_TTL_SECONDS
+        self.max_sessions = max_sessions or settings.GPSS_PREFETCH_MAX_SESSIONS
+        self._entries: Dict[str, PrefetchEntry] = {}
+
+        self.started = 0
+        self.exact_hits = 0
+        self.mismatches = 0
+        self.failures = 0
+        self.expired = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def normalize_groups(term_groups: List[List[str]]) -> TermGroups:
+        """詞組正規化（去除空白、不分大小寫、忽略空組）"""
+        normalized = []
+        for terms in term_groups:
+            group = frozenset(term.strip().lower() for term in terms if term and term.strip())
+            if group:
+                normalized.append(group)
+        return normalized
+
+    @staticmethod
+    def _hash_user(user_code: str) -> str:
+        return hashlib.sha256(user_code.encode('utf-8')).hexdigest()
+
+    def start(
+        self,
+        session_id: str,
+        user_code: str,
+        term_groups: List[List[str]],
+        max_results: int,
+        fetch: Callable[[], Awaitable[List[PatentRecord]]]
+    ):
+        """啟動背景預先檢索；同一會話已有預先檢索時先取消舊的"""
+        self._sweep()
+        self.discard(session_id)
+
+        while len(self._entries) >= self.max_sessions:
+            oldest = min(self._entries, key=lambda key: self._entries[key].created_at)
+            self.discard(oldest)
+
+        task = asyncio.create_task(fetch())
+        # 無人取用時避免 "exception was never retrieved" 警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        self._entries[session_id] = PrefetchEntry(
+            task=task,
+            groups=self.normalize_groups(term_groups),
+            user_hash=self._hash_user(user_code),
+            max_results=max_results
+        )
+        self.started += 1
+        logger.info(f"🔮 會話 {session_id[:8]} 開始預先檢索（{len(term_groups)} 組關鍵字）")
+
+    async def take(
+        self,
+        session_id: str,
+        user_code: str,
+        term_groups: List[List[str]],
+        max_results: int
+    ) -> Optional[List[PatentRecord]]:
+        """
+        取用會話的預先檢索結果（取用後即移除）
+        確認的選擇無法由預先檢索結果得出時回傳None
+        """
+        self._sweep()
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+
+        if entry.user_hash != self._hash_user(user_code):
+            self._cancel(entry)
+            self.mismatches += 1
+            logger.info(f"🔮 會話 {session_id[:8]} 的驗證碼與預先檢索不同，重新檢索")
+            return None
+
+        if set(self.normalize_groups(term_groups)) != set(entry.groups):
+            self._cancel(entry)
+            self.mismatches += 1
+            logger.info(f"🔮 會話 {session_id[:8]} 的確認選擇與預先檢索不同，重新檢索")
+            return None
+
+        if entry.task.cancelled():
+            return None
+
+        try:
+            # 預先檢索可能仍在進行中，等待其完成仍比重新檢索快
+            patents = await entry.task
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"🔮 會話 {session_id[:8]} 的預先檢索失敗，重新檢索: {e}")
+            return None
+
+        # 結果達到上限時可能被截斷，需要更多筆數時重新檢索
+        if len(patents) >= entry.max_results and max_results > entry.max_results:
+            self.mismatches += 1
+            logger.info(f"🔮 會話 {session_id[:8]} 的預先檢索結果已達上限，重新檢索")
+            return None
+
+        self.exact_hits += 1
+        logger.info(f"🔮 會話 {session_id[:8]} 命中預先檢索: {len(patents)} 筆")
+        return patents[:max_results]
+
+    def discard(self, session_id: str):
+        """取消並移除會話的預先檢索"""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._cancel(entry)
+
+    def _cancel(self, entry: PrefetchEntry):
+        if not entry.task.done():
+            entry.task.cancel()
+            self.cancelled += 1
+
+    def _sweep(self):
+        """移除並取消過期的預先檢索"""
+        deadline = time.monotonic() - self.ttl_seconds
+        for session_id in [key for key, entry in self._entries.items() if entry.created_at < deadline]:
+            self.expired += 1
+            self.discard(session_id)
+
+    def close(self):
+        """取消所有預先檢索（服務關閉時）"""
+        for session_id in list(self._entries):
+            self.discard(session_id)
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': settings.GPSS_SPECULATIVE_PREFETCH,
+            'active_sessions': len(self._entries),
+            'in_progress': sum(1 for entry in self._entries.values() if not entry.task.done()),
+            'ttl_seconds': self.ttl_seconds,
+            'max_sessions': self.max_sessions,
+            'started': self.started,
+            'exact_hits': self.exact_hits,
+            'mismatches': self.mismatches,
+            'failures': self.failures,
+            'expired': self.expired,
+            'cancelled': self.cancelled
+        }